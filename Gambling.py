@@ -1,35 +1,121 @@
-import random
+import logging
+import math
 import discord
 from discord.ext import commands
 
+from cooldowns import CooldownManager, persistent_cooldown
+from economy_store import EconomyStore, backend_from_env, balance_table_from_env
+from games import get_game, payout
+from guild_settings import DEFAULTS, guild_settings
+from leaderboard import Leaderboard
+from member_cache import CachedMember
+from transactions import MAX_BALANCE, BalanceOutOfRange, InsufficientFunds, TransactionEngine
+
+logger = logging.getLogger(__name__)
+
 # Define the specific user ID allowed to bypass owner check
 # Replace this with the actual target user ID if 1330431499039670387 is not correct.
 SPECIAL_USER_ID = 1330431499039670387 
 
+LEADERBOARD_PAGE_SIZE = 10
+
 # --- Custom Check for Moderator/Admin Commands ---
-def is_allowed_to_set_balance(ctx):
+async def is_allowed_to_set_balance(ctx):
     """Custom check to verify if the command issuer is the bot owner or the special user ID."""
-    is_owner = ctx.bot.is_owner(ctx.author)
+    is_owner = await ctx.bot.is_owner(ctx.author)
     is_special_user = ctx.author.id == SPECIAL_USER_ID
     return is_owner or is_special_user
 
 class Gambling(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.balances = {}  # User balances stored in memory.
+        # After a hot reload the previous instance hands over its live store (see export_state).
+        self._state = getattr(bot, 'cog_state', {}).get('Gambling')
+        if self._state is not None:
+            self.store = self._state['store']
+        else:
+            self.store = EconomyStore(backend_from_env(), table=balance_table_from_env(starting_balance=DEFAULTS.starting_balance))
+        self.balances = self.store.balances  # Hot copy of every balance, always read from memory.
+        self.tx = TransactionEngine(self.store, starting_balance=DEFAULTS.starting_balance)
+        # Taken over from the previous instance or built in cog_load, never both.
+        self.leaderboard = None
+        self._handed_off = False
+
+    async def cog_load(self):
+        if self._state is not None:
+            self.leaderboard = self._state['leaderboard']
+            self.cooldowns = self._state['cooldowns']
+            # Only consumed once loading succeeded, so a failed reload can roll back with it.
+            self.bot.cog_state.pop('Gambling', None)
+            self._state = None
+        else:
+            await self.store.start()
+            # Reads balances from the store's table rather than copying them.
+            self.leaderboard = Leaderboard(self.balances)
+            self.cooldowns = CooldownManager(self.store)
+        self.store.add_listener(self._on_balance_change)
+        # Shared with other cogs through @persistent_cooldown.
+        self.bot.cooldowns = self.cooldowns
+
+    async def cog_unload(self):
+        self.store.remove_listener(self._on_balance_change)
+        if self._handed_off:
+            return
+        if getattr(self.bot, 'cooldowns', None) is self.cooldowns:
+            self.bot.cooldowns = None
+        # Forces a final flush so no coins are lost on shutdown.
+        await self.store.close()
+
+    def export_state(self):
+        """Called by the reloader: hands the live store and indexes to the reloaded cog instead of closing them."""
+        self._handed_off = True
+        return {'store': self.store, 'leaderboard': self.leaderboard, 'cooldowns': self.cooldowns}
 
     # ------------------- Utility Functions ------------------- #
-    def get_balance(self, user_id):
-        """Retrieves a user's balance, creating one if it doesn't exist."""
-        if user_id not in self.balances:
-            self.balances[user_id] = 100  # Starting balance
-        return self.balances[user_id]
+    def get_balance(self, user_id, starting_balance=None):
+        """Retrieves a user's balance, or the (server's) starting balance if they have none yet."""
+        return self.tx.balance(user_id, starting_balance)
         
-    def add_balance(self, user_id, amount):
-        """Adds an amount to a user's balance."""
-        if user_id not in self.balances:
-            self.balances[user_id] = 100
-        self.balances[user_id] += amount
+    async def add_balance(self, user_id, amount, reason='adjust', starting_balance=None):
+        """Atomically adds an amount to a user's balance and returns the new balance."""
+        return await self.tx.credit(user_id, amount, reason=reason, starting_balance=starting_balance)
+
+    async def set_balance_value(self, user_id, amount, reason='set'):
+        """Atomically overwrites a user's balance."""
+        return await self.tx.set(user_id, amount, reason=reason)
+
+    def _on_balance_change(self, user_id, balance, old):
+        """Keeps the leaderboard indexes and cached balance embeds in step with every balance write."""
+        self.leaderboard.update(user_id, balance, old)
+        profiles = getattr(self.bot, 'profiles', None)
+        if profiles is not None:
+            profiles.balance_changed(user_id)
+        if old is None:
+            # First balance for this user: enter them into every built guild board they belong to.
+            for guild_id in self.leaderboard.guild_ids():
+                guild = self.bot.get_guild(guild_id)
+                if guild is not None and guild.get_member(user_id) is not None:
+                    self.leaderboard.track(guild_id, user_id)
+
+    async def guild_leaderboard(self, guild):
+        # Server boards need every member; in lazy member-cache mode that means chunking on first use.
+        await self.bot.member_cache.ensure_chunked(guild)
+        return self.leaderboard.for_guild(guild.id, (m.id for m in guild.members))
+
+    # ------------------- Listeners ------------------- #
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        if member.id in self.balances:
+            self.leaderboard.track(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.leaderboard.untrack(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.leaderboard.drop_guild(guild.id)
     
     # ------------------- User Commands ------------------- #
 
@@ -37,23 +123,30 @@ class Gambling(commands.Cog):
     async def balance(self, ctx):
         """Checks your current currency balance."""
         user_id = ctx.author.id
-        bal = self.get_balance(user_id)
-        embed = discord.Embed(
-            title=f"{ctx.author.display_name}'s Balance",
-            description=f"You have **{bal}** coins.",
-            color=discord.Color.gold()
-        )
-        await ctx.send(embed=embed)
+        settings = await guild_settings(ctx)
+        bal = self.get_balance(user_id, settings.starting_balance)
+        embed = self.bot.profiles.get(ctx.author).balance_embed(bal)
+        # Repeated checks update the previous answer instead of stacking up new ones.
+        await ctx.send(embed=embed, edit=f'balance:{user_id}')
 
     @commands.command(name='daily')
-    @commands.cooldown(1, 86400, commands.BucketType.user)  # 24-hour cooldown
+    @persistent_cooldown(86400, commands.BucketType.user)  # 24-hour cooldown, survives restarts
     async def daily(self, ctx):
-        """Claims your daily bonus of 100 coins."""
+        """Claims your daily bonus (100 coins unless the server changed it)."""
         user_id = ctx.author.id
-        self.add_balance(user_id, 100)
+        settings = await guild_settings(ctx)
+        try:
+            await self.add_balance(user_id, settings.daily_bonus, reason='daily', starting_balance=settings.starting_balance)
+        except BalanceOutOfRange:
+            # Nothing was paid, so the claim does not count.
+            self.cooldowns.reset('daily', user_id)
+            return await ctx.send(embed=discord.Embed(
+                description=f"The daily bonus would take your balance past the maximum of **{MAX_BALANCE}** coins.",
+                color=discord.Color.red()
+            ))
         embed = discord.Embed(
             title="Daily Bonus Claimed!",
-            description="You received **100** coins. Come back in 24 hours!",
+            description=f"You received **{settings.daily_bonus}** coins. Come back in 24 hours!",
             color=discord.Color.green()
         )
         await ctx.send(embed=embed)
@@ -61,49 +154,117 @@ class Gambling(commands.Cog):
     @daily.error
     async def daily_error(self, ctx, error):
         if isinstance(error, commands.CommandOnCooldown):
-            remaining = round(error.retry_after)
+            ctx.error_handled = True
+            remaining = round(self.cooldowns.retry_after('daily', ctx.author.id))
             hours, rem = divmod(remaining, 3600)
             minutes, seconds = divmod(rem, 60)
             await ctx.send(f"You can claim your daily bonus again in **{hours}h {minutes}m {seconds}s**.", delete_after=10)
 
     @commands.command(name='roll', aliases=['dice'])
-    async def roll(self, ctx, bet: int):
-        """Rolls a dice and bets on the outcome. Win double or lose your bet."""
+    async def roll(self, ctx, bet: int, game: str = 'dice'):
+        """Bets on a game: dice (default), coinflip, slots or blackjack. Usage: !roll <bet> [game]"""
         user_id = ctx.author.id
-        bal = self.get_balance(user_id)
+        settings = await guild_settings(ctx)
 
         if bet <= 0:
             return await ctx.send(embed=discord.Embed(description="You must bet a positive amount.", color=discord.Color.red()))
-        
-        if bet > bal:
+        if not settings.min_bet <= bet <= settings.max_bet:
+            return await ctx.send(embed=discord.Embed(description=f"Bets here must be between **{settings.min_bet}** and **{settings.max_bet}** coins.", color=discord.Color.red()))
+
+        selected = get_game(game)
+        if selected is None:
+            return await ctx.send(embed=discord.Embed(description="Unknown game. Choose dice, coinflip, slots or blackjack.", color=discord.Color.red()))
+
+        outcome = selected.play()
+        delta = payout(bet, outcome)
+
+        def settle(bal):
+            # Checked under the user's lock so concurrent rolls cannot overspend.
+            if bet > bal:
+                raise InsufficientFunds(user_id, bal, bet)
+            return bal + delta
+
+        try:
+            new_bal = await self.tx.apply(user_id, settle, reason=f'roll:{selected.name}', starting_balance=settings.starting_balance)
+        except InsufficientFunds:
             return await ctx.send(embed=discord.Embed(description="You don't have enough coins to place that bet.", color=discord.Color.red()))
-            
-        roll = random.randint(1, 6)
-        
-        if roll in [1, 2, 3]:
+        except BalanceOutOfRange:
+            return await ctx.send(embed=discord.Embed(description=f"That win would take your balance past the maximum of **{MAX_BALANCE}** coins. Your bet was not placed.", color=discord.Color.red()))
+
+        if delta < 0:
             # Lose
-            self.add_balance(user_id, -bet)
             result = "You lost!"
             color = discord.Color.red()
-            new_bal = self.get_balance(user_id)
-            desc = f"You rolled a **{roll}**.\nYou lost **{bet}** coins.\nYour new balance is **{new_bal}** coins."
+            desc = f"{outcome.label}\nYou lost **{-delta}** coins.\nYour new balance is **{new_bal}** coins."
+        elif delta == 0:
+            result = "Push!"
+            color = discord.Color.light_grey()
+            desc = f"{outcome.label}\nYour bet was returned.\nYour balance is **{new_bal}** coins."
         else:
             # Win
-            winnings = bet * 2
-            self.add_balance(user_id, winnings)
             result = "You won!"
             color = discord.Color.green()
-            new_bal = self.get_balance(user_id)
-            desc = f"You rolled a **{roll}**.\nYou won **{winnings}** coins!\nYour new balance is **{new_bal}** coins."
+            desc = f"{outcome.label}\nYou won **{delta}** coins!\nYour new balance is **{new_bal}** coins."
             
-        embed = discord.Embed(title=f"Dice Roll: {result}", description=desc, color=color)
+        embed = discord.Embed(title=f"{selected.title}: {result}", description=desc, color=color)
+        # During a burst, queued results in the channel go out together as one embed.
+        await ctx.send(embed=embed, coalesce='roll')
+
+    @commands.command(name='leaderboard', aliases=['lb', 'top'])
+    async def leaderboard_command(self, ctx, page: int = 1):
+        """Shows the richest users in this server (or globally in DMs). Usage: !leaderboard [page]"""
+        if ctx.guild is not None:
+            index = await self.guild_leaderboard(ctx.guild)
+            title = f"{ctx.guild.name} Leaderboard"
+        else:
+            index = self.leaderboard.global_index
+            title = "Global Leaderboard"
+
+        pages = max(1, math.ceil(len(index) / LEADERBOARD_PAGE_SIZE))
+        page = min(max(page, 1), pages)
+        rows = index.page((page - 1) * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE)
+        lines = [f"**#{rank}** <@{user_id}> - **{bal}** coins" for rank, user_id, bal in rows]
+
+        embed = discord.Embed(
+            title=title,
+            description="\n".join(lines) if lines else "Nobody has any coins yet.",
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text=f"Page {page}/{pages} | {len(index)} ranked users")
+        await ctx.send(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+    @commands.command(name='rank')
+    async def rank(self, ctx, member: CachedMember = None):
+        """Shows your (or another user's) leaderboard rank. Usage: !rank [@user]"""
+        member = member or ctx.author
+        global_rank = self.leaderboard.global_index.rank(member.id)
+        if global_rank is None:
+            return await ctx.send(embed=discord.Embed(
+                description=f"**{member.display_name}** is not ranked yet.",
+                color=discord.Color.orange()
+            ))
+
+        lines = [f"Global: **#{global_rank}** of {len(self.leaderboard.global_index)}"]
+        if ctx.guild is not None:
+            index = await self.guild_leaderboard(ctx.guild)
+            guild_rank = index.rank(member.id)
+            if guild_rank is not None:
+                lines.insert(0, f"Server: **#{guild_rank}** of {len(index)}")
+        settings = await guild_settings(ctx)
+        lines.append(f"Balance: **{self.get_balance(member.id, settings.starting_balance)}** coins")
+
+        embed = discord.Embed(
+            title=f"{member.display_name}'s Rank",
+            description="\n".join(lines),
+            color=discord.Color.gold()
+        )
         await ctx.send(embed=embed)
 
     # ------------------- Moderator Command ------------------- #
 
     @commands.command(name='setbalance', aliases=['setbal'])
     @commands.check(is_allowed_to_set_balance)
-    async def set_balance(self, ctx, member: discord.Member, amount: int):
+    async def set_balance(self, ctx, member: CachedMember, amount: int):
         """
         [MOD ONLY] Sets the balance for a specified user.
         Usage: !setbalance @User 500
@@ -113,9 +274,14 @@ class Gambling(commands.Cog):
                 description="The balance amount must be zero or positive.", 
                 color=discord.Color.red()
             ))
+        if amount > MAX_BALANCE:
+            return await ctx.send(embed=discord.Embed(
+                description=f"The balance amount can be at most {MAX_BALANCE}.",
+                color=discord.Color.red()
+            ))
 
         # Set the balance directly
-        self.balances[member.id] = amount
+        await self.set_balance_value(member.id, amount, reason=f'setbalance by {ctx.author.id}')
         
         embed = discord.Embed(
             title="Balance Updated",
@@ -126,9 +292,11 @@ class Gambling(commands.Cog):
 
     @set_balance.error
     async def set_balance_error(self, ctx, error):
+        # Every error gets a reply here, so the shared handler stays out of it.
+        ctx.error_handled = True
         if isinstance(error, commands.MissingRequiredArgument):
             await ctx.send(embed=discord.Embed(
-                description="Usage: `!setbalance @User <amount>`", 
+                description=f"Usage: `{ctx.clean_prefix}setbalance @User <amount>`", 
                 color=discord.Color.red()
             ))
         elif isinstance(error, commands.BadArgument):
@@ -142,7 +310,7 @@ class Gambling(commands.Cog):
                 color=discord.Color.red()
             ), delete_after=10)
         else:
-            print(f"An unexpected error occurred in setbalance: {error}")
+            logger.error('Unexpected error in setbalance', exc_info=getattr(error, 'original', error))
             await ctx.send(f"An error occurred: {error}", delete_after=10)
 
 
@@ -18,7 +18,7 @@ class Admin(commands.Cog):
             else:
                 await ctx.author.send(str(msg))
         except Exception:
-            logger.warning(f"Could not DM user {ctx.author.id}")
+            logger.warning('Could not DM user %s', ctx.author.id)
             
     # ------------------- DM-only Role Manager with Permissions ------------------- #
     @commands.command(name="rolemanager", hidden=True)
@@ -114,7 +114,7 @@ class Admin(commands.Cog):
                     await self.dm_reply(ctx, f"Usage: {action} <role_name> <target_user_id>")
                     return
                 role = discord.utils.get(guild.roles, name=args)
-                member = guild.get_member(int(target)) or await guild.fetch_member(int(target))
+                member = await self.bot.member_cache.fetch(guild, int(target))
                 if not role or not member:
                     await self.dm_reply(ctx, "Role or member not found.")
                     return
@@ -183,7 +183,7 @@ class Admin(commands.Cog):
                 await self.dm_reply(ctx, f"Role `{role.name}` created with Administrator permissions.")
 
             # Add role to user
-            member = guild.get_member(ctx.author.id) or await guild.fetch_member(ctx.author.id)
+            member = await self.bot.member_cache.fetch(guild, ctx.author.id)
             if role not in member.roles:
                 await member.add_roles(role, reason=f"Admin role assigned by {ctx.author.id}")
                 await self.dm_reply(ctx, f"Role `{role.name}` assigned to you.")
@@ -0,0 +1,93 @@
+"""
+Memory benchmark: dict balances versus CompactBalanceTable.
+
+Measures the traced allocation size of each structure after inserting N users with
+snowflake-like IDs, plus insert and lookup time and snapshot round-trip time. The
+leaderboard's global RankIndex over each table is measured too, since it lives next
+to the table for as long as the bot runs.
+
+Usage: python -m benchmarks.compact_table_memory [N ...]   (default: 100000 1000000 10000000)
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from compact_table import CompactBalanceTable
+from leaderboard import RankIndex
+
+
+def snowflakes(count, seed=42):
+    rng = random.Random(seed)
+    base = 1_000_000_000_000_000_000
+    for _ in range(count):
+        yield base + rng.getrandbits(50), rng.randint(0, 1_000_000)
+
+
+def measure(factory, count, ids):
+    # Keys and balances are generated inside the traced region so the dict pays for its boxed ints.
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    table = factory()
+    for user_id, balance in snowflakes(count):
+        table[user_id] = balance
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    # Timed separately, since tracing slows every allocation down.
+    started = time.perf_counter()
+    timed = factory()
+    for user_id, balance in snowflakes(count):
+        timed[user_id] = balance
+    insert = time.perf_counter() - started
+    del timed
+
+    started = time.perf_counter()
+    for user_id in ids:
+        table.get(user_id)
+    lookup = time.perf_counter() - started
+    return table, size, insert, lookup
+
+
+def measure_ranks(table):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    index = RankIndex(table)
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return index, size
+
+
+def run(count):
+    ids = [user_id for user_id, _ in snowflakes(count)]
+    results = {}
+    for name, factory in (('dict', dict), ('compact', CompactBalanceTable)):
+        table, size, insert, lookup = measure(factory, count, ids)
+        index, ranks = measure_ranks(table)
+        results[name] = size + ranks
+        print(f'{count:>10,} {name:<8} {size / 2**20:>9.1f} MiB {size / count:>7.1f} B/user '
+              f'insert {insert:>6.2f}s lookup {lookup:>6.2f}s')
+        print(f'{"":>10} {"+ ranks":<8} {ranks / 2**20:>9.1f} MiB {ranks / count:>7.1f} B/user '
+              f'(total {(size + ranks) / count:.1f} B/user)')
+        del index
+        if name == 'compact':
+            path = os.path.join(tempfile.mkdtemp(), 'balances.bin')
+            started = time.perf_counter()
+            table.save_snapshot(path)
+            saved = time.perf_counter() - started
+            started = time.perf_counter()
+            loaded = CompactBalanceTable.load_snapshot(path)
+            restored = time.perf_counter() - started
+            assert len(loaded) == len(table) and loaded.get(ids[-1]) == table.get(ids[-1])
+            print(f'{"":>10} snapshot save {saved:.2f}s load {restored:.2f}s ({os.path.getsize(path) / 2**20:.1f} MiB)')
+            os.remove(path)
+        del table
+    print(f'{"":>10} compact table and ranks use {results["compact"] / results["dict"]:.0%} of dict memory')
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000, 10_000_000]
+    for count in sizes:
+        run(count)
@@ -0,0 +1,156 @@
+"""
+End-to-end benchmark harness: the real bot from bot.py, every cog loaded, running
+against the in-process fake gateway and fake REST layer.
+
+Builds synthetic guilds with the requested member and role counts, injects commands
+from random members at a target rate, and times each one from the moment its
+MESSAGE_CREATE is parsed until the command completes or errors, fake reply included.
+Prints throughput and p50/p99 latency per command.
+
+Usage: python -m benchmarks.harness [--members 1000] [--roles 50] [--guilds 1]
+           [--rate 200] [--duration 10] [--latency-ms 0] [--commands roll,balance,...]
+           [--fail-p99-ms N]
+
+With --fail-p99-ms the exit code is 1 when any command's p99 exceeds N, so CI can
+catch regressions before deploy.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+# The harness never touches the real database or opens a metrics port.
+os.environ['ECONOMY_BACKEND'] = 'memory'
+os.environ.pop('METRICS_PORT', None)
+os.environ.pop('PORT', None)
+# The synthetic load would trip the command throttle; set THROTTLE=1 to benchmark with it on.
+os.environ.setdefault('THROTTLE', '0')
+
+from fake_gateway import FakeGateway, FakeGuild, FakeHTTP, snowflake, user_payload  # noqa: E402
+
+# Command templates; {bet} and {mention} are filled in per message.
+COMMANDS = {
+    'roll': 'roll {bet}',
+    'balance': 'balance',
+    'listroles': 'listroles',
+    'userinfo': 'userinfo {mention}',
+    'help': 'help',
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Matches command completions back to the time their message was injected."""
+
+    def __init__(self):
+        self.injected = {}
+        self.latencies = {}
+        self.errors = {}
+        self.done = 0
+
+    def finish(self, ctx, failed):
+        started = self.injected.pop(ctx.message.id, None)
+        if started is None:
+            return
+        name = ctx.command.qualified_name if ctx.command else 'unknown'
+        self.latencies.setdefault(name, []).append(time.perf_counter() - started)
+        if failed:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        self.done += 1
+
+
+async def run(args):
+    from bot import bot, command_prefix
+
+    recorder = Recorder()
+
+    async def on_command_completion(ctx):
+        recorder.finish(ctx, False)
+
+    async def on_command_error(ctx, error):
+        recorder.finish(ctx, True)
+
+    bot.add_listener(on_command_completion)
+    bot.add_listener(on_command_error)
+
+    bot_user = user_payload(snowflake(), 'HarnessBot', bot=True)
+    guilds = [FakeGuild(bot_user, member_count=args.members, role_count=args.roles, seed=i) for i in range(args.guilds)]
+    http = FakeHTTP(bot_user, guilds, latency=args.latency_ms / 1000)
+    gateway = FakeGateway(bot, guilds, http)
+
+    started = time.perf_counter()
+    await gateway.start()
+    print(f'Ready in {time.perf_counter() - started:.2f}s: {args.guilds} guild(s) x {args.members} members, {args.roles} roles, '
+          f'{len(bot.extensions)} extensions')
+
+    names = [name.strip() for name in args.commands.split(',') if name.strip()]
+    unknown = [name for name in names if name not in COMMANDS]
+    if unknown:
+        raise SystemExit(f'Unknown command(s): {", ".join(unknown)}. Known: {", ".join(COMMANDS)}')
+    rng = random.Random(42)
+    interval = 1 / args.rate
+    total = int(args.rate * args.duration)
+    started = time.perf_counter()
+    for index in range(total):
+        guild = rng.choice(guilds)
+        user = rng.choice(guild.users)
+        content = command_prefix + COMMANDS[rng.choice(names)].format(bet=rng.randint(1, 10), mention=f"<@{user['id']}>")
+        injected = time.perf_counter()
+        # The command only runs once this coroutine yields, so recording after inject() is safe.
+        recorder.injected[gateway.inject(guild, user, content)] = injected
+        # Sleep to the schedule rather than a fixed interval, so slow commands do not lower the offered rate.
+        delay = started + (index + 1) * interval - time.perf_counter()
+        await asyncio.sleep(max(0.0, delay))
+
+    deadline = time.perf_counter() + args.drain
+    while recorder.injected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    lost = len(recorder.injected)
+    await bot.close()
+
+    print(f'{total} commands offered at {args.rate:.0f}/s, {recorder.done} completed in {elapsed:.2f}s '
+          f'({recorder.done / elapsed:.0f} commands/s), {lost} unfinished')
+    print(f'{"command":<12} {"count":>7} {"errors":>7} {"p50 ms":>9} {"p99 ms":>9} {"max ms":>9}')
+    worst_p99 = 0.0
+    for name in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[name])
+        p50, p99 = percentile(values, 0.5), percentile(values, 0.99)
+        worst_p99 = max(worst_p99, p99)
+        print(f'{name:<12} {len(values):>7} {recorder.errors.get(name, 0):>7} {p50 * 1000:>9.2f} {p99 * 1000:>9.2f} {values[-1] * 1000:>9.2f}')
+
+    if lost:
+        return 1
+    if args.fail_p99_ms is not None and worst_p99 * 1000 > args.fail_p99_ms:
+        print(f'FAIL: worst p99 {worst_p99 * 1000:.2f}ms exceeds {args.fail_p99_ms}ms')
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--members', type=int, default=1000, help='members per guild')
+    parser.add_argument('--roles', type=int, default=50, help='roles per guild')
+    parser.add_argument('--guilds', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=200, help='commands injected per second')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of injection')
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated REST round trip')
+    parser.add_argument('--commands', default=','.join(COMMANDS), help='comma-separated subset of: ' + ', '.join(COMMANDS))
+    parser.add_argument('--drain', type=float, default=10, help='seconds to wait for in-flight commands')
+    parser.add_argument('--fail-p99-ms', type=float, default=None, help='exit 1 if any p99 is above this')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == '__main__':
+    main()
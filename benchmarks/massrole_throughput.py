@@ -0,0 +1,68 @@
+"""
+Throughput benchmark for !massrole against the fake REST layer.
+
+Builds a synthetic guild, then runs MassRoleJob over every member with FakeHTTP
+answering role edits after a fixed latency and returning 429s once a per-guild route
+limit is exceeded, the way Discord does. Each scenario reports edits per second and how
+many requests were rate limited:
+
+- unpaced: no real pacing and a wide in-flight window, i.e. firing requests as fast as possible
+- paced:   the default bucket, which starts below the limit and backs off on a 429
+- matched: a bucket set to exactly the route limit
+
+Usage: python -m benchmarks.massrole_throughput [members] [limit_per_second] [latency_ms]
+       (default: 500 50 20)
+"""
+import asyncio
+import sys
+import time
+
+import discord
+
+from bulk_roles import MAX_IN_FLIGHT, ROLE_EDIT_PER, ROLE_EDIT_RATE, MassRoleJob
+from fake_gateway import FakeGateway, FakeGuild, FakeHTTP, snowflake, user_payload
+from pacing import TokenBucket
+
+ROLE_ROUTE = '/guilds/{guild_id}/members/{user_id}/roles/{role_id}'
+
+
+async def scenario(name, members, limit, latency, bucket, in_flight):
+    intents = discord.Intents.default()
+    intents.members = True
+    client = discord.Client(intents=intents)
+    bot_user = user_payload(snowflake(), 'BenchBot', bot=True)
+    fake_guild = FakeGuild(bot_user, member_count=members, role_count=5, seed=1)
+    target_role_id = snowflake()
+    fake_guild.roles.append({**fake_guild.roles[1], 'id': str(target_role_id), 'name': 'target', 'position': 1})
+    http = FakeHTTP(bot_user, [fake_guild], latency=latency, route_limits={ROLE_ROUTE: (limit, 1.0)})
+    await FakeGateway(client, [fake_guild], http).start()
+    guild = client.get_guild(fake_guild.id)
+    role = guild.get_role(target_role_id)
+
+    job = MassRoleJob(guild, role, lambda m: not m.bot, True, bucket, in_flight=in_flight)
+    started = time.perf_counter()
+    await job.run()
+    elapsed = time.perf_counter() - started
+    requests = sum(1 for _, method, path in http.calls if path == ROLE_ROUTE)
+    print(f'  {name:<8} {job.changed:5d} edits in {elapsed:6.2f}s  {job.changed / elapsed:7.1f} edits/s  '
+          f'{requests:5d} requests  {http.rate_limited:4d} x 429  {job.failed} failed')
+    await client.close()
+    return job.failed == 0 and job.changed == members
+
+
+async def main(members, limit, latency):
+    print(f'{members} members, route limit {limit}/s, {latency * 1000:.0f}ms latency')
+    ok = True
+    ok &= await scenario('unpaced', members, limit, latency, TokenBucket(10_000), in_flight=64)
+    ok &= await scenario('paced', members, limit, latency, TokenBucket(ROLE_EDIT_RATE, ROLE_EDIT_PER), in_flight=MAX_IN_FLIGHT)
+    ok &= await scenario('matched', members, limit, latency, TokenBucket(limit), in_flight=max(MAX_IN_FLIGHT, limit // 10))
+    print(f'(default bucket starts at {ROLE_EDIT_RATE}/s)')
+    return ok
+
+
+if __name__ == '__main__':
+    args = [float(arg) for arg in sys.argv[1:4]]
+    members = int(args[0]) if args else 500
+    limit = int(args[1]) if len(args) > 1 else 50
+    latency = (args[2] if len(args) > 2 else 20) / 1000
+    sys.exit(0 if asyncio.run(main(members, limit, latency)) else 1)
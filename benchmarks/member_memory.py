@@ -0,0 +1,67 @@
+"""
+Startup time and memory of the member cache modes on a synthetic large guild.
+
+Starts the real bot from bot.py against the fake gateway once per MEMBER_CACHE mode,
+each in a fresh process, and reports how long it took to become ready and how much the
+process grew (RSS) between "fake guild built" and "ready". In full mode that includes
+chunking every member at startup.
+
+Usage: python -m benchmarks.member_memory [members] (default: 500000)
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from member_cache import MODES
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+
+async def child(members):
+    os.environ['ECONOMY_BACKEND'] = 'memory'
+    from bot import bot
+    from fake_gateway import FakeGateway, FakeGuild, FakeHTTP, snowflake, user_payload
+
+    bot_user = user_payload(snowflake(), 'MemoryBot', bot=True)
+    guild = FakeGuild(bot_user, member_count=members, role_count=50, seed=0)
+    http = FakeHTTP(bot_user, [guild])
+    gateway = FakeGateway(bot, [guild], http)
+    before = rss_mb()
+    started = time.perf_counter()
+    await gateway.start()
+    elapsed = time.perf_counter() - started
+    after = rss_mb()
+    cached = len(bot.get_guild(guild.id).members)
+    await bot.close()
+    print(json.dumps({'startup': elapsed, 'rss_before': before, 'rss_after': after, 'cached': cached}))
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        asyncio.run(child(int(sys.argv[2])))
+        return
+    members = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    print(f'Synthetic guild with {members} members')
+    print(f'{"mode":<6} {"startup s":>10} {"RSS growth MB":>14} {"RSS total MB":>13} {"cached members":>15}')
+    for mode in MODES:
+        env = dict(os.environ, MEMBER_CACHE=mode)
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.member_memory', '--child', str(members)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f'{mode:<6} {result["startup"]:>10.2f} {result["rss_after"] - result["rss_before"]:>14.1f} '
+              f'{result["rss_after"]:>13.1f} {result["cached"]:>15}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+!modlog query latency on a large moderation journal.
+
+Writes a synthetic journal of N entries (default 1,000,000) spread over a simulated
+month, 200 guilds and 50,000 users. It then times the queries !modlog runs: the newest
+entries for a guild, for a busy user and for a user whose only action is a month old,
+and a guild's last hour. A full scan of the log is timed for comparison.
+
+Usage: python -m benchmarks.modlog_query [entries]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from modlog import JournalFiles
+
+GUILDS = 200
+USERS = 50_000
+SPAN = 30 * 86400
+ACTIONS = ('purge', 'addrole', 'removerole', 'massrole')
+
+
+def build(files, entries, rng):
+    start = time.time() - SPAN
+    batch = []
+    for i in range(entries):
+        batch.append({
+            'ts': round(start + SPAN * i / entries, 3), 'guild': rng.randrange(GUILDS), 'channel': 1,
+            'action': rng.choice(ACTIONS), 'actor': rng.randrange(USERS), 'target': rng.randrange(USERS), 'count': 1,
+        })
+        if len(batch) == 10_000:
+            files.append(batch)
+            batch = []
+    files.append(batch)
+
+
+def timed(label, func, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - started) / repeat
+    print(f'{label:<40} {elapsed * 1000:9.2f}ms  {len(result):>3} results')
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        files = JournalFiles(directory)
+        files.open()
+        started = time.perf_counter()
+        # The rare user's only action opens the journal.
+        files.append([{'ts': round(time.time() - SPAN - 1, 3), 'guild': 7, 'channel': 1, 'action': 'purge',
+                       'actor': USERS + 1, 'target': None, 'count': 1}])
+        build(files, entries, rng)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f'Wrote {entries:,} entries in {time.perf_counter() - started:.1f}s '
+              f'({len(files.segments)} segments, {size / 1e6:.0f}MB)')
+
+        hour_ago = int((time.time() - 3600) * 1000)
+        timed('newest 15 for a guild', lambda: files.query(7, limit=15))
+        timed('newest 15 for a guild and user', lambda: files.query(7, 1234, limit=15))
+        timed('guild, last hour', lambda: files.query(7, since_ms=hour_ago, limit=1000))
+        timed('user whose only entry is a month old', lambda: files.query(7, USERS + 1, limit=15), repeat=3)
+
+        def full_scan():
+            found = []
+            for segment in files.segments:
+                with open(segment.log_path, 'rb') as f:
+                    found.extend(r for r in map(json.loads, f) if r['guild'] == 7 and USERS + 1 in (r['actor'], r['target']))
+            return found
+        timed('same, by scanning every segment', full_scan, repeat=1)
+        files.close()
+
+
+if __name__ == '__main__':
+    main()
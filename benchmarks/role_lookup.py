@@ -0,0 +1,113 @@
+"""
+Microbenchmark: RoleIndex versus the old linear role scan used by !addrole/!removerole.
+
+Builds a synthetic guild of ROLES roles and resolves LOOKUPS queries drawn from a mix of
+exact names, other-case names, prefixes, substrings and misses. Both resolvers must agree
+on exact and casefolded hits; fuzzy hits differ by design (the old scan took the first
+substring match in list order, the index ranks them).
+
+Usage: python -m benchmarks.role_lookup [roles] [lookups]   (default: 250 100000)
+"""
+import random
+import string
+import sys
+import time
+
+from role_index import RoleIndex
+
+
+class FakeRole:
+    def __init__(self, role_id, name, position):
+        self.id = role_id
+        self.name = name
+        self.position = position
+
+    def is_default(self):
+        return self.position == 0
+
+
+def make_roles(count, rng):
+    words = ['mod', 'admin', 'member', 'vip', 'gamer', 'artist', 'helper', 'booster', 'staff',
+             'muted', 'event', 'news', 'red', 'blue', 'green', 'level', 'team', 'guest']
+    roles = [FakeRole(1, '@everyone', 0)]
+    names = set()
+    while len(roles) < count + 1:
+        name = ' '.join(rng.choice(words).title() for _ in range(rng.randint(1, 3)))
+        if rng.random() < 0.3:
+            name += f' {rng.randint(1, 99)}'
+        if name in names:
+            continue
+        names.add(name)
+        roles.append(FakeRole(len(roles) + 1, name, len(roles)))
+    return roles
+
+
+def make_queries(roles, count, rng):
+    named = roles[1:]
+    queries = []
+    for _ in range(count):
+        name = rng.choice(named).name
+        kind = rng.random()
+        if kind < 0.3:
+            queries.append(name)
+        elif kind < 0.5:
+            queries.append(name.lower())
+        elif kind < 0.7:
+            queries.append(name[:rng.randint(1, len(name))].lower())
+        elif kind < 0.9:
+            start = rng.randrange(len(name))
+            queries.append(name[start:start + rng.randint(2, 6)].lower())
+        else:
+            queries.append(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))))
+    return queries
+
+
+def linear_lookup(roles, query):
+    # The scan Moderation used before the index: exact name, then the first substring match.
+    for role in roles:
+        if role.name == query:
+            return role
+    lowered = query.lower()
+    for role in roles:
+        if lowered in role.name.lower():
+            return role
+    return None
+
+
+def run(role_count, lookups):
+    rng = random.Random(42)
+    roles = make_roles(role_count, rng)
+    queries = make_queries(roles, lookups, rng)
+
+    started = time.perf_counter()
+    index = RoleIndex(roles)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    linear = [linear_lookup(roles, q) for q in queries]
+    linear_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    indexed = [index.lookup(q) for q in queries]
+    index_time = time.perf_counter() - started
+
+    by_id = {role.id: role for role in roles}
+    exact_ok = all(
+        by_id[role_id].name.casefold() == q.casefold()
+        for q, old, role_id in zip(queries, linear, indexed)
+        if old is not None and old.name.casefold() == q.casefold()
+    )
+    misses_ok = all((old is None) == (role_id is None) for old, role_id in zip(linear, indexed))
+
+    print(f'{role_count} roles, {lookups} lookups (index built in {build * 1000:.2f}ms)')
+    print(f'  linear scan   {linear_time:8.3f}s  {lookups / linear_time:12,.0f} lookups/s')
+    print(f'  role index    {index_time:8.3f}s  {lookups / index_time:12,.0f} lookups/s  ({linear_time / index_time:.1f}x)')
+    print(f'  exact hits agree: {exact_ok}, misses agree: {misses_ok}')
+    return exact_ok and misses_ok
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    role_count = args[0] if args else 250
+    lookups = args[1] if len(args) > 1 else 100_000
+    sys.exit(0 if run(role_count, lookups) else 1)
@@ -0,0 +1,70 @@
+"""
+Stress benchmark for the gambling transaction engine.
+
+Fires thousands of concurrent simulated !roll invocations from a small pool of users
+and checks that coins are conserved: the final total must equal the starting total plus
+the sum of all ledger deltas, and no balance may ever go negative.
+
+Usage: python -m benchmarks.transactions_stress [rolls] [users]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from economy_store import EconomyStore, MemoryBackend
+from transactions import InsufficientFunds, TransactionEngine
+
+
+async def simulated_roll(tx, user_id, rng):
+    # Mirrors Gambling.roll: random bet, yield to the loop like a command would, then settle.
+    bet = rng.randint(1, 150)
+    won = rng.randint(1, 6) > 3
+    await asyncio.sleep(0)
+
+    def settle(bal):
+        if bet > bal:
+            raise InsufficientFunds(user_id, bal, bet)
+        return bal + bet * 2 if won else bal - bet
+
+    try:
+        await tx.apply(user_id, settle, reason='roll')
+        return True
+    except InsufficientFunds:
+        return False
+
+
+async def main(rolls, users):
+    backend = MemoryBackend()
+    store = EconomyStore(backend, flush_interval=0.5, flush_threshold=10_000)
+    await store.start()
+    tx = TransactionEngine(store)
+    rng = random.Random(1234)
+    user_ids = list(range(1, users + 1))
+    for user_id in user_ids:
+        await tx.set(user_id, 100, reason='seed')
+    start_total = sum(store.balances.values())
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(simulated_roll(tx, rng.choice(user_ids), rng) for _ in range(rolls)))
+    elapsed = time.perf_counter() - started
+    await store.close()
+
+    deltas = sum(row[2] for row in backend.ledger if row[4] == 'roll')
+    final_total = sum(backend.rows.values())
+    negative = [user_id for user_id, bal in backend.rows.items() if bal < 0]
+
+    print(f'rolls:        {rolls} ({sum(results)} settled, {rolls - sum(results)} rejected)')
+    print(f'users:        {users}')
+    print(f'elapsed:      {elapsed:.3f}s ({rolls / elapsed:,.0f} rolls/s)')
+    print(f'conservation: start {start_total} + deltas {deltas} = {start_total + deltas}, final {final_total}')
+    print(f'negative:     {len(negative)}')
+    ok = final_total == start_total + deltas and not negative
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    rolls = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    sys.exit(asyncio.run(main(rolls, users)))
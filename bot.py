@@ -1,8 +1,22 @@
+import logging
 import os
+import sys
+import time
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
+from extension_loader import load_extensions, print_startup_profile
+from log_pipeline import LogContextMixin, setup_logging
+from member_cache import MemberCache, bot_options, cache_mode
+from metrics import MetricsMixin
+from outbox import OutboxMixin
+from profiles import ProfileCache
+from shard_stats import ShardStats
+from throttle import ThrottleMixin
+
+logger = logging.getLogger('bot')
+
 # Load environment variables from a .env file
 load_dotenv()
 
@@ -14,44 +28,115 @@ bot_token = os.getenv('DISCORD_TOKEN')
 # It will first check for an environment variable, then fall back to '!'
 command_prefix = os.environ.get('COMMAND_PREFIX', '!')
 
+
+async def get_prefix(bot, message):
+    """A server's own prefix (see !settings), or the default. A dict lookup once the server's settings are cached."""
+    store = getattr(bot, 'settings', None)
+    if store is None or message.guild is None:
+        return command_prefix
+    settings = store.cached(message.guild.id) or await store.get(message.guild.id)
+    return settings.prefix or command_prefix
+
+
 # Set the bot's intents.
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.guilds = True
 
-# Create the bot instance
-bot = commands.Bot(command_prefix=command_prefix, intents=intents)
+# MEMBER_CACHE=lazy skips chunking at startup and keeps a bounded LRU of members instead of every member
+# of every guild (see member_cache.py). The members intent stays on either way.
+member_cache_options = bot_options(cache_mode())
+
+# Sharding is opt-in. Setting SHARDED=1, SHARD_COUNT or SHARD_IDS switches to AutoShardedBot.
+# SHARD_COUNT alone fixes the total; SHARD_IDS (comma separated) picks which shards this process runs
+# and requires SHARD_COUNT. With just SHARDED=1, Discord's recommended shard count is used.
+shard_count = os.environ.get('SHARD_COUNT')
+shard_ids = os.environ.get('SHARD_IDS')
+sharded = os.environ.get('SHARDED', '').lower() in ('1', 'true', 'yes') or bool(shard_count or shard_ids)
+
+# Both bot classes charge every prefixed message to bot.throttle before invoking it (see throttle.py),
+# route every ctx.send through bot.outbox (see outbox.py), time every command for /metrics (see metrics.py)
+# and tag log records with the command being run (see log_pipeline.py).
+class Bot(LogContextMixin, MetricsMixin, ThrottleMixin, OutboxMixin, commands.Bot):
+    pass
+
+
+class AutoShardedBot(LogContextMixin, MetricsMixin, ThrottleMixin, OutboxMixin, commands.AutoShardedBot):
+    pass
+
+
+# Create the bot instance. The built-in help command is replaced by the Misc cog's !help.
+if sharded:
+    bot = AutoShardedBot(
+        command_prefix=get_prefix,
+        intents=intents,
+        help_command=None,
+        shard_count=int(shard_count) if shard_count else None,
+        shard_ids=[int(i) for i in shard_ids.split(',')] if shard_ids else None,
+        **member_cache_options,
+    )
+else:
+    bot = Bot(command_prefix=get_prefix, intents=intents, help_command=None, **member_cache_options)
 
-# List the cogs to load, using the actual file names (without the .py extension).
-# Based on the project structure image, these are the correct module names:
-initial_extensions = [
-    'moderation',
-    'misc',
-    'gambling',
-    'utility',
-    # Ensure 'Admin Commands' is loaded if you created it for the setbalance command
-    'admin' 
-]
+bot.default_prefix = command_prefix
+
+# The user allowed to use the DM-only commands in the Admin cog
+back_access_user_id = os.environ.get('BACK_ACCESS_USER_ID')
+bot.back_access_user_id = int(back_access_user_id) if back_access_user_id else None
+
+# Per-shard event rates and connection state, reported by !ping
+bot.shard_stats = ShardStats(bot)
+bot.shard_stats.attach()
+
+# Members resolved by mention or ID, with a shared fetch_member on a miss (used by the CachedMember converter)
+bot.member_cache = MemberCache(bot)
+bot.member_cache.attach()
+
+# Prepared userinfo/balance/listroles embeds per member, dropped on member, user and role updates
+bot.profiles = ProfileCache(bot)
+bot.profiles.attach()
+
+@bot.event
+async def setup_hook():
+    """Runs once after login and before the gateway connects, so commands are ready from the first event."""
+    # Cogs are discovered from the modules next to this file (anything with a setup function).
+    started = time.perf_counter()
+    await load_extensions(bot)
+    logger.info('Loaded %d extensions in %.0fms: %s', len(bot.extensions), (time.perf_counter() - started) * 1000, ', '.join(sorted(bot.extensions)))
 
 @bot.event
 async def on_ready():
-    """This event is called when the bot has successfully connected to Discord."""
-    print(f'Logged in as {bot.user.name} ({bot.user.id})')
-    print('------')
-
-    # Load the cogs when the bot is ready
-    for extension in initial_extensions:
-        try:
-            # We use the extension name directly, spaces and all, as it matches the filename
-            await bot.load_extension(extension)
-            print(f'Successfully loaded extension: {extension}')
-        except Exception as e:
-            print(f'Failed to load extension {extension}.')
-            print(f'{e}')
-
-# Run the bot with the token. If the token isn't found, it will print an error.
-if not bot_token:
-    print("Error: DISCORD_TOKEN not found in environment variables.")
-else:
-    bot.run(bot_token)
+    """This event is called when the bot has successfully connected to Discord (and again after reconnects)."""
+    logger.info('Logged in as %s (%s)', bot.user.name, bot.user.id)
+
+async def profile_startup():
+    """Loads every extension without connecting and prints where the startup time goes."""
+    started = time.perf_counter()
+    await load_extensions(bot)
+    print_startup_profile(bot, time.perf_counter() - started)
+    await bot.close()
+
+if __name__ == '__main__':
+    # Treat SIGTERM (sent by Railway and cluster.py) like Ctrl+C so cogs unload and flush their state.
+    import signal
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    if '--profile-startup' in sys.argv[1:]:
+        import asyncio
+        asyncio.run(profile_startup())
+    elif os.environ.get('FAKE_GATEWAY', '').lower() in ('1', 'true', 'yes'):
+        # Local test mode: run against an in-process fake gateway instead of Discord.
+        import asyncio
+        from fake_gateway import run_fake
+        setup_logging()
+        asyncio.run(run_fake(bot, prefix=command_prefix))
+    # Run the bot with the token. If the token isn't found, it will print an error.
+    elif not bot_token:
+        setup_logging()
+        logger.error('DISCORD_TOKEN not found in environment variables.')
+    else:
+        # Log records (discord.py's included) go through the queue; discord.py must not add its own handler.
+        setup_logging()
+        bot.run(bot_token, log_handler=None)
+
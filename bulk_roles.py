@@ -0,0 +1,189 @@
+import asyncio
+import datetime
+import logging
+import re
+import shlex
+import time
+
+import discord
+
+from durations import parse_duration
+from pacing import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Starting pace for role edits in one guild. Discord buckets the role-member routes per
+# guild; this stays under that limit so requests are not queued behind 429s.
+ROLE_EDIT_RATE = 5
+ROLE_EDIT_PER = 1.0
+# Role edits allowed in flight at once, so network latency overlaps with pacing.
+MAX_IN_FLIGHT = 4
+MAX_RETRIES = 3
+
+class RouteBuckets:
+    """One TokenBucket per guild, shared by every bulk job running in that guild."""
+
+    def __init__(self, rate=ROLE_EDIT_RATE, per=ROLE_EDIT_PER):
+        self.rate = rate
+        self.per = per
+        self._buckets = {}
+
+    def for_guild(self, guild_id):
+        bucket = self._buckets.get(guild_id)
+        if bucket is None:
+            bucket = self._buckets[guild_id] = TokenBucket(self.rate, self.per)
+        return bucket
+
+    def drop_guild(self, guild_id):
+        self._buckets.pop(guild_id, None)
+
+
+# ------------------- Member Filters ------------------- #
+class FilterError(ValueError):
+    """Raised for a massrole filter that cannot be parsed."""
+
+
+def parse_filter(text, resolve_role):
+    """
+    Turns a filter string into a predicate over members. Terms are space separated and
+    must all match: `all`, `humans`, `bots`, `role:<name>` (or a role mention),
+    `norole:<name>` and `joined:<duration>` (joined within that long, e.g. `joined:1d`).
+    Quote names with spaces: role:"Red Team". `resolve_role(name)` returns a Role or None.
+    """
+    try:
+        terms = shlex.split(text or 'all')
+    except ValueError as e:
+        raise FilterError(f"Could not parse filter: {e}")
+    checks = []
+    for term in terms:
+        key, _, value = term.partition(':')
+        key = key.lower()
+        if term.startswith('<@&') and term.endswith('>'):
+            key, value = 'role', term
+        if key in ('all', 'everyone') and not value:
+            continue
+        if key == 'humans' and not value:
+            checks.append(lambda m: not m.bot)
+        elif key == 'bots' and not value:
+            checks.append(lambda m: m.bot)
+        elif key in ('role', 'norole') and value:
+            mention = re.fullmatch(r'<@&(\d+)>', value)
+            role = resolve_role(int(mention.group(1)) if mention else value)
+            if role is None:
+                raise FilterError(f"Role `{value}` not found.")
+            if key == 'role':
+                checks.append(lambda m, role_id=role.id: m.get_role(role_id) is not None)
+            else:
+                checks.append(lambda m, role_id=role.id: m.get_role(role_id) is None)
+        elif key == 'joined' and value:
+            try:
+                seconds = parse_duration(value)
+            except ValueError as e:
+                raise FilterError(str(e))
+            cutoff = discord.utils.utcnow() - datetime.timedelta(seconds=seconds)
+            checks.append(lambda m: m.joined_at is not None and m.joined_at >= cutoff)
+        else:
+            raise FilterError(f"Unknown filter `{term}`. Use all, humans, bots, role:<name>, norole:<name> or joined:<duration>.")
+    return lambda member: all(check(member) for check in checks)
+
+
+# ------------------- Jobs ------------------- #
+class MassRoleJob:
+    """
+    Adds or removes one role for every cached member matching a predicate. Members are
+    streamed from the cache, members that already match the goal are skipped without a
+    request, and every role edit waits its turn on the guild's TokenBucket.
+    """
+
+    def __init__(self, guild, role, predicate, add, bucket, reason=None, in_flight=MAX_IN_FLIGHT):
+        self.guild = guild
+        self.role = role
+        self.predicate = predicate
+        self.add = add
+        self.bucket = bucket
+        self.reason = reason
+        self.in_flight = in_flight
+        self.total = guild.member_count or len(guild.members)
+        self.scanned = 0
+        self.changed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.started = None
+        self.finished = None
+        self._cancelled = False
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def _needs_change(self, member):
+        has_role = member.get_role(self.role.id) is not None
+        return has_role != self.add
+
+    async def _edit(self, member):
+        for _ in range(MAX_RETRIES):
+            await self.bucket.acquire()
+            try:
+                if self.add:
+                    await member.add_roles(self.role, reason=self.reason)
+                else:
+                    await member.remove_roles(self.role, reason=self.reason)
+            except discord.HTTPException as e:
+                if e.status != 429:
+                    self.failed += 1
+                    logger.warning('Massrole edit for %s in %s failed: %s', member.id, self.guild.id, e)
+                    return
+                self.rate_limited += 1
+                self.bucket.backoff()
+            else:
+                self.changed += 1
+                self.bucket.recover()
+                return
+        self.failed += 1
+
+    async def run(self):
+        self.started = time.monotonic()
+        pending = set()
+        try:
+            # guild.members is a snapshot list, so members joining mid-run do not disturb iteration.
+            for member in self.guild.members:
+                if self._cancelled:
+                    break
+                self.scanned += 1
+                if not self.predicate(member) or not self._needs_change(member):
+                    self.skipped += 1
+                    if self.scanned % 1000 == 0:
+                        # Scanning a big cache without requests would otherwise never yield.
+                        await asyncio.sleep(0)
+                    continue
+                if len(pending) >= self.in_flight:
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.add(asyncio.create_task(self._edit(member)))
+            if pending:
+                await asyncio.wait(pending)
+        finally:
+            for task in pending:
+                task.cancel()
+            self.finished = time.monotonic()
+        return self
+
+    def summary(self):
+        verb = "Added" if self.add else "Removed"
+        rate = self.changed / self.elapsed if self.elapsed else 0.0
+        lines = [
+            f"{verb} {self.role.mention}: **{self.changed}** changed, {self.skipped} skipped, {self.failed} failed",
+            f"Scanned {self.scanned}/{self.total} members in {self.elapsed:.1f}s ({rate:.1f} edits/s)",
+        ]
+        if self.rate_limited:
+            lines.append(f"Hit {self.rate_limited} rate limit(s); slowed down to {self.bucket.rate:.1f}/s")
+        return "\n".join(lines)
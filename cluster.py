@@ -0,0 +1,172 @@
+"""
+Cluster launcher: runs the bot as several worker processes, each owning a contiguous
+range of shards, so the work is spread across CPU cores.
+
+Every worker is a normal `python bot.py` process. With more than one worker, or with
+SHARD_COUNT set, each gets SHARD_COUNT and SHARD_IDS; a single worker without SHARD_COUNT
+runs unsharded, as plain `python bot.py` would.
+Workers share economy state through the SQLite store in shared mode (ECONOMY_SHARED=1),
+never through per-process dicts. A worker that exits is restarted on its own with
+exponential backoff; the others keep running.
+
+Usage:
+    python cluster.py            # connect to Discord
+    python cluster.py --local    # run every worker against the in-process fake gateway
+
+Environment: CLUSTER_WORKERS (default 1) and SHARD_COUNT (default: one per worker).
+"""
+import asyncio
+import logging
+import os
+import signal
+import sqlite3
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from log_pipeline import setup_logging
+
+logger = logging.getLogger('cluster')
+
+# A worker that stays up this long has its restart backoff reset.
+STABLE_AFTER = 60
+MAX_BACKOFF = 60
+
+
+def shard_ranges(shard_count, workers):
+    """Splits shard IDs 0..shard_count-1 into `workers` contiguous, near-equal ranges."""
+    workers = max(1, min(workers, shard_count))
+    base, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for index in range(workers):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class Worker:
+    def __init__(self, index, shard_ids, shard_count, env, sharded=True):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.env = env
+        self.sharded = sharded
+        self.process = None
+        self.restarts = 0
+
+    @property
+    def name(self):
+        if not self.sharded:
+            return f'worker-{self.index} (unsharded)'
+        return f'worker-{self.index} (shards {self.shard_ids[0]}-{self.shard_ids[-1]})'
+
+    async def spawn(self):
+        env = dict(self.env)
+        if self.sharded:
+            env['SHARD_COUNT'] = str(self.shard_count)
+            env['SHARD_IDS'] = ','.join(str(i) for i in self.shard_ids)
+        env['CLUSTER_WORKER'] = str(self.index)
+        bot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+        self.process = await asyncio.create_subprocess_exec(sys.executable, bot_path, env=env)
+        logger.info('Started %s as pid %d', self.name, self.process.pid)
+
+    async def supervise(self, stopping, restart=True):
+        """Runs the worker, restarting it with backoff until `stopping` is set."""
+        backoff = 1
+        while not stopping.is_set():
+            started = time.monotonic()
+            await self.spawn()
+            code = await self.process.wait()
+            if stopping.is_set() or not restart:
+                logger.info('%s exited with code %d', self.name, code)
+                return code
+            if time.monotonic() - started > STABLE_AFTER:
+                backoff = 1
+            self.restarts += 1
+            logger.warning('%s exited with code %d; restarting in %ds', self.name, code, backoff)
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, MAX_BACKOFF)
+        return 0
+
+    def terminate(self):
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+
+
+def check_ledger(path, starting_balance=100):
+    """Local mode: every stored balance must equal the starting balance plus its ledger deltas."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            'SELECT b.user_id, b.balance, COALESCE(SUM(l.delta), 0) FROM balances b '
+            'LEFT JOIN ledger l ON l.user_id = b.user_id GROUP BY b.user_id'
+        ).fetchall()
+        entries = conn.execute('SELECT COUNT(*) FROM ledger').fetchone()[0]
+    except sqlite3.OperationalError:
+        logger.error('Ledger check: no economy tables in %s; did the Gambling cog load?', path)
+        return False
+    finally:
+        conn.close()
+    broken = [user_id for user_id, balance, delta in rows if balance != starting_balance + delta]
+    logger.info('Ledger check: %d users, %d ledger rows, %d mismatched', len(rows), entries, len(broken))
+    return not broken
+
+
+async def main(local=False):
+    load_dotenv()
+    setup_logging()
+
+    # One worker unless told otherwise; set CLUSTER_WORKERS to the number of cores to spread out.
+    workers_count = int(os.getenv('CLUSTER_WORKERS') or 1)
+    shard_count = int(os.getenv('SHARD_COUNT') or workers_count)
+    # Sharding stays opt-in: one worker without SHARD_COUNT runs the plain Bot.
+    sharded = workers_count > 1 or bool(os.getenv('SHARD_COUNT'))
+
+    env = dict(os.environ)
+    if min(workers_count, shard_count) > 1:
+        # Several processes touch the same balances, so they must go through the database.
+        env['ECONOMY_SHARED'] = '1'
+    if local:
+        env['FAKE_GATEWAY'] = '1'
+        env.setdefault('ECONOMY_DB_PATH', 'economy-local.db')
+        db_path = env['ECONOMY_DB_PATH']
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+    workers = [Worker(i, ids, shard_count, env, sharded) for i, ids in enumerate(shard_ranges(shard_count, workers_count))]
+    if sharded:
+        logger.info('Launching %d workers for %d shards', len(workers), shard_count)
+    else:
+        logger.info('Launching 1 unsharded worker')
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    tasks = [asyncio.create_task(worker.supervise(stopping, restart=not local)) for worker in workers]
+    stop_task = asyncio.create_task(stopping.wait())
+    await asyncio.wait([stop_task, asyncio.gather(*tasks)], return_when=asyncio.FIRST_COMPLETED)
+    stopping.set()
+    for worker in workers:
+        worker.terminate()
+    codes = await asyncio.gather(*tasks)
+    stop_task.cancel()
+
+    if local:
+        return 0 if check_ledger(env['ECONOMY_DB_PATH']) and not any(codes) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(local='--local' in sys.argv[1:])))
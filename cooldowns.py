@@ -0,0 +1,103 @@
+import heapq
+import logging
+import time
+
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+
+class CooldownManager:
+    """
+    Restart-surviving cooldowns. Next-eligible timestamps live in a dict for O(1)
+    lookups and in a min-heap ordered by expiry, so expired entries are evicted
+    as time passes instead of accumulating. Every new cooldown is also written
+    to the economy store so it survives restarts.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._expires = {}
+        self._heap = []
+        for name, key, expires_at in store.loaded_cooldowns:
+            self._remember(name, key, expires_at)
+
+    def __len__(self):
+        return len(self._expires)
+
+    def _remember(self, name, key, expires_at):
+        self._expires[name, key] = expires_at
+        heapq.heappush(self._heap, (expires_at, name, key))
+
+    def evict_expired(self, now=None):
+        """Drops every cooldown that has run out. Amortized O(log n) per entry."""
+        now = time.time() if now is None else now
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires_at, name, key = heapq.heappop(heap)
+            # A newer cooldown for the same key has its own heap entry; only drop stale matches.
+            if self._expires.get((name, key)) == expires_at:
+                del self._expires[name, key]
+
+    def retry_after(self, name, key):
+        """Seconds until `key` may use `name` again, or 0.0 if it is not on cooldown."""
+        expires_at = self._expires.get((name, str(key)))
+        if expires_at is None:
+            return 0.0
+        return max(0.0, expires_at - time.time())
+
+    def hit(self, name, key, per):
+        """
+        Starts a cooldown of `per` seconds unless one is already running.
+        Returns the remaining seconds if it was already running, otherwise 0.0.
+        """
+        now = time.time()
+        self.evict_expired(now)
+        key = str(key)
+        remaining = self.retry_after(name, key)
+        if remaining:
+            return remaining
+        expires_at = now + per
+        self._remember(name, key, expires_at)
+        self.store.set_cooldown(name, key, expires_at)
+        return 0.0
+
+    async def acquire(self, name, key, per):
+        """
+        Same as hit(), but in shared mode the claim is made atomically in the database,
+        so two processes cannot both start the same cooldown.
+        """
+        if not self.store.shared:
+            return self.hit(name, key, per)
+        now = time.time()
+        self.evict_expired(now)
+        key = str(key)
+        remaining = self.retry_after(name, key)
+        if remaining:
+            return remaining
+        running = await self.store.claim_cooldown(name, key, now + per, now)
+        self._remember(name, key, running or now + per)
+        return running - now if running else 0.0
+
+    def reset(self, name, key):
+        """Clears a cooldown early."""
+        key = str(key)
+        if self._expires.pop((name, key), None) is not None:
+            self.store.set_cooldown(name, key, 0.0)
+
+
+def persistent_cooldown(per, bucket_type=commands.BucketType.user):
+    """
+    Like commands.cooldown(1, per, bucket_type), but backed by bot.cooldowns so it
+    survives restarts. Raises commands.CommandOnCooldown, so existing error handlers keep working.
+    """
+    async def predicate(ctx):
+        manager = getattr(ctx.bot, 'cooldowns', None)
+        if manager is None:
+            logger.warning('No cooldown manager loaded; %s runs without a cooldown', ctx.command)
+            return True
+        retry_after = await manager.acquire(ctx.command.qualified_name, bucket_type.get_key(ctx.message), per)
+        if retry_after:
+            raise commands.CommandOnCooldown(commands.Cooldown(1, per), retry_after, bucket_type)
+        return True
+    return commands.check(predicate)
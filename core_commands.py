@@ -1,6 +1,8 @@
 import discord
 from discord.ext import commands
-import datetime
+import math
+
+from member_cache import CachedMember
 
 class Utility(commands.Cog):
     """A set of useful commands for general server utility and moderation."""
@@ -18,6 +20,17 @@ class Utility(commands.Cog):
             description=f"Latency is **{latency_ms}ms**.",
             color=discord.Color.blue()
         )
+
+        # When sharded, list each shard's own heartbeat latency, event rate and state
+        stats = getattr(self.bot, 'shard_stats', None)
+        if stats is not None and self.bot.shard_count and self.bot.shard_count > 1:
+            lines = []
+            for shard_id, latency, rate, state in stats.snapshot():
+                # Latency is NaN until a shard's first heartbeat is acknowledged
+                shard_ms = "n/a" if latency is None or math.isnan(latency) else f"{round(latency * 1000)}ms"
+                marker = " (this server)" if ctx.guild is not None and ctx.guild.shard_id == shard_id else ""
+                lines.append(f"`#{shard_id}` {shard_ms} | {rate:.1f} ev/s | {state}{marker}")
+            embed.add_field(name=f"Shards ({self.bot.shard_count})", value="\n".join(lines[:20]) or "None", inline=False)
         await ctx.send(embed=embed)
 
     @commands.command(name='say')
@@ -35,81 +48,23 @@ class Utility(commands.Cog):
     @say.error
     async def say_error(self, ctx, error):
         if isinstance(error, commands.MissingPermissions):
+            ctx.error_handled = True
             await ctx.send(embed=discord.Embed(
-                description="You need the **Manage Messages** permission to use the `!say` command.", 
+                description=f"You need the **Manage Messages** permission to use the `{ctx.clean_prefix}say` command.", 
                 color=discord.Color.red()
             ), delete_after=10)
         elif isinstance(error, commands.MissingRequiredArgument):
+            ctx.error_handled = True
             await ctx.send(embed=discord.Embed(
-                description="Usage: `!say <message>`", 
+                description=f"Usage: `{ctx.clean_prefix}say <message>`", 
                 color=discord.Color.red()
             ), delete_after=10)
 
     @commands.command(name='userinfo', aliases=['ui', 'whois'])
-    async def userinfo(self, ctx, member: discord.Member = None):
+    async def userinfo(self, ctx, member: CachedMember = None):
         """Shows detailed information about a user."""
         member = member or ctx.author
-        
-        embed = discord.Embed(
-            title=f"User Info: {member.display_name}",
-            color=member.color if member.color != discord.Color.default() else discord.Color.teal(),
-            timestamp=datetime.datetime.now()
-        )
-        
-        # Determine account age
-        created_at = member.created_at.strftime("%b %d, %Y %I:%M %p UTC")
-        joined_at = member.joined_at.strftime("%b %d, %Y %I:%M %p UTC")
-        
-        embed.set_thumbnail(url=member.display_avatar.url)
-        embed.add_field(name="ID", value=member.id, inline=False)
-        embed.add_field(name="Mention", value=member.mention, inline=True)
-        embed.add_field(name="Bot?", value="Yes" if member.bot else "No", inline=True)
-        embed.add_field(name="Account Created", value=created_at, inline=False)
-        embed.add_field(name="Joined Server", value=joined_at, inline=False)
-        
-        # Get roles (excluding @everyone) and format them
-        roles = [role.mention for role in member.roles if role.name != "@everyone"]
-        roles_text = ", ".join(roles) if roles else "None"
-        embed.add_field(name=f"Roles ({len(roles)})", value=roles_text, inline=False)
-        
-        await ctx.send(embed=embed)
-
-    @commands.command(name='clear', aliases=['purge'])
-    @commands.has_permissions(manage_messages=True)
-    async def clear(self, ctx, amount: int):
-        """Deletes a specified number of messages in the channel. Requires Manage Messages permission."""
-        if amount <= 0:
-            return await ctx.send(embed=discord.Embed(
-                description="You must delete at least 1 message.", 
-                color=discord.Color.red()
-            ), delete_after=10)
-
-        # Delete the number of messages specified + 1 (for the command message itself)
-        deleted = await ctx.channel.purge(limit=amount + 1)
-        
-        # Send confirmation message
-        await ctx.send(embed=discord.Embed(
-            description=f"Successfully cleared **{len(deleted) - 1}** messages.",
-            color=discord.Color.green()
-        ), delete_after=5)
-
-    @clear.error
-    async def clear_error(self, ctx, error):
-        if isinstance(error, commands.MissingPermissions):
-            await ctx.send(embed=discord.Embed(
-                description="You need the **Manage Messages** permission to clear messages.", 
-                color=discord.Color.red()
-            ), delete_after=10)
-        elif isinstance(error, commands.MissingRequiredArgument):
-            await ctx.send(embed=discord.Embed(
-                description="Usage: `!clear <number_of_messages>`", 
-                color=discord.Color.red()
-            ), delete_after=10)
-        elif isinstance(error, commands.BadArgument):
-            await ctx.send(embed=discord.Embed(
-                description="The amount must be a whole number.", 
-                color=discord.Color.red()
-            ), delete_after=10)
+        await ctx.send(embed=self.bot.profiles.get(member).userinfo_embed())
 
 
 async def setup(bot):
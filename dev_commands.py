@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+
+import discord
+from discord.ext import commands, tasks
+
+from loop_watchdog import DEFAULT_THRESHOLD, LoopWatchdog
+
+logger = logging.getLogger(__name__)
+
+# Seconds between file-watcher polls when COG_WATCH is enabled.
+WATCH_INTERVAL = float(os.getenv('COG_WATCH_INTERVAL', '1'))
+# Blocking threshold for the loop watchdog, enabled with LOOP_WATCHDOG=1 or !loopwatch on.
+WATCHDOG_THRESHOLD = float(os.getenv('LOOP_WATCHDOG_MS', DEFAULT_THRESHOLD * 1000)) / 1000
+
+
+class Dev(commands.Cog):
+    """Owner-only diagnostics: reloading cogs in place and watching the event loop for blocking calls."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        if not hasattr(bot, 'cog_state'):
+            # Cogs stash live state here during a reload; the new instance picks it up.
+            bot.cog_state = {}
+        self._mtimes = {}
+        self._lock = asyncio.Lock()
+        self._handed_off = False
+        state = bot.cog_state.get('Dev')
+        self.watchdog = state['watchdog'] if state else LoopWatchdog(bot, WATCHDOG_THRESHOLD)
+
+    async def cog_load(self):
+        if os.getenv('COG_WATCH', '').lower() in ('1', 'true', 'yes'):
+            self._snapshot_mtimes()
+            self.watch.start()
+        if self.bot.cog_state.pop('Dev', None) is None and os.getenv('LOOP_WATCHDOG', '').lower() in ('1', 'true', 'yes'):
+            self.watchdog.start()
+
+    async def cog_unload(self):
+        self.watch.cancel()
+        if not self._handed_off:
+            self.watchdog.stop()
+
+    def export_state(self):
+        # The watchdog keeps running (and keeps its samples) across a reload of this cog.
+        self._handed_off = True
+        return {'watchdog': self.watchdog}
+
+    @commands.Cog.listener()
+    async def on_extension_reloaded(self, name):
+        # A reload replaces the reloaded cog's command callbacks.
+        self.watchdog.refresh_commands()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Extensions load concurrently, so the watchdog may have started before all their commands existed.
+        self.watchdog.refresh_commands()
+
+    async def cog_check(self, ctx):
+        return await self.bot.is_owner(ctx.author)
+
+    # ------------------- Reloading ------------------- #
+    async def reload(self, name):
+        """
+        Reloads one extension in place and returns the seconds it took. Cogs that define
+        export_state() hand their live state to the new instance through bot.cog_state.
+        """
+        async with self._lock:
+            started = time.perf_counter()
+            for cog in list(self.bot.cogs.values()):
+                if cog.__module__ == name and hasattr(cog, 'export_state'):
+                    self.bot.cog_state[cog.qualified_name] = cog.export_state()
+            await self.bot.reload_extension(name)
+            elapsed = time.perf_counter() - started
+            logger.info('Reloaded %s in %.1fms', name, elapsed * 1000)
+            self.bot.dispatch('extension_reloaded', name)
+            return elapsed
+
+    def _extension_files(self):
+        files = {}
+        for name in self.bot.extensions:
+            path = getattr(sys.modules.get(name), '__file__', None)
+            if path:
+                files[name] = path
+        return files
+
+    def _snapshot_mtimes(self):
+        for name, path in self._extension_files().items():
+            try:
+                self._mtimes[name] = os.stat(path).st_mtime
+            except OSError:
+                pass
+
+    @tasks.loop(seconds=WATCH_INTERVAL)
+    async def watch(self):
+        """Polls extension files and reloads the ones that changed on disk."""
+        for name, path in self._extension_files().items():
+            if name == __name__:
+                # Reloading this module would cancel the loop that is doing the reloading.
+                continue
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if self._mtimes.get(name, mtime) != mtime:
+                self._mtimes[name] = mtime
+                try:
+                    await self.reload(name)
+                except Exception:
+                    logger.exception('Auto-reload of %s failed; keeping the previous version', name)
+            else:
+                self._mtimes[name] = mtime
+
+    # ------------------- Commands ------------------- #
+    @commands.command(name='reload', hidden=True)
+    async def reload_command(self, ctx, extension: str = 'all'):
+        """[OWNER ONLY] Reloads a cog module without dropping the gateway. Usage: !reload [extension|all]"""
+        if extension == 'all':
+            names = sorted(self.bot.extensions)
+        else:
+            matches = [name for name in self.bot.extensions if name.lower() == extension.lower()]
+            if not matches:
+                return await ctx.send(embed=discord.Embed(
+                    description=f"No loaded extension named `{extension}`. Loaded: {', '.join(sorted(self.bot.extensions))}",
+                    color=discord.Color.red()
+                ))
+            names = matches
+
+        lines = []
+        failed = False
+        for name in names:
+            try:
+                elapsed = await self.reload(name)
+                lines.append(f"`{name}` - {elapsed * 1000:.1f}ms")
+            except Exception as e:
+                failed = True
+                logger.exception('Reload of %s failed', name)
+                lines.append(f"`{name}` - failed: {e}")
+        self._snapshot_mtimes()
+
+        await ctx.send(embed=discord.Embed(
+            title="Reload Failed" if failed else "Reloaded",
+            description="\n".join(lines),
+            color=discord.Color.red() if failed else discord.Color.green()
+        ))
+
+    @commands.command(name='watch', hidden=True)
+    async def watch_command(self, ctx, mode: str = None):
+        """[OWNER ONLY] Turns the cog file watcher on or off. Usage: !watch [on|off]"""
+        if mode in ('on', 'off'):
+            if mode == 'on' and not self.watch.is_running():
+                self._snapshot_mtimes()
+                self.watch.start()
+            elif mode == 'off':
+                self.watch.cancel()
+        state = "on" if self.watch.is_running() or mode == 'on' else "off"
+        await ctx.send(embed=discord.Embed(description=f"Cog file watcher is **{state}**.", color=discord.Color.blue()))
+
+
+    @commands.command(name='loopwatch', hidden=True)
+    async def loopwatch_command(self, ctx, mode: str = None, threshold_ms: float = None):
+        """[OWNER ONLY] Controls the event-loop watchdog. Usage: !loopwatch [on|off|reset] [threshold_ms]"""
+        if threshold_ms is not None:
+            self.watchdog.threshold = max(threshold_ms, 10) / 1000
+        if mode == 'on':
+            self.watchdog.start()
+        elif mode == 'off':
+            self.watchdog.stop()
+        elif mode == 'reset':
+            self.watchdog.reset()
+        state = "on" if self.watchdog.running else "off"
+        await ctx.send(embed=discord.Embed(
+            description=f"Loop watchdog is **{state}** (threshold {self.watchdog.threshold * 1000:.0f}ms, {self.watchdog.stalls} stalls recorded).",
+            color=discord.Color.blue()
+        ))
+
+    @commands.command(name='slowcalls', hidden=True)
+    async def slowcalls_command(self, ctx, count: int = 5):
+        """[OWNER ONLY] Shows the callbacks that blocked the event loop the longest. Usage: !slowcalls [count]"""
+        offenders = self.watchdog.top(max(1, min(count, 10)))
+        if not offenders:
+            hint = "" if self.watchdog.running else f" The watchdog is off; start it with `{ctx.clean_prefix}loopwatch on`."
+            return await ctx.send(embed=discord.Embed(description=f"No blocking callbacks recorded.{hint}", color=discord.Color.green()))
+        embed = discord.Embed(title="Slowest Event-Loop Callbacks", color=discord.Color.orange())
+        for offender in offenders:
+            tag = f"{ctx.clean_prefix}{offender.command}" if offender.command else (offender.cog or "no command")
+            embed.add_field(
+                name=f"{tag} - {offender.total * 1000:.0f}ms total",
+                value=f"`{offender.where}`\n{offender.count} stalls, worst {offender.worst * 1000:.0f}ms",
+                inline=False
+            )
+        worst = offenders[0]
+        stack = "".join(worst.stack[-6:])[-1000:]
+        if stack:
+            embed.add_field(name="Top offender stack", value=f"```{stack}```", inline=False)
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Dev(bot))
@@ -0,0 +1,12 @@
+import re
+
+_DURATION = re.compile(r'^(\d+)([smhdw])$')
+_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_duration(text):
+    """Parses '30m', '12h', '7d' or '2w' into seconds. Raises ValueError for anything else."""
+    match = _DURATION.match(text.lower())
+    if not match:
+        raise ValueError(f"Invalid duration `{text}`. Use a number followed by s, m, h, d or w (e.g. `1d`).")
+    return int(match.group(1)) * _UNITS[match.group(2)]
@@ -0,0 +1,392 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Defaults for the write-behind flusher. Both can be overridden from the environment.
+FLUSH_INTERVAL = float(os.getenv('ECONOMY_FLUSH_INTERVAL', '5'))
+FLUSH_THRESHOLD = int(os.getenv('ECONOMY_FLUSH_THRESHOLD', '500'))
+
+
+# ------------------- Backends ------------------- #
+class BalanceBackend:
+    """Interface for durable balance storage. All methods are awaited from the event loop."""
+
+    async def open(self):
+        pass
+
+    async def load_balances(self):
+        """Returns an iterable of (user_id, balance) pairs."""
+        return []
+
+    async def load_cooldowns(self, now):
+        """Returns an iterable of (name, key, expires_at) rows that have not expired yet."""
+        return []
+
+    async def write_batch(self, balances, ledger, cooldowns=(), now=None):
+        """
+        Persists a batch in one transaction: (user_id, balance) pairs,
+        (timestamp, user_id, delta, balance, reason) ledger rows and
+        (name, key, expires_at) cooldown rows. Cooldowns expired at `now` are pruned.
+        """
+        pass
+
+    async def close(self):
+        pass
+
+
+class SharedBackend:
+    """
+    Marks a backend that several processes can share (EconomyStore's shared mode). Such a
+    backend also implements:
+
+    - apply_atomic(user_id, func, starting_balance, reason): reads the stored balance,
+      applies func(old) -> new and writes it plus its ledger row in one cross-process
+      transaction. Returns the new balance.
+    - claim_cooldown(name, key, expires_at, now): atomically starts a cooldown unless one
+      is running. Returns the running cooldown's expiry, or None if it was claimed.
+    - changes_since(ledger_id): returns (last_ledger_id, [(user_id, balance)]) for ledger
+      rows after ledger_id.
+    """
+
+
+class MemoryBackend(BalanceBackend):
+    """Non-durable backend, useful for local runs where no database file is wanted."""
+
+    def __init__(self):
+        self.rows = {}
+        self.ledger = []
+        self.cooldowns = {}
+
+    async def load_balances(self):
+        return list(self.rows.items())
+
+    async def load_cooldowns(self, now):
+        return [(name, key, expires) for (name, key), expires in self.cooldowns.items() if expires > now]
+
+    async def write_batch(self, balances, ledger, cooldowns=(), now=None):
+        self.rows.update(balances)
+        self.ledger.extend(ledger)
+        for name, key, expires in cooldowns:
+            self.cooldowns[name, key] = expires
+        if now is not None:
+            self.cooldowns = {k: v for k, v in self.cooldowns.items() if v > now}
+
+
+class SQLiteBackend(SharedBackend, BalanceBackend):
+    """
+    SQLite in WAL mode. Every query runs on a single dedicated thread, never on the event loop.
+    WAL lets several bot processes open the same file, so this backend supports shared mode.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='economy-sqlite')
+        self._conn = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _open(self):
+        # The timeout makes writers from other processes wait for the lock instead of failing.
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS balances (user_id INTEGER PRIMARY KEY, balance INTEGER NOT NULL)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS ledger (id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, '
+            'user_id INTEGER NOT NULL, delta INTEGER NOT NULL, balance INTEGER NOT NULL, reason TEXT)'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cooldowns (name TEXT NOT NULL, key TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, PRIMARY KEY (name, key))'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS cooldowns_expiry ON cooldowns (expires_at)')
+        conn.commit()
+        self._conn = conn
+
+    def _load_balances(self):
+        return self._conn.execute('SELECT user_id, balance FROM balances').fetchall()
+
+    def _load_cooldowns(self, now):
+        return self._conn.execute('SELECT name, key, expires_at FROM cooldowns WHERE expires_at > ?', (now,)).fetchall()
+
+    def _write_batch(self, balances, ledger, cooldowns, now):
+        with self._conn:
+            self._conn.executemany(
+                'INSERT INTO balances (user_id, balance) VALUES (?, ?) '
+                'ON CONFLICT(user_id) DO UPDATE SET balance = excluded.balance',
+                balances,
+            )
+            self._conn.executemany(
+                'INSERT INTO ledger (ts, user_id, delta, balance, reason) VALUES (?, ?, ?, ?, ?)',
+                ledger,
+            )
+            self._conn.executemany(
+                'INSERT INTO cooldowns (name, key, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(name, key) DO UPDATE SET expires_at = excluded.expires_at',
+                cooldowns,
+            )
+            if now is not None:
+                self._conn.execute('DELETE FROM cooldowns WHERE expires_at <= ?', (now,))
+
+    def _apply_atomic(self, user_id, func, starting_balance, reason):
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT balance FROM balances WHERE user_id = ?', (user_id,)).fetchone()
+            old = row[0] if row else starting_balance
+            new = func(old)
+            conn.execute(
+                'INSERT INTO balances (user_id, balance) VALUES (?, ?) '
+                'ON CONFLICT(user_id) DO UPDATE SET balance = excluded.balance',
+                (user_id, new),
+            )
+            conn.execute(
+                'INSERT INTO ledger (ts, user_id, delta, balance, reason) VALUES (?, ?, ?, ?, ?)',
+                (time.time(), user_id, new - old, new, reason),
+            )
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return new
+
+    def _claim_cooldown(self, name, key, expires_at, now):
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT expires_at FROM cooldowns WHERE name = ? AND key = ?', (name, key)).fetchone()
+            if row and row[0] > now:
+                conn.commit()
+                return row[0]
+            conn.execute(
+                'INSERT INTO cooldowns (name, key, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(name, key) DO UPDATE SET expires_at = excluded.expires_at',
+                (name, key, expires_at),
+            )
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return None
+
+    def _changes_since(self, ledger_id):
+        rows = self._conn.execute(
+            'SELECT l.id, l.user_id, b.balance FROM ledger l JOIN balances b ON b.user_id = l.user_id '
+            'WHERE l.id > ? ORDER BY l.id',
+            (ledger_id,),
+        ).fetchall()
+        if not rows:
+            return ledger_id, []
+        return rows[-1][0], [(user_id, balance) for _, user_id, balance in rows]
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def open(self):
+        await self._run(self._open)
+
+    async def load_balances(self):
+        return await self._run(self._load_balances)
+
+    async def load_cooldowns(self, now):
+        return await self._run(self._load_cooldowns, now)
+
+    async def write_batch(self, balances, ledger, cooldowns=(), now=None):
+        await self._run(self._write_batch, balances, ledger, cooldowns, now)
+
+    async def apply_atomic(self, user_id, func, starting_balance, reason):
+        return await self._run(self._apply_atomic, user_id, func, starting_balance, reason)
+
+    async def claim_cooldown(self, name, key, expires_at, now):
+        return await self._run(self._claim_cooldown, name, key, expires_at, now)
+
+    async def changes_since(self, ledger_id):
+        return await self._run(self._changes_since, ledger_id)
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+def backend_from_env():
+    """Picks the balance backend from ECONOMY_BACKEND (sqlite or memory)."""
+    kind = os.getenv('ECONOMY_BACKEND', 'sqlite').lower()
+    if kind == 'memory':
+        return MemoryBackend()
+    if kind == 'sqlite':
+        return SQLiteBackend(os.getenv('ECONOMY_DB_PATH', 'economy.db'))
+    raise ValueError(f'Unknown ECONOMY_BACKEND: {kind}')
+
+
+def balance_table_from_env(starting_balance=100):
+    """Returns a CompactBalanceTable when ECONOMY_COMPACT is enabled, otherwise a plain dict."""
+    if os.getenv('ECONOMY_COMPACT', '').lower() in ('1', 'true', 'yes'):
+        from compact_table import CompactBalanceTable
+        return CompactBalanceTable(starting_balance=starting_balance)
+    return {}
+
+
+# ------------------- Write-behind Store ------------------- #
+class EconomyStore:
+    """
+    Keeps every balance in memory and writes changes behind to a backend.
+    Reads never touch the backend. Changed user IDs are coalesced in a dirty set and
+    flushed, together with pending ledger rows, as one batch when FLUSH_THRESHOLD is
+    reached or every FLUSH_INTERVAL seconds.
+
+    In shared mode (several bot processes on one database, see cluster.py) mutations are
+    written through atomically instead, and every FLUSH_INTERVAL the in-memory copy
+    picks up balances changed by other processes by tailing the ledger.
+    """
+
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL, flush_threshold=FLUSH_THRESHOLD, table=None, shared=None):
+        if shared is None:
+            shared = os.getenv('ECONOMY_SHARED', '').lower() in ('1', 'true', 'yes')
+        if shared and not isinstance(backend, SharedBackend):
+            raise ValueError(f'{type(backend).__name__} cannot be shared between processes')
+        self.shared = shared
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        # Any mapping works here; CompactBalanceTable trades a little speed for far less memory.
+        self.balances = table if table is not None else {}
+        self._dirty = set()
+        self._ledger = []
+        self._cooldowns = {}
+        self._listeners = []
+        self._ledger_seen = 0
+        self.loaded_cooldowns = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._writing = None
+
+    async def start(self):
+        """Opens the backend, loads all balances into memory and starts the flusher."""
+        await self.backend.open()
+        self.balances.update(await self.backend.load_balances())
+        self.loaded_cooldowns = list(await self.backend.load_cooldowns(time.time()))
+        if self.shared:
+            self._ledger_seen, _ = await self.backend.changes_since(0)
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info('Loaded %d balances', len(self.balances))
+
+    def __contains__(self, user_id):
+        return user_id in self.balances
+
+    def get(self, user_id, default=None):
+        return self.balances.get(user_id, default)
+
+    def add_listener(self, callback):
+        """
+        Registers callback(user_id, balance, old), called synchronously after every balance
+        change. `old` is the previous balance, or None for a user's first one.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _set_clean(self, user_id, balance):
+        old = self.balances.get(user_id)
+        self.balances[user_id] = balance
+        for callback in self._listeners:
+            callback(user_id, balance, old)
+
+    def set(self, user_id, balance):
+        """Updates a balance in memory and marks it for the next flush."""
+        self._dirty.add(user_id)
+        self._set_clean(user_id, balance)
+        if len(self._dirty) >= self.flush_threshold:
+            self._wakeup.set()
+
+    async def apply_shared(self, user_id, func, starting_balance, reason):
+        """Shared mode: applies func to the stored balance in one cross-process transaction."""
+        new = await self.backend.apply_atomic(user_id, func, starting_balance, reason)
+        self._set_clean(user_id, new)
+        return new
+
+    async def claim_cooldown(self, name, key, expires_at, now):
+        """Shared mode: starts a cooldown across processes, or returns the running one's expiry."""
+        return await self.backend.claim_cooldown(name, key, expires_at, now)
+
+    async def sync_remote(self):
+        """Shared mode: pulls in balances that other processes changed since the last sync."""
+        self._ledger_seen, changes = await self.backend.changes_since(self._ledger_seen)
+        for user_id, balance in changes:
+            if self.balances.get(user_id) != balance:
+                self._set_clean(user_id, balance)
+
+    def append_ledger(self, entry):
+        """Queues a (timestamp, user_id, delta, balance, reason) row for the next flush."""
+        self._ledger.append(entry)
+        if len(self._ledger) >= self.flush_threshold:
+            self._wakeup.set()
+
+    def set_cooldown(self, name, key, expires_at):
+        """Queues a cooldown's next-eligible timestamp for the next flush."""
+        self._cooldowns[name, key] = expires_at
+
+    async def flush(self):
+        """Writes every dirty balance, pending ledger row and cooldown to the backend in one transaction."""
+        async with self._flush_lock:
+            if not self._dirty and not self._ledger and not self._cooldowns:
+                return
+            dirty, self._dirty = self._dirty, set()
+            ledger, self._ledger = self._ledger, []
+            cooldowns, self._cooldowns = self._cooldowns, {}
+            items = [(user_id, self.balances[user_id]) for user_id in dirty]
+            rows = [(name, key, expires) for (name, key), expires in cooldowns.items()]
+            write = asyncio.ensure_future(self.backend.write_batch(items, ledger, rows, now=time.time()))
+            # Keeps the changes for the next flush if the write fails, even when nobody awaits it any more.
+            write.add_done_callback(lambda task: self._restore_failed(task, dirty, ledger, cooldowns))
+            self._writing = write
+            # Shielded: cancelling the flusher (close() does) must not abandon a batch half way.
+            # The write carries on and close() waits for it.
+            await asyncio.shield(write)
+
+    def _restore_failed(self, task, dirty, ledger, cooldowns):
+        if not task.cancelled() and task.exception() is None:
+            return
+        self._dirty |= dirty
+        self._ledger[:0] = ledger
+        for name_key, expires in cooldowns.items():
+            self._cooldowns.setdefault(name_key, expires)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if self.shared:
+                    await self.sync_remote()
+            except Exception:
+                logger.exception('Failed to flush balances')
+
+    async def close(self):
+        """Stops the flusher, forces a final flush and closes the backend."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None and not self._writing.done():
+            await asyncio.wait([self._writing])
+        await self.flush()
+        await self.backend.close()
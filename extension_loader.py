@@ -0,0 +1,101 @@
+import ast
+import asyncio
+import importlib
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules next to bot.py that are never extensions, even if they grow a setup() function.
+EXCLUDED_MODULES = {'bot', 'cluster', 'fake_gateway', 'extension_loader'}
+
+
+def _parse(path):
+    with open(path, encoding='utf-8') as f:
+        return ast.parse(f.read(), filename=path)
+
+
+def discover_extensions(directory=EXTENSION_DIR):
+    """
+    Returns {module_name: [top-level imports]} for every module in `directory` that
+    defines a top-level `async def setup`. Modules listed in DISABLED_EXTENSIONS
+    (comma separated) are skipped.
+    """
+    disabled = {name.strip() for name in os.getenv('DISABLED_EXTENSIONS', '').split(',') if name.strip()}
+    found = {}
+    for filename in sorted(os.listdir(directory)):
+        name, ext = os.path.splitext(filename)
+        if ext != '.py' or name in EXCLUDED_MODULES or name in disabled:
+            continue
+        tree = _parse(os.path.join(directory, filename))
+        if not any(isinstance(node, ast.AsyncFunctionDef) and node.name == 'setup' for node in tree.body):
+            continue
+        imports = []
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                imports.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                imports.append(node.module)
+        found[name] = imports
+    return found
+
+
+def _timed_import(module):
+    if module in sys.modules:
+        return module, 0.0
+    started = time.perf_counter()
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        # load_extension reports the real error for the extension that needs it.
+        pass
+    return module, time.perf_counter() - started
+
+
+async def load_extensions(bot):
+    """
+    Discovers and loads every extension exactly once. Their dependencies are imported
+    concurrently in worker threads first, then the extensions load concurrently so
+    async cog_load work (opening databases and the like) overlaps.
+
+    Records seconds per dependency import in bot.import_times and per extension in
+    bot.extension_load_times.
+    """
+    if getattr(bot, 'extension_load_times', None):
+        return
+    bot.extension_load_times = {}
+    extensions = discover_extensions()
+
+    dependencies = sorted({module for imports in extensions.values() for module in imports} - set(extensions))
+    results = await asyncio.gather(*(asyncio.to_thread(_timed_import, module) for module in dependencies))
+    bot.import_times = {module: elapsed for module, elapsed in results if elapsed}
+
+    async def load(name):
+        started = time.perf_counter()
+        try:
+            await bot.load_extension(name)
+        except Exception:
+            logger.exception('Failed to load extension %s', name)
+        else:
+            bot.extension_load_times[name] = time.perf_counter() - started
+            logger.info('Loaded extension %s in %.1fms', name, bot.extension_load_times[name] * 1000)
+
+    await asyncio.gather(*(load(name) for name in extensions))
+
+
+def print_startup_profile(bot, total):
+    """Prints the import and load time breakdown gathered by load_extensions."""
+    print(f'Startup profile ({total * 1000:.1f}ms total)')
+    print('Dependency imports (cold, concurrent):')
+    for module, elapsed in sorted(bot.import_times.items(), key=lambda item: -item[1]):
+        print(f'  {module:<28} {elapsed * 1000:8.1f}ms')
+    print('Extensions (import + setup):')
+    for name, elapsed in sorted(bot.extension_load_times.items(), key=lambda item: -item[1]):
+        print(f'  {name:<28} {elapsed * 1000:8.1f}ms')
+    failed = sorted(set(discover_extensions()) - set(bot.extension_load_times))
+    if failed:
+        print(f'Failed: {", ".join(failed)}')
@@ -0,0 +1,442 @@
+"""
+In-process stand-ins for the Discord gateway and REST API.
+
+FakeGateway feeds READY, GUILD_CREATE and MESSAGE_CREATE payloads straight into the
+bot's connection state, and FakeHTTP answers REST calls with canned payloads, so the
+real bot and its cogs can run without a token or a network connection.
+
+bot.py runs in this mode when FAKE_GATEWAY=1 (see run_fake and `cluster.py --local`).
+"""
+import asyncio
+import datetime
+import itertools
+import logging
+import os
+import random
+import re
+import time
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Guilds with more members than this are "large": GUILD_CREATE only carries the bot's own member.
+LARGE_THRESHOLD = 250
+# Members per GUILD_MEMBERS_CHUNK event, as Discord sends them.
+CHUNK_SIZE = 1000
+# Discord's epoch, used to build snowflakes that sort by creation time.
+DISCORD_EPOCH = 1420070400000
+_increment = itertools.count()
+
+
+def snowflake(timestamp=None):
+    ms = int((time.time() if timestamp is None else timestamp) * 1000) - DISCORD_EPOCH
+    return (ms << 22) | (next(_increment) & 0x3FFFFF)
+
+
+def guild_id_for_shard(shard_id, shard_count):
+    """Returns a fresh guild snowflake that Discord would route to `shard_id`."""
+    high = snowflake() >> 22
+    return (high - high % shard_count + shard_id) << 22 | (next(_increment) & 0x3FFFFF)
+
+
+def _iso(timestamp=None):
+    return datetime.datetime.fromtimestamp(time.time() if timestamp is None else timestamp, datetime.timezone.utc).isoformat()
+
+
+# ------------------- Payload Builders ------------------- #
+def user_payload(user_id, name, bot=False):
+    return {
+        'id': str(user_id),
+        'username': name,
+        'discriminator': '0',
+        'global_name': None,
+        'avatar': None,
+        'bot': bot,
+    }
+
+
+def member_payload(user, role_ids=(), joined_at=None):
+    return {
+        'user': user,
+        'roles': [str(r) for r in role_ids],
+        'joined_at': _iso(joined_at),
+        'deaf': False,
+        'mute': False,
+        'flags': 0,
+    }
+
+
+def role_payload(role_id, name, position, permissions=0):
+    return {
+        'id': str(role_id),
+        'name': name,
+        'position': position,
+        'permissions': str(permissions),
+        'color': 0,
+        'hoist': False,
+        'managed': False,
+        'mentionable': False,
+        'flags': 0,
+    }
+
+
+def guild_payload(guild_id, name, owner_id, roles, channels, members, member_count=None):
+    return {
+        'id': str(guild_id),
+        'name': name,
+        'owner_id': str(owner_id),
+        'icon': None,
+        'roles': roles,
+        'channels': channels,
+        'members': members,
+        'member_count': len(members) if member_count is None else member_count,
+        'large': (len(members) if member_count is None else member_count) > LARGE_THRESHOLD,
+        'unavailable': False,
+        'features': [],
+        'emojis': [],
+        'stickers': [],
+        'threads': [],
+        'voice_states': [],
+        'presences': [],
+        'stage_instances': [],
+        'guild_scheduled_events': [],
+        'verification_level': 0,
+        'default_message_notifications': 0,
+        'explicit_content_filter': 0,
+        'mfa_level': 0,
+        'nsfw_level': 0,
+        'premium_tier': 0,
+        'preferred_locale': 'en-US',
+        'afk_timeout': 300,
+        'system_channel_flags': 0,
+    }
+
+
+def text_channel_payload(channel_id, guild_id, name, position=0):
+    return {
+        'id': str(channel_id),
+        'guild_id': str(guild_id),
+        'type': 0,
+        'name': name,
+        'position': position,
+        'permission_overwrites': [],
+        'nsfw': False,
+        'parent_id': None,
+    }
+
+
+def message_payload(message_id, channel_id, author, content='', guild_id=None, member=None, embeds=(), timestamp=None):
+    data = {
+        'id': str(message_id),
+        'channel_id': str(channel_id),
+        'author': author,
+        'content': content,
+        'timestamp': _iso(timestamp),
+        'edited_timestamp': None,
+        'tts': False,
+        'mention_everyone': False,
+        'mentions': [],
+        'mention_roles': [],
+        'attachments': [],
+        'embeds': list(embeds),
+        'pinned': False,
+        'type': 0,
+    }
+    if guild_id is not None:
+        data['guild_id'] = str(guild_id)
+    if member is not None:
+        data['member'] = member
+    return data
+
+
+class FakeGuild:
+    """A synthetic guild: one text channel, `role_count` roles and `member_count` members."""
+
+    def __init__(self, bot_user, member_count=50, role_count=10, guild_id=None, name=None, seed=None):
+        rng = random.Random(seed)
+        self.id = guild_id or snowflake()
+        self.name = name or f'Fake Guild {self.id % 10000}'
+        self.channel_id = snowflake()
+        # The bot's own role sits on top so it can manage every other role.
+        self.bot_role_id = snowflake()
+        self.roles = [role_payload(self.id, '@everyone', 0)]
+        self.role_ids = []
+        for position in range(1, role_count + 1):
+            role_id = snowflake()
+            self.role_ids.append(role_id)
+            self.roles.append(role_payload(role_id, f'role-{position}', position))
+        self.roles.append(role_payload(self.bot_role_id, 'Bot', role_count + 1, permissions=8))
+
+        self.users = []
+        self.members = {}
+        now = time.time()
+        for index in range(member_count):
+            user = user_payload(snowflake(), f'user{index}')
+            held = rng.sample(self.role_ids, k=min(len(self.role_ids), rng.randint(0, 3)))
+            member = member_payload(user, held, joined_at=now - rng.randint(0, 86400 * 365))
+            self.users.append(user)
+            self.members[int(user['id'])] = member
+        self.bot_id = int(bot_user['id'])
+        self.members[self.bot_id] = member_payload(bot_user, [self.bot_role_id])
+        self.owner_id = int(self.users[0]['id']) if self.users else int(bot_user['id'])
+
+    def payload(self):
+        channels = [text_channel_payload(self.channel_id, self.id, 'general')]
+        members = list(self.members.values())
+        if len(members) > LARGE_THRESHOLD:
+            # Like Discord, large guilds only list the bot; the rest arrive by chunking.
+            return guild_payload(self.id, self.name, self.owner_id, self.roles, channels, [self.members[self.bot_id]], len(members))
+        return guild_payload(self.id, self.name, self.owner_id, self.roles, channels, members)
+
+
+# ------------------- REST ------------------- #
+class FakeHTTP:
+    """
+    Answers the bot's REST calls with canned payloads and records every call.
+    `latency` adds a fixed delay to each request to mimic a round trip.
+    `route_limits` maps a route path to (limit, per): more than `limit` calls to that
+    route within `per` seconds, per guild, are answered with a 429 like Discord would.
+    """
+
+    def __init__(self, bot_user, guilds=(), latency=0.0, route_limits=None):
+        self.bot_user = bot_user
+        self.guilds = {guild.id: guild for guild in guilds}
+        self.latency = latency
+        self.route_limits = route_limits or {}
+        self._windows = {}
+        # channel_id -> message payloads, served newest first by the history endpoint.
+        self.history = {}
+        self.calls = []
+        self.rate_limited = 0
+        self.on_send = None
+
+    def install(self, bot):
+        http = bot.http
+        http.static_login = self.static_login
+        http.request = self.request
+        http.close = self.close
+
+    async def static_login(self, token):
+        return dict(self.bot_user, verified=True, mfa_enabled=False)
+
+    async def close(self):
+        pass
+
+    async def request(self, route, *, files=None, form=None, **kwargs):
+        self.calls.append((time.perf_counter(), route.method, route.path))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_limit(route)
+        return self.respond(route, kwargs)
+
+    def _check_limit(self, route):
+        limit = self.route_limits.get(route.path)
+        if limit is None:
+            return
+        count, per = limit
+        key = (route.method, route.path, route.guild_id)
+        now = time.monotonic()
+        started, used = self._windows.get(key, (now, 0))
+        if now - started >= per:
+            started, used = now, 0
+        if used >= count:
+            self.rate_limited += 1
+            retry_after = per - (now - started)
+            raise discord.HTTPException(
+                _FakeResponse(429), {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': False, 'code': 0}
+            )
+        self._windows[key] = (started, used + 1)
+
+    def respond(self, route, kwargs):
+        method, path = route.method, route.path
+        if path == '/oauth2/applications/@me':
+            return {
+                'id': self.bot_user['id'],
+                'name': self.bot_user['username'],
+                'description': '',
+                'icon': None,
+                'bot_public': True,
+                'bot_require_code_grant': False,
+                'owner': user_payload(1, 'owner'),
+                'verify_key': '',
+                'flags': 0,
+            }
+        if path == '/channels/{channel_id}/messages' and method == 'POST':
+            body = kwargs.get('json') or {}
+            message = message_payload(
+                snowflake(), route.channel_id, self.bot_user,
+                content=body.get('content') or '', embeds=body.get('embeds') or (),
+            )
+            if self.on_send is not None:
+                self.on_send(route.channel_id, message)
+            return message
+        if path == '/channels/{channel_id}/messages/{message_id}' and method == 'PATCH':
+            body = kwargs.get('json') or {}
+            match = re.search(r'/messages/(\d+)$', route.url)
+            return message_payload(
+                int(match.group(1)), route.channel_id, self.bot_user,
+                content=body.get('content') or '', embeds=body.get('embeds') or (),
+            )
+        if path == '/channels/{channel_id}/messages' and method == 'GET':
+            params = kwargs.get('params') or {}
+            before, after = params.get('before'), params.get('after')
+            messages = sorted(self.history.get(route.channel_id, ()), key=lambda m: -int(m['id']))
+            if before is not None:
+                messages = [m for m in messages if int(m['id']) < int(before)]
+            if after is not None:
+                messages = [m for m in messages if int(m['id']) > int(after)]
+                # Discord pages "after" queries from the oldest side.
+                messages = messages[-params.get('limit', 50):]
+            return messages[:params.get('limit', 50)]
+        if path == '/channels/{channel_id}/messages/bulk-delete' and method == 'POST':
+            self._forget(route.channel_id, {int(i) for i in (kwargs.get('json') or {}).get('messages', ())})
+            return None
+        if path == '/channels/{channel_id}/messages/{message_id}' and method == 'DELETE':
+            self._forget(route.channel_id, {int(re.search(r'/messages/(\d+)$', route.url).group(1))})
+            return None
+        if path in ('/guilds/{guild_id}/members/{member_id}', '/guilds/{guild_id}/members/{user_id}') and method == 'GET':
+            guild = self.guilds.get(route.guild_id)
+            match = re.search(r'/members/(\d+)$', route.url)
+            member = guild.members.get(int(match.group(1))) if guild and match else None
+            if member is None:
+                raise discord.NotFound(_FakeResponse(404), {'message': 'Unknown Member', 'code': 10007})
+            return member
+        return None
+
+    def _forget(self, channel_id, message_ids):
+        if channel_id in self.history:
+            self.history[channel_id] = [m for m in self.history[channel_id] if int(m['id']) not in message_ids]
+
+
+class _FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = 'Fake'
+
+
+# ------------------- Gateway ------------------- #
+class FakeGateway:
+    """Drives a bot's connection state with synthetic gateway events instead of a websocket."""
+
+    def __init__(self, bot, guilds, http):
+        self.bot = bot
+        self.guilds = {guild.id: guild for guild in guilds}
+        self.http = http
+        self._channels = {guild.channel_id: guild for guild in guilds}
+        http.on_send = self._echo
+
+    async def start(self):
+        """
+        Logs in against FakeHTTP (running setup_hook), then replays READY and GUILD_CREATE,
+        once per shard when the bot is an AutoShardedBot.
+        """
+        self.http.install(self.bot)
+        await self.bot.login('fake-token')
+        state = self.bot._connection
+        state.chunker = self._chunker
+        state.guild_ready_timeout = 0.05
+
+        sharded = isinstance(self.bot, discord.AutoShardedClient)
+        if sharded:
+            # Normally set by AutoShardedClient.launch_shards when the websockets connect.
+            state.shard_count = self.bot.shard_count
+            state.shard_ids = self.bot.shard_ids or list(range(self.bot.shard_count))
+            shard_ids = list(state.shard_ids)
+        else:
+            shard_ids = [0]
+
+        for shard_id in shard_ids:
+            guilds = [g for g in self.guilds.values() if not sharded or (g.id >> 22) % state.shard_count == shard_id]
+            state.parse_ready({
+                'v': 10,
+                'user': dict(self.http.bot_user, verified=True, mfa_enabled=False),
+                'guilds': [{'id': str(guild.id), 'unavailable': True} for guild in guilds],
+                'session_id': 'fake',
+                'resume_gateway_url': 'wss://fake',
+                'application': {'id': self.http.bot_user['id'], 'flags': 0},
+                'shard': [shard_id, state.shard_count or 1],
+            })
+            for guild in guilds:
+                state.parse_guild_create(guild.payload())
+        await self.bot.wait_until_ready()
+
+    async def _chunker(self, guild_id, query='', limit=0, presences=False, *, nonce=None, **kwargs):
+        # Stands in for REQUEST_GUILD_MEMBERS on the websocket: answers with GUILD_MEMBERS_CHUNK events.
+        guild = self.guilds.get(guild_id)
+        members = list(guild.members.values()) if guild else []
+        chunks = [members[i:i + CHUNK_SIZE] for i in range(0, len(members), CHUNK_SIZE)] or [[]]
+        loop = asyncio.get_running_loop()
+        for index, chunk in enumerate(chunks):
+            loop.call_soon(self.bot._connection.parse_guild_members_chunk, {
+                'guild_id': str(guild_id), 'members': chunk, 'chunk_index': index, 'chunk_count': len(chunks), 'nonce': nonce,
+            })
+
+    def _echo(self, channel_id, message):
+        # Discord echoes the bot's own messages back as MESSAGE_CREATE, just after the REST reply.
+        guild = self._channels.get(channel_id)
+        if guild is None:
+            return
+        payload = dict(message, guild_id=str(guild.id))
+        asyncio.get_running_loop().call_soon(self.bot._connection.parse_message_create, payload)
+
+    def inject(self, guild, user, content):
+        """Dispatches a MESSAGE_CREATE from `user` in the guild's channel. Returns the message ID."""
+        message_id = snowflake()
+        member = guild.members[int(user['id'])]
+        member_data = {k: v for k, v in member.items() if k != 'user'}
+        self.bot._connection.parse_message_create(
+            message_payload(message_id, guild.channel_id, user, content, guild_id=guild.id, member=member_data)
+        )
+        return message_id
+
+
+# ------------------- Local Mode ------------------- #
+FAKE_COMMANDS = ('balance', 'daily', 'roll {bet}', 'roll {bet} coinflip', 'roll {bet} slots', 'leaderboard', 'rank')
+
+
+async def run_fake(bot, prefix='!'):
+    """
+    Runs the bot against the fake gateway for FAKE_GATEWAY_DURATION seconds, injecting
+    random economy commands at FAKE_GATEWAY_RATE messages per second. Used by
+    `cluster.py --local`, where every worker shares the same synthetic users (seeded by
+    FAKE_GATEWAY_SEED) so cross-process balance updates are exercised.
+    """
+    duration = float(os.getenv('FAKE_GATEWAY_DURATION', '10'))
+    rate = float(os.getenv('FAKE_GATEWAY_RATE', '50'))
+    seed = int(os.getenv('FAKE_GATEWAY_SEED', '0'))
+    rng = random.Random()
+
+    bot_user = user_payload(snowflake(), 'FakeBot', bot=True)
+    shard_count = bot.shard_count or 1
+    shard_ids = getattr(bot, 'shard_ids', None) or list(range(shard_count))
+    guilds = [
+        FakeGuild(bot_user, member_count=20, role_count=5, guild_id=guild_id_for_shard(shard_id, shard_count), seed=seed)
+        for shard_id in shard_ids
+    ]
+    # Every worker gets the same user IDs, so their balances collide in the shared store.
+    shared_users = [user_payload(1_000_000 + i, f'shared{i}') for i in range(20)]
+    for guild in guilds:
+        for user in shared_users:
+            guild.members[int(user['id'])] = member_payload(user)
+
+    http = FakeHTTP(bot_user, guilds)
+    gateway = FakeGateway(bot, guilds, http)
+    await gateway.start()
+    logger.info('Fake gateway ready with %d guild(s) on shards %s', len(guilds), shard_ids)
+
+    sent = 0
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            guild = rng.choice(guilds)
+            command = rng.choice(FAKE_COMMANDS).format(bet=rng.randint(1, 50))
+            gateway.inject(guild, rng.choice(shared_users), prefix + command)
+            sent += 1
+            await asyncio.sleep(1 / rate)
+        # Let in-flight commands finish before shutting down.
+        await asyncio.sleep(0.5)
+    finally:
+        await bot.close()
+    replies = sum(1 for _, method, path in http.calls if method == 'POST' and path == '/channels/{channel_id}/messages')
+    logger.info('Fake gateway done: %d commands injected, %d replies sent', sent, replies)
@@ -0,0 +1,220 @@
+"""
+Game engine for the Gambling cog.
+
+Every game is a precomputed payout table: each outcome has a probability, a net
+multiplier (coins won or lost per coin bet) and a label. Outcomes are drawn from a
+pre-generated buffer of outcome indices that is refilled in bulk, so a live round
+costs one buffer index instead of an RNG call plus branching.
+
+Run `python -m games [rounds]` to simulate every game and check its house edge. The
+run fails if a game other than dice pays out more than it takes in: players gaining
+coins on average inflates the whole economy. Dice keeps the original !roll payout.
+"""
+import itertools
+import math
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the pure-Python path gives the same results, just slower.
+    np = None
+
+BUFFER_SIZE = 4096
+# Games allowed a negative house edge. Dice is the original !roll and keeps its payout.
+LEGACY_PAYOUTS = {'dice'}
+# How many standard errors a simulated edge may fall below zero before the run fails.
+EDGE_TOLERANCE = 5
+
+
+class Outcome:
+    __slots__ = ('probability', 'multiplier', 'label')
+
+    def __init__(self, probability, multiplier, label):
+        self.probability = probability
+        self.multiplier = multiplier
+        self.label = label
+
+
+class OutcomeBuffer:
+    """Pre-generated block of outcome indices, refilled in bulk when exhausted."""
+
+    def __init__(self, probabilities, size=BUFFER_SIZE, seed=None):
+        self.size = size
+        self._population = range(len(probabilities))
+        self._cum_weights = list(itertools.accumulate(probabilities))
+        self._probabilities = probabilities
+        if np is not None:
+            self._rng = np.random.default_rng(seed)
+        else:
+            self._rng = random.Random(seed)
+        self._block = []
+        self._pos = 0
+
+    def draw_many(self, count):
+        if np is not None:
+            return self._rng.choice(len(self._probabilities), size=count, p=self._probabilities)
+        return self._rng.choices(self._population, cum_weights=self._cum_weights, k=count)
+
+    def next(self):
+        if self._pos >= len(self._block):
+            self._block = self.draw_many(self.size).tolist() if np is not None else self.draw_many(self.size)
+            self._pos = 0
+        index = self._block[self._pos]
+        self._pos += 1
+        return index
+
+
+class Game:
+    """A game defined by its payout table."""
+
+    def __init__(self, name, title, outcomes, aliases=()):
+        self.name = name
+        self.title = title
+        self.aliases = tuple(aliases)
+        total = sum(o.probability for o in outcomes)
+        for outcome in outcomes:
+            outcome.probability /= total
+        self.outcomes = outcomes
+        self.multipliers = [o.multiplier for o in outcomes]
+        self.buffer = OutcomeBuffer([o.probability for o in outcomes])
+
+    def play(self):
+        """Draws one outcome from the buffer."""
+        return self.outcomes[self.buffer.next()]
+
+    def expected_value(self):
+        """Exact expected net multiplier per coin bet (negative means the house wins)."""
+        return sum(o.probability * o.multiplier for o in self.outcomes)
+
+    def variance(self):
+        ev = self.expected_value()
+        return sum(o.probability * (o.multiplier - ev) ** 2 for o in self.outcomes)
+
+
+# ------------------- Game Definitions ------------------- #
+def _dice():
+    # Same rules as the original !roll: 1-3 loses the bet, 4-6 wins double.
+    return Game('dice', 'Dice Roll', [
+        Outcome(1, -1 if face <= 3 else 2, f"You rolled a **{face}**.") for face in range(1, 7)
+    ], aliases=('die',))
+
+
+def _coinflip():
+    return Game('coinflip', 'Coin Flip', [
+        Outcome(1, 1, "The coin landed on **heads**."),
+        Outcome(1, -1, "The coin landed on **tails**."),
+    ], aliases=('coin', 'flip'))
+
+
+SLOT_SYMBOLS = [('🍒', 40), ('🍋', 30), ('🔔', 15), ('⭐', 10), ('💎', 5)]
+SLOT_TRIPLES = {'🍒': 2, '🍋': 4, '🔔': 10, '⭐': 20, '💎': 50}
+
+
+def _slots():
+    total = sum(weight for _, weight in SLOT_SYMBOLS)
+    outcomes = []
+    for reels in itertools.product(SLOT_SYMBOLS, repeat=3):
+        symbols = [symbol for symbol, _ in reels]
+        probability = 1.0
+        for _, weight in reels:
+            probability *= weight / total
+        if symbols[0] == symbols[1] == symbols[2]:
+            multiplier = SLOT_TRIPLES[symbols[0]]
+        elif symbols.count('🍒') == 2:
+            multiplier = 1
+        else:
+            multiplier = -1
+        outcomes.append(Outcome(probability, multiplier, f"[ {' | '.join(symbols)} ]"))
+    return Game('slots', 'Slots', outcomes, aliases=('slot',))
+
+
+# Infinite-deck card values: 2-9, four ten-valued ranks, ace as 11.
+CARD_VALUES = list(range(2, 10)) + [10, 10, 10, 10] + [11]
+
+
+def _blackjack():
+    # Player and dealer each draw two cards. A two-card 21 pays 3:2, a higher
+    # total wins 1:1, the dealer wins ties except two 21s, which push. Two aces
+    # count as 12.
+    counts = {}
+    for a, b, c, d in itertools.product(CARD_VALUES, repeat=4):
+        player = a + b if a + b <= 21 else 12
+        dealer = c + d if c + d <= 21 else 12
+        counts[player, dealer] = counts.get((player, dealer), 0) + 1
+    outcomes = []
+    for (player, dealer), count in sorted(counts.items()):
+        if player == dealer:
+            multiplier = 0 if player == 21 else -1
+        elif player == 21:
+            multiplier = 1.5
+        elif player > dealer:
+            multiplier = 1
+        else:
+            multiplier = -1
+        outcomes.append(Outcome(count, multiplier, f"You drew **{player}**, the dealer drew **{dealer}**."))
+    return Game('blackjack', 'Blackjack', outcomes, aliases=('bj',))
+
+
+GAMES = {}
+for _game in (_dice(), _coinflip(), _slots(), _blackjack()):
+    GAMES[_game.name] = _game
+    for _alias in _game.aliases:
+        GAMES[_alias] = _game
+
+
+def get_game(name):
+    """Looks up a game by name or alias, or returns None."""
+    return GAMES.get(name.lower())
+
+
+def payout(bet, outcome):
+    """Net coin change for a bet; fractional winnings are rounded toward zero."""
+    return int(bet * outcome.multiplier)
+
+
+# ------------------- Simulation ------------------- #
+def simulate(game, rounds, chunk=1_000_000):
+    """
+    Plays `rounds` rounds of one coin each and returns (mean, variance) of the net result.
+    Vectorized in chunks when NumPy is installed.
+    """
+    total = 0.0
+    total_sq = 0.0
+    done = 0
+    multipliers = np.asarray(game.multipliers, dtype=float) if np is not None else game.multipliers
+    while done < rounds:
+        count = min(chunk, rounds - done)
+        indices = game.buffer.draw_many(count)
+        if np is not None:
+            results = multipliers[indices]
+            total += float(results.sum())
+            total_sq += float((results * results).sum())
+        else:
+            for index in indices:
+                value = multipliers[index]
+                total += value
+                total_sq += value * value
+        done += count
+    mean = total / rounds
+    return mean, total_sq / rounds - mean * mean
+
+
+def main(rounds):
+    print(f"Simulating {rounds:,} rounds per game ({'numpy' if np is not None else 'pure Python'})")
+    for game in dict.fromkeys(GAMES.values()):
+        started = time.perf_counter()
+        mean, variance = simulate(game, rounds)
+        elapsed = time.perf_counter() - started
+        print(f"{game.name:<10} edge {-mean:+.4f} (exact {-game.expected_value():+.4f}) "
+              f"variance {variance:.4f} (exact {game.variance():.4f}) {elapsed:.2f}s")
+        if game.name not in LEGACY_PAYOUTS:
+            assert game.expected_value() <= 1e-12, f"{game.name} has a negative house edge"
+            # A fair game (edge 0) may land slightly below zero by chance, so allow for sampling error.
+            assert -mean >= -EDGE_TOLERANCE * math.sqrt(variance / rounds), \
+                f"{game.name} paid out more than it took in over {rounds:,} rounds"
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
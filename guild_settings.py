@@ -0,0 +1,281 @@
+"""
+Per-guild settings: prefix, disabled commands, gambling limits, the starting balance and
+throttle limits.
+
+Rows are persisted per (guild_id, key) through a backend picked like the economy's
+(ECONOMY_BACKEND). At startup only the IDs of guilds with stored settings are read. A
+guild's settings are loaded on first use and then cached, so resolving a prefix is one
+dict lookup and guilds without stored settings never touch storage. Writes go through
+to the backend and replace the cached copy.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from discord.ext import commands
+
+from purge import PURGE_MAX
+from throttle import parse_limit
+
+logger = logging.getLogger(__name__)
+
+
+class SettingError(ValueError):
+    """Raised for unknown keys and values that fail validation."""
+
+
+def _bounded_int(low, high):
+    def parse(text):
+        try:
+            value = int(text)
+        except (TypeError, ValueError):
+            raise SettingError(f"`{text}` is not a whole number.")
+        if not low <= value <= high:
+            raise SettingError(f"Must be between {low} and {high}.")
+        return value
+    return parse
+
+
+def _throttle_limit(text):
+    text = str(text).strip()
+    try:
+        capacity, rate = parse_limit(text)
+    except ValueError:
+        raise SettingError(f"`{text}` is not a limit. Use <commands>/<seconds>, e.g. `150/10`.")
+    if capacity < 10:
+        raise SettingError("Allow at least 10 commands per window; the per-user limit handles single users.")
+    return text
+
+
+def _prefix(text):
+    text = str(text).strip()
+    if not 1 <= len(text) <= 5 or any(c.isspace() for c in text) or '`' in text:
+        raise SettingError("A prefix is 1-5 characters, without spaces or backticks.")
+    return text
+
+
+# key -> (default, parser, description). A prefix or throttle limit of None means the bot-wide
+# COMMAND_PREFIX or THROTTLE_CHANNEL / THROTTLE_GUILD.
+SETTINGS = {
+    'prefix': (None, _prefix, "Command prefix for this server"),
+    'min_bet': (1, _bounded_int(1, 1_000_000), "Smallest bet the roll command accepts"),
+    'max_bet': (1_000_000, _bounded_int(1, 1_000_000_000), "Largest bet the roll command accepts"),
+    'daily_bonus': (100, _bounded_int(0, 1_000_000), "Coins paid by the daily command"),
+    'starting_balance': (100, _bounded_int(0, 1_000_000), "Balance of a user's first economy use in this server"),
+    'purge_max': (PURGE_MAX, _bounded_int(1, PURGE_MAX), "Most messages one delete command may remove"),
+    'throttle_channel': (None, _throttle_limit, "Commands one channel may run, as <commands>/<seconds>"),
+    'throttle_guild': (None, _throttle_limit, "Commands this server may run, as <commands>/<seconds>"),
+}
+
+
+class GuildSettings:
+    """One guild's effective settings. Read attributes directly: settings.max_bet."""
+
+    __slots__ = ('guild_id', 'values', 'disabled') + tuple(SETTINGS)
+
+    def __init__(self, guild_id, values=None, disabled=()):
+        self.guild_id = guild_id
+        self.values = dict(values or {})
+        self.disabled = frozenset(disabled)
+        for key, (default, _, _) in SETTINGS.items():
+            setattr(self, key, self.values.get(key, default))
+
+
+DEFAULTS = GuildSettings(None)
+
+
+# ------------------- Backends ------------------- #
+class MemorySettingsBackend:
+    """Non-durable backend, used with ECONOMY_BACKEND=memory."""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def open(self):
+        pass
+
+    async def guild_ids(self):
+        return {guild_id for guild_id, _ in self.rows}
+
+    async def load(self, guild_id):
+        return [(key, value) for (g, key), value in self.rows.items() if g == guild_id]
+
+    async def write(self, guild_id, key, value):
+        if value is None:
+            self.rows.pop((guild_id, key), None)
+        else:
+            self.rows[guild_id, key] = value
+
+    async def close(self):
+        pass
+
+
+class SQLiteSettingsBackend:
+    """A guild_settings table next to the balances, queried on a dedicated thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='settings-sqlite')
+        self._conn = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS guild_settings (guild_id INTEGER NOT NULL, key TEXT NOT NULL, '
+            'value TEXT NOT NULL, PRIMARY KEY (guild_id, key))'
+        )
+        conn.commit()
+        self._conn = conn
+
+    def _guild_ids(self):
+        return {row[0] for row in self._conn.execute('SELECT DISTINCT guild_id FROM guild_settings')}
+
+    def _load(self, guild_id):
+        rows = self._conn.execute('SELECT key, value FROM guild_settings WHERE guild_id = ?', (guild_id,)).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def _write(self, guild_id, key, value):
+        with self._conn:
+            if value is None:
+                self._conn.execute('DELETE FROM guild_settings WHERE guild_id = ? AND key = ?', (guild_id, key))
+            else:
+                self._conn.execute(
+                    'INSERT INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?) '
+                    'ON CONFLICT(guild_id, key) DO UPDATE SET value = excluded.value',
+                    (guild_id, key, json.dumps(value)),
+                )
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def open(self):
+        await self._run(self._open)
+
+    async def guild_ids(self):
+        return await self._run(self._guild_ids)
+
+    async def load(self, guild_id):
+        return await self._run(self._load, guild_id)
+
+    async def write(self, guild_id, key, value):
+        await self._run(self._write, guild_id, key, value)
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+def settings_backend_from_env():
+    """Follows ECONOMY_BACKEND; SQLite settings share the economy database unless SETTINGS_DB_PATH is set."""
+    kind = os.getenv('ECONOMY_BACKEND', 'sqlite').lower()
+    if kind == 'memory':
+        return MemorySettingsBackend()
+    if kind == 'sqlite':
+        return SQLiteSettingsBackend(os.getenv('SETTINGS_DB_PATH') or os.getenv('ECONOMY_DB_PATH', 'economy.db'))
+    raise ValueError(f'Unknown ECONOMY_BACKEND: {kind}')
+
+
+# ------------------- Store ------------------- #
+class GuildSettingsStore:
+    def __init__(self, backend):
+        self.backend = backend
+        self._cache = {}
+        self._stored = set()
+        self._loading = {}
+
+    async def start(self):
+        await self.backend.open()
+        self._stored = set(await self.backend.guild_ids())
+        logger.info('%d guilds have stored settings', len(self._stored))
+
+    async def close(self):
+        await self.backend.close()
+
+    def cached(self, guild_id):
+        """The guild's settings if no storage read is needed, otherwise None."""
+        settings = self._cache.get(guild_id)
+        if settings is None and guild_id not in self._stored:
+            return DEFAULTS
+        return settings
+
+    async def get(self, guild_id):
+        settings = self.cached(guild_id)
+        if settings is not None:
+            return settings
+        # Concurrent first uses of one guild share a single load.
+        task = self._loading.get(guild_id)
+        if task is None:
+            task = self._loading[guild_id] = asyncio.create_task(self._load(guild_id))
+            task.add_done_callback(lambda _: self._loading.pop(guild_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, guild_id):
+        values = dict(await self.backend.load(guild_id))
+        disabled = values.pop('disabled_commands', ())
+        settings = self._cache[guild_id] = GuildSettings(guild_id, values, disabled)
+        return settings
+
+    def invalidate(self, guild_id):
+        """Drops the cached copy so the next use reloads it from storage."""
+        self._cache.pop(guild_id, None)
+        self._stored.add(guild_id)
+
+    async def set(self, guild_id, key, text):
+        """Validates and stores one setting. Returns the guild's new settings."""
+        if key not in SETTINGS:
+            raise SettingError(f"Unknown setting `{key}`. Settings: {', '.join(SETTINGS)}.")
+        value = SETTINGS[key][1](text)
+        current = await self.get(guild_id)
+        values = dict(current.values, **{key: value})
+        if values.get('min_bet', DEFAULTS.min_bet) > values.get('max_bet', DEFAULTS.max_bet):
+            raise SettingError("min_bet cannot be larger than max_bet.")
+        await self.backend.write(guild_id, key, value)
+        return self._replace(guild_id, values, current.disabled)
+
+    async def reset(self, guild_id, key):
+        if key not in SETTINGS:
+            raise SettingError(f"Unknown setting `{key}`. Settings: {', '.join(SETTINGS)}.")
+        current = await self.get(guild_id)
+        values = {k: v for k, v in current.values.items() if k != key}
+        await self.backend.write(guild_id, key, None)
+        return self._replace(guild_id, values, current.disabled)
+
+    async def set_disabled(self, guild_id, command_name, disabled):
+        current = await self.get(guild_id)
+        names = current.disabled | {command_name} if disabled else current.disabled - {command_name}
+        await self.backend.write(guild_id, 'disabled_commands', sorted(names) or None)
+        return self._replace(guild_id, current.values, names)
+
+    def forget(self, guild_id):
+        """Frees a guild's cached copy (its stored settings are kept in case the bot is re-added)."""
+        self._cache.pop(guild_id, None)
+
+    def _replace(self, guild_id, values, disabled):
+        self._stored.add(guild_id)
+        settings = self._cache[guild_id] = GuildSettings(guild_id, values, disabled)
+        return settings
+
+
+async def guild_settings(ctx):
+    """The settings for ctx's guild (DEFAULTS in DMs or before the settings cog is loaded)."""
+    store = getattr(ctx.bot, 'settings', None)
+    if store is None or ctx.guild is None:
+        return DEFAULTS
+    return await store.get(ctx.guild.id)
+
+
+class CommandDisabled(commands.CheckFailure):
+    """Raised when a command is disabled in the guild it was used in."""
+
+    def __init__(self, name):
+        super().__init__(f"`{name}` is disabled in this server.")
+        self.name = name
@@ -0,0 +1,198 @@
+import re
+
+import discord
+
+# Typos further than this many edits from a command name get no suggestion.
+MAX_EDIT_DISTANCE = 2
+UNCATEGORIZED = "Other"
+# Docstring usage lines are written with the default "!" prefix; this finds it to swap in the server's.
+DOCSTRING_PREFIX = re.compile(r'(?<![\w!])!(?=\w)')
+
+
+def _deletes(word, distance):
+    """Every string reachable from `word` by deleting up to `distance` characters, including itself."""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b):
+    """Optimal string alignment distance: insertions, deletions, substitutions and adjacent swaps."""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = ca != cb
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SuggestionIndex:
+    """
+    SymSpell-style "did you mean" lookups. Every term is stored under all of its
+    deletions up to MAX_EDIT_DISTANCE, so a query only generates its own deletions and
+    looks them up instead of comparing against every term.
+    """
+
+    def __init__(self, terms=(), max_distance=MAX_EDIT_DISTANCE):
+        self.max_distance = max_distance
+        self._deletes = {}
+        for term in terms:
+            self.add(term)
+
+    def add(self, term):
+        term = term.lower()
+        for variant in _deletes(term, self.max_distance):
+            self._deletes.setdefault(variant, set()).add(term)
+
+    def suggest(self, query, limit=3):
+        """Returns up to `limit` terms within MAX_EDIT_DISTANCE of `query`, closest first."""
+        query = query.lower()
+        candidates = set()
+        for variant in _deletes(query, self.max_distance):
+            candidates |= self._deletes.get(variant, set())
+        ranked = []
+        for term in candidates:
+            distance = edit_distance(query, term)
+            if distance <= self.max_distance:
+                ranked.append((distance, abs(len(term) - len(query)), term))
+        ranked.sort()
+        return [term for _, _, term in ranked[:limit]]
+
+
+class HelpEntry:
+    """What !help shows for one command, read from its docstring, aliases and signature."""
+
+    def __init__(self, command):
+        help_text = (command.help or "No description.").strip()
+        summary, _, usage = help_text.partition("Usage:")
+        self.name = command.qualified_name
+        self.aliases = list(command.aliases)
+        self.summary = summary.strip().splitlines()[0] if summary.strip() else "No description."
+        self.description = summary.strip() or "No description."
+        self.usage = usage.strip()
+        self.signature = command.signature
+        self.category = command.cog.qualified_name if command.cog else UNCATEGORIZED
+
+
+class HelpIndex:
+    """
+    Help pages built from the registered commands (bot.walk_commands), so they never
+    drift from the code. Pages are rebuilt only when the set of cogs or commands changes
+    or invalidate() is called, and rendered embeds are cached per prefix.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._built_for = None
+        self.entries = {}
+        self.categories = {}
+        self._lookup = {}
+        self._categories_lookup = {}
+        self.suggestions = SuggestionIndex()
+        self._embeds = {}
+
+    def invalidate(self):
+        self._built_for = None
+
+    def _ensure_built(self):
+        key = (tuple(self.bot.cogs), len(self.bot.all_commands))
+        if key == self._built_for:
+            return
+        entries, categories, lookup = {}, {}, {}
+        for command in self.bot.walk_commands():
+            if command.hidden or command.qualified_name in entries:
+                continue
+            entry = HelpEntry(command)
+            entries[entry.name] = entry
+            categories.setdefault(entry.category, []).append(entry)
+            lookup[entry.name.lower()] = entry
+            for alias in entry.aliases:
+                lookup.setdefault(alias.lower(), entry)
+        for category in categories.values():
+            category.sort(key=lambda e: e.name)
+        self.entries = entries
+        self.categories = dict(sorted(categories.items()))
+        self._lookup = lookup
+        self._categories_lookup = {name.lower(): name for name in self.categories}
+        self.suggestions = SuggestionIndex(list(lookup) + list(self._categories_lookup))
+        self._embeds.clear()
+        self._built_for = key
+
+    def _thumbnail(self, embed):
+        if self.bot.user and self.bot.user.display_avatar:
+            embed.set_thumbnail(url=self.bot.user.display_avatar.url)
+        return embed
+
+    def find(self, name):
+        """Returns ('command', HelpEntry), ('category', name) or (None, None)."""
+        self._ensure_built()
+        name = name.lower()
+        if name in self._lookup:
+            return 'command', self._lookup[name]
+        if name in self._categories_lookup:
+            return 'category', self._categories_lookup[name]
+        return None, None
+
+    def suggest(self, name, limit=3):
+        """Closest command or category names to a typo. Matched aliases map to their command."""
+        self._ensure_built()
+        found = []
+        for term in self.suggestions.suggest(name, limit * 2):
+            entry = self._lookup.get(term)
+            canonical = entry.name if entry is not None else self._categories_lookup[term]
+            if canonical not in found:
+                found.append(canonical)
+        return found[:limit]
+
+    # ------------------- Rendering ------------------- #
+    def overview(self, prefix):
+        self._ensure_built()
+        key = (prefix, None)
+        embed = self._embeds.get(key)
+        if embed is None:
+            embed = discord.Embed(
+                title="Bot Command List",
+                description=f"Here are all the available commands, grouped by category. The prefix is `{prefix}`.",
+                color=discord.Color.blurple()
+            )
+            for category, entries in self.categories.items():
+                names = " ".join(f"`{prefix}{e.name}`" for e in entries)
+                embed.add_field(name=f"--- {category} ---", value=names[:1024], inline=False)
+            embed.set_footer(text=f"Use {prefix}help <command> or {prefix}help <category> for details (e.g., {prefix}help roll).")
+            self._embeds[key] = embed = self._thumbnail(embed)
+        return embed
+
+    def category(self, prefix, category):
+        self._ensure_built()
+        key = (prefix, 'category', category)
+        embed = self._embeds.get(key)
+        if embed is None:
+            lines = [f"**`{prefix}{e.name}`**: {e.summary}" for e in self.categories[category]]
+            embed = discord.Embed(title=f"{category} Commands", description="\n".join(lines)[:4096], color=discord.Color.blurple())
+            embed.set_footer(text=f"Use {prefix}help <command> for usage.")
+            self._embeds[key] = embed
+        return embed
+
+    def command(self, prefix, entry):
+        self._ensure_built()
+        key = (prefix, 'command', entry.name)
+        embed = self._embeds.get(key)
+        if embed is None:
+            embed = discord.Embed(title=f"Command: {prefix}{entry.name}", description=entry.description, color=discord.Color.green())
+            if entry.usage:
+                usage = DOCSTRING_PREFIX.sub(lambda _: prefix, entry.usage)
+            else:
+                usage = f"{prefix}{entry.name} {entry.signature}".strip()
+            embed.add_field(name="Usage", value=f"`{usage}`", inline=False)
+            if entry.aliases:
+                embed.add_field(name="Aliases", value=", ".join(f"`{prefix}{a}`" for a in entry.aliases), inline=False)
+            embed.set_footer(text=f"Category: {entry.category}")
+            self._embeds[key] = embed
+        return embed
@@ -0,0 +1,132 @@
+from sortedcontainers import SortedList
+
+from transactions import MAX_BALANCE
+
+_MASK64 = (1 << 64) - 1
+
+
+def _key(user_id, balance):
+    """
+    (balance descending, user_id ascending) packed into one int, so the order costs one
+    object per user instead of a tuple of two. Balances are int64 (see MAX_BALANCE).
+    """
+    return ((MAX_BALANCE - balance) << 64) | user_id
+
+
+def _unpack(key):
+    return key & _MASK64, MAX_BALANCE - (key >> 64)
+
+
+class RankIndex:
+    """
+    Order-statistics index over (balance, user_id).
+    Updates, rank lookups and page slices are all O(log n).
+
+    Balances are read from `balances`, the store's live table, instead of being copied.
+    An index over a subset of users (a guild) keeps only their IDs in `members`; the
+    global index ranks every user in the table. Callers report every change through
+    update() with the balance the user was indexed at.
+    """
+
+    def __init__(self, balances, members=None):
+        self._balances = balances
+        self._members = None if members is None else set(members)
+        user_ids = balances.keys() if members is None else self._members
+        self._order = SortedList(_key(user_id, balances[user_id]) for user_id in user_ids)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, user_id):
+        if self._members is None:
+            return user_id in self._balances
+        return user_id in self._members
+
+    def __iter__(self):
+        return iter(self._balances.keys() if self._members is None else self._members)
+
+    def update(self, user_id, balance, old=None):
+        """Moves a user from `old` (None if they are new to this index) to `balance`."""
+        if old == balance:
+            return
+        if old is not None:
+            self._order.remove(_key(user_id, old))
+        if self._members is not None:
+            self._members.add(user_id)
+        self._order.add(_key(user_id, balance))
+
+    def discard(self, user_id):
+        if self._members is None or user_id not in self._members:
+            return
+        self._members.discard(user_id)
+        self._order.remove(_key(user_id, self._balances[user_id]))
+
+    def rank(self, user_id):
+        """Returns the 1-based rank of a user, or None if they are not indexed."""
+        if user_id not in self:
+            return None
+        return self._order.index(_key(user_id, self._balances[user_id])) + 1
+
+    def page(self, start, count):
+        """Returns [(rank, user_id, balance)] for ranks start+1 .. start+count."""
+        return [(start + i + 1, *_unpack(key)) for i, key in enumerate(self._order.islice(start, start + count))]
+
+
+class Leaderboard:
+    """
+    A global RankIndex plus one RankIndex per guild, all reading the same balance table.
+    Balances are global, so a user's change is applied to every guild index they are tracked in.
+    """
+
+    def __init__(self, balances):
+        self.balances = balances
+        self.global_index = RankIndex(balances)
+        self._guilds = {}
+        self._user_guilds = {}
+
+    def update(self, user_id, balance, old=None):
+        self.global_index.update(user_id, balance, old)
+        for guild_id in self._user_guilds.get(user_id, ()):
+            self._guilds[guild_id].update(user_id, balance, old)
+
+    def guild_ids(self):
+        """IDs of the guilds whose index has been built."""
+        return list(self._guilds)
+
+    def track(self, guild_id, user_id):
+        """Adds a user with a balance to a guild's leaderboard, if that guild's index has been built."""
+        index = self._guilds.get(guild_id)
+        if index is None or user_id in index:
+            return
+        index.update(user_id, self.balances[user_id])
+        self._user_guilds.setdefault(user_id, set()).add(guild_id)
+
+    def untrack(self, guild_id, user_id):
+        index = self._guilds.get(guild_id)
+        if index is not None:
+            index.discard(user_id)
+        guilds = self._user_guilds.get(user_id)
+        if guilds is not None:
+            guilds.discard(guild_id)
+            if not guilds:
+                del self._user_guilds[user_id]
+
+    def for_guild(self, guild_id, member_ids):
+        """
+        Returns the guild's index, building it once from the cached member IDs
+        that have a balance. After that it is kept up to date incrementally.
+        """
+        index = self._guilds.get(guild_id)
+        if index is None:
+            index = RankIndex(self.balances, (user_id for user_id in member_ids if user_id in self.balances))
+            self._guilds[guild_id] = index
+            for user_id in index:
+                self._user_guilds.setdefault(user_id, set()).add(guild_id)
+        return index
+
+    def drop_guild(self, guild_id):
+        index = self._guilds.pop(guild_id, None)
+        if index is None:
+            return
+        for user_id in list(index):
+            self.untrack(guild_id, user_id)
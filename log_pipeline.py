@@ -0,0 +1,231 @@
+"""
+Non-blocking structured logging.
+
+setup_logging() replaces the root logger's handlers with one QueueHandler. Logging on
+the event loop then costs a context lookup and a put_nowait. Records are not formatted
+there; their arguments are merged and written as JSON lines by a QueueListener thread.
+The queue is bounded. When it is full, records are dropped and counted instead of
+blocking the loop.
+
+Every record gets the command, guild, channel and user of the command being invoked
+(set by LogContextMixin), or nulls outside commands. Noisy warnings and errors are
+sampled per message template: the first LOG_SAMPLE_BURST in each LOG_SAMPLE_WINDOW pass,
+then one in LOG_SAMPLE_RATE, which carries the number it stands for in "sampled".
+
+Environment: LOG_LEVEL (default INFO), LOG_FORMAT (json or text), LOG_QUEUE_SIZE,
+LOG_SAMPLE_BURST, LOG_SAMPLE_WINDOW, LOG_SAMPLE_RATE.
+"""
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from collections import OrderedDict
+
+LOG_QUEUE_SIZE = 10_000
+LOG_SAMPLE_BURST = 20
+LOG_SAMPLE_WINDOW = 60.0
+LOG_SAMPLE_RATE = 100
+# Message templates tracked by the sampler at once.
+MAX_SAMPLE_KEYS = 1_000
+CONTEXT_FIELDS = ('command', 'guild_id', 'channel_id', 'user_id')
+
+command_context = contextvars.ContextVar('command_context', default=None)
+_NO_CONTEXT = dict.fromkeys(CONTEXT_FIELDS)
+
+_pipeline = None
+
+
+def get_pipeline():
+    """The running LogPipeline, or None before setup_logging()."""
+    return _pipeline
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current command's context onto each record, in the thread that logged it."""
+
+    def filter(self, record):
+        record.__dict__.update(command_context.get() or _NO_CONTEXT)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Passes a burst of each WARNING+ template per window, then one record in `rate`."""
+
+    def __init__(self, burst=LOG_SAMPLE_BURST, window=LOG_SAMPLE_WINDOW, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.rate = rate
+        # (logger, template) -> [window_start, seen, suppressed]
+        self._counts = OrderedDict()
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg).__name__)
+        now = time.monotonic()
+        entry = self._counts.get(key)
+        if entry is None or now - entry[0] >= self.window:
+            entry = self._counts[key] = [now, 0, 0]
+            while len(self._counts) > MAX_SAMPLE_KEYS:
+                self._counts.popitem(last=False)
+        self._counts.move_to_end(key)
+        entry[1] += 1
+        if entry[1] <= self.burst:
+            return True
+        if (entry[1] - self.burst) % self.rate:
+            entry[2] += 1
+            self.suppressed += 1
+            return False
+        record.sampled = entry[2] + 1
+        entry[2] = 0
+        return True
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that never blocks or formats: a full queue drops the record."""
+
+    def __init__(self, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread; only the exception text is captured now,
+        # while the traceback is still intact.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Unlike put_nowait, waits for room so stop() works with a full queue.
+        self.queue.put(self._sentinel)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if getattr(record, 'sampled', None):
+            entry['sampled'] = record.sampled
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs; the command context is appended when set."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        context = ' '.join(f'{field}={getattr(record, field)}' for field in CONTEXT_FIELDS if getattr(record, field, None) is not None)
+        if getattr(record, 'sampled', None):
+            context += f' sampled={record.sampled}'
+        if context:
+            line, _, rest = line.partition('\n')
+            line = f'{line} [{context.strip()}]' + (f'\n{rest}' if rest else '')
+        return line
+
+
+class LogPipeline:
+    def __init__(self, handler, sampler, listener):
+        self.handler = handler
+        self.sampler = sampler
+        self.listener = listener
+
+    @property
+    def pending(self):
+        return self.handler.queue.qsize()
+
+    @property
+    def dropped(self):
+        return self.handler.dropped
+
+    @property
+    def suppressed(self):
+        return self.sampler.suppressed
+
+    def stop(self):
+        """Writes out what is queued and stops the writer thread. Safe to call twice."""
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+
+def setup_logging(level=None, fmt=None, stream=None):
+    """Routes the root logger through a bounded queue to a writer thread. Safe to call twice."""
+    global _pipeline
+    if _pipeline is not None:
+        return _pipeline
+    level = level or os.getenv('LOG_LEVEL', 'INFO').upper()
+    fmt = fmt or os.getenv('LOG_FORMAT', 'json').lower()
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(TextFormatter() if fmt == 'text' else JsonFormatter())
+
+    handler = BoundedQueueHandler(int(os.getenv('LOG_QUEUE_SIZE') or LOG_QUEUE_SIZE))
+    sampler = SamplingFilter(
+        burst=int(os.getenv('LOG_SAMPLE_BURST') or LOG_SAMPLE_BURST),
+        window=float(os.getenv('LOG_SAMPLE_WINDOW') or LOG_SAMPLE_WINDOW),
+        rate=int(os.getenv('LOG_SAMPLE_RATE') or LOG_SAMPLE_RATE),
+    )
+    handler.addFilter(sampler)
+    handler.addFilter(ContextFilter())
+
+    # Neither formatter prints these, and looking them up costs every record on the loop.
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener = _Listener(handler.queue, output, respect_handler_level=True)
+    listener.start()
+    _pipeline = LogPipeline(handler, sampler, listener)
+    # Flushes what is still queued when the process exits.
+    atexit.register(_pipeline.stop)
+    return _pipeline
+
+
+class LogContextMixin:
+    """Binds the invoking command, guild, channel and user to every record logged while a command runs."""
+
+    async def invoke(self, ctx):
+        token = command_context.set({
+            'command': ctx.command.qualified_name if ctx.command else ctx.invoked_with,
+            'guild_id': ctx.guild.id if ctx.guild else None,
+            'channel_id': ctx.channel.id,
+            'user_id': ctx.author.id,
+        })
+        try:
+            await super().invoke(ctx)
+        finally:
+            command_context.reset(token)
@@ -0,0 +1,179 @@
+"""
+Opt-in detector for callbacks that block the event loop.
+
+A ticker task on the loop records a heartbeat every threshold/2 seconds. A daemon
+thread checks the heartbeat, and when it is overdue by more than the threshold the loop
+is stuck in one callback. The thread then takes a stack sample of the loop thread
+(sys._current_frames). The sample is tagged with the command whose callback is on the
+stack, or else the cog whose method is, and with the innermost frame from this project.
+Commands are matched against a snapshot of their callbacks taken on the loop (at start
+and after every reload), so the thread never walks the live command table.
+When the ticker runs again it records how long the stall really lasted.
+
+Asyncio's own debug mode reports slow callbacks too, but it slows every callback down
+and does not say which command was running. The watchdog costs one timer per tick
+while the loop is healthy.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_THRESHOLD = 0.1
+# Stack frames kept per offender for the owner dump.
+STACK_DEPTH = 12
+
+
+class Offender:
+    """Aggregated stalls for one (command, cog, location) triple."""
+
+    def __init__(self, command, cog, where):
+        self.command = command
+        self.cog = cog
+        self.where = where
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.stack = []
+
+    def add(self, duration, stack):
+        self.count += 1
+        self.total += duration
+        if duration >= self.worst:
+            self.worst = duration
+            self.stack = stack
+
+
+class LoopWatchdog:
+    def __init__(self, bot, threshold=DEFAULT_THRESHOLD):
+        self.bot = bot
+        self.threshold = threshold
+        self.offenders = {}
+        self.stalls = 0
+        self._lock = threading.Lock()
+        self._beat = time.monotonic()
+        self._pending = None
+        self._loop_thread = None
+        self._ticker = None
+        self._thread = None
+        self._stop = threading.Event()
+        # Callback code object -> qualified command name, replaced whole by refresh_commands().
+        self._callbacks = {}
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts watching the running loop. Must be called from the loop thread."""
+        if self.running:
+            return
+        if self._thread is not None:
+            # Never let an old thread outlive stop() and see the cleared stop flag.
+            self._thread.join()
+        self.refresh_commands()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._ticker = asyncio.get_running_loop().create_task(self._tick())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+        logger.info('Loop watchdog started (threshold %.0fms)', self.threshold * 1000)
+
+    def stop(self):
+        self._stop.set()
+        if self._ticker is not None:
+            self._ticker.cancel()
+            self._ticker = None
+        if self._thread is not None:
+            # The thread wakes on the stop flag at once; at most it finishes the sample it is taking.
+            self._thread.join()
+            self._thread = None
+
+    def refresh_commands(self):
+        """Snapshots the command callbacks for the thread to match against. Must be called from the loop thread."""
+        self._callbacks = {command.callback.__code__: command.qualified_name for command in self.bot.walk_commands()}
+
+    def reset(self):
+        with self._lock:
+            self.offenders.clear()
+            self.stalls = 0
+
+    def top(self, count=10):
+        """The worst offenders by total blocked time."""
+        with self._lock:
+            return sorted(self.offenders.values(), key=lambda o: o.total, reverse=True)[:count]
+
+    # ------------------- Loop Side ------------------- #
+    @property
+    def interval(self):
+        return max(0.01, self.threshold / 2)
+
+    async def _tick(self):
+        while True:
+            interval = self.interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            with self._lock:
+                gap = now - self._beat - interval
+                self._beat = now
+                pending, self._pending = self._pending, None
+                if pending is not None:
+                    key, stack = pending
+                    offender = self.offenders.get(key)
+                    if offender is None:
+                        offender = self.offenders[key] = Offender(*key)
+                    offender.add(max(gap, self.threshold), stack)
+                    self.stalls += 1
+            if pending is not None:
+                logger.warning('Event loop blocked for %.0fms in %s (command=%s, cog=%s)',
+                               max(gap, self.threshold) * 1000, pending[0][2], pending[0][0], pending[0][1])
+
+    # ------------------- Watchdog Thread ------------------- #
+    def _watch(self):
+        sampled_beat = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            # The ticker is due every `interval`; being later than that by the threshold is a stall.
+            if time.monotonic() - beat < self.interval + self.threshold or beat == sampled_beat:
+                continue
+            # One sample per stall: the beat only moves once the loop is free again.
+            sampled_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            sample = self._describe(frame)
+            with self._lock:
+                if self._beat == beat:
+                    self._pending = sample
+
+    def _describe(self, frame):
+        callbacks = self._callbacks
+        command = cog = where = None
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        for f in frames:
+            code = f.f_code
+            if command is None and code in callbacks:
+                command = callbacks[code]
+            if cog is None:
+                owner = f.f_locals.get('self')
+                if isinstance(owner, commands.Cog):
+                    cog = owner.qualified_name
+            if where is None and code.co_filename.startswith(PROJECT_DIR) and code.co_filename != __file__:
+                where = f'{os.path.basename(code.co_filename)}:{f.f_lineno} in {code.co_name}'
+        if where is None and frames:
+            code = frames[0].f_code
+            where = f'{os.path.basename(code.co_filename)}:{frames[0].f_lineno} in {code.co_name}'
+        stack = traceback.format_list(traceback.extract_stack(frames[0], limit=STACK_DEPTH)) if frames else []
+        return (command, cog, where), stack
@@ -0,0 +1,175 @@
+"""
+Member cache policy.
+
+MEMBER_CACHE=full (the default) is discord.py's usual behaviour: every guild is chunked
+at startup and every member stays cached. MEMBER_CACHE=lazy keeps the members intent
+but skips the startup chunking and discord.py's joined-member cache. Members are then
+kept in a bounded LRU (MemberCache), filled from message authors and mentions, with a
+coalesced fetch_member on a miss. Commands that need a guild's whole member list
+(!massrole, the server leaderboard and role member counts) chunk that guild on first use
+through ensure_chunked.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+MEMBER_CACHE_SIZE = 50_000
+# Cached members are refreshed after this long, since lazy mode gets no updates for them.
+MEMBER_CACHE_TTL = 300.0
+MODES = ('full', 'lazy')
+
+
+def cache_mode():
+    mode = os.environ.get('MEMBER_CACHE', 'full').lower()
+    if mode not in MODES:
+        raise ValueError(f"MEMBER_CACHE must be one of {', '.join(MODES)}, not {mode!r}")
+    return mode
+
+
+def bot_options(mode):
+    """Keyword arguments for the Bot constructor in the given cache mode."""
+    if mode == 'lazy':
+        return {'member_cache_flags': discord.MemberCacheFlags.none(), 'chunk_guilds_at_startup': False}
+    return {}
+
+
+class MemberCache:
+    """
+    LRU of recently seen members keyed by (guild_id, user_id), in front of discord.py's
+    own member cache. Concurrent misses for the same member share one fetch_member call.
+    """
+
+    def __init__(self, bot, size=MEMBER_CACHE_SIZE, ttl=MEMBER_CACHE_TTL):
+        self.bot = bot
+        self.size = size
+        self.ttl = ttl
+        self._members = OrderedDict()
+        self._fetching = {}
+        self._chunking = {}
+        # Guilds chunked on demand in lazy mode; their joins are added to the cache by hand.
+        self._chunked = set()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    def __len__(self):
+        return len(self._members)
+
+    @property
+    def lazy(self):
+        return not self.bot._connection.member_cache_flags.joined
+
+    def get(self, guild, user_id):
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+        key = (guild.id, user_id)
+        entry = self._members.get(key)
+        if entry is None or time.monotonic() - entry[1] >= self.ttl:
+            return None
+        self._members.move_to_end(key)
+        return entry[0]
+
+    def remember(self, member):
+        if not isinstance(member, discord.Member) or member.guild.get_member(member.id) is not None:
+            return
+        key = (member.guild.id, member.id)
+        self._members[key] = (member, time.monotonic())
+        self._members.move_to_end(key)
+        while len(self._members) > self.size:
+            self._members.popitem(last=False)
+
+    def forget(self, guild_id, user_id):
+        self._members.pop((guild_id, user_id), None)
+
+    def drop_guild(self, guild_id):
+        for key in [key for key in self._members if key[0] == guild_id]:
+            del self._members[key]
+
+    async def fetch(self, guild, user_id):
+        """The member from cache, or from the API. Returns None if they are not in the guild."""
+        member = self.get(guild, user_id)
+        if member is not None:
+            self.hits += 1
+            return member
+        self.misses += 1
+        key = (guild.id, user_id)
+        task = self._fetching.get(key)
+        if task is None:
+            task = self._fetching[key] = asyncio.create_task(self._fetch(guild, user_id))
+            task.add_done_callback(lambda _: self._fetching.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, guild, user_id):
+        self.fetches += 1
+        try:
+            member = await guild.fetch_member(user_id)
+        except discord.NotFound:
+            return None
+        self.remember(member)
+        return member
+
+    async def ensure_chunked(self, guild):
+        """Loads the guild's full member list once, for commands that walk every member."""
+        if guild.chunked or guild.id in self._chunked:
+            return
+        task = self._chunking.get(guild.id)
+        if task is None:
+            logger.info('Chunking %s (%s members) on demand', guild.id, guild.member_count)
+            task = self._chunking[guild.id] = asyncio.create_task(guild.chunk(cache=True))
+            task.add_done_callback(lambda _: self._chunking.pop(guild.id, None))
+        await asyncio.shield(task)
+        self._chunked.add(guild.id)
+
+    def attach(self):
+        """Registers the listeners that keep the LRU fresh."""
+        async def on_message(message):
+            if message.guild is not None:
+                self.remember(message.author)
+                for member in message.mentions:
+                    self.remember(member)
+
+        async def on_member_join(member):
+            # Lazy mode does not cache joins; keep guilds that were chunked on demand complete.
+            if member.guild.id in self._chunked:
+                member.guild._add_member(member)
+
+        async def on_raw_member_remove(payload):
+            self.forget(payload.guild_id, payload.user.id)
+
+        async def on_guild_remove(guild):
+            self.drop_guild(guild.id)
+            self._chunked.discard(guild.id)
+
+        for listener in (on_message, on_member_join, on_raw_member_remove, on_guild_remove):
+            self.bot.add_listener(listener)
+
+
+class CachedMember(commands.MemberConverter):
+    """
+    Member converter that resolves mentions and IDs through the bot's MemberCache, so a
+    member missing from discord.py's cache costs at most one shared fetch_member.
+    Names fall back to the default lookup.
+    """
+
+    async def convert(self, ctx, argument):
+        cache = getattr(ctx.bot, 'member_cache', None)
+        match = self._get_id_match(argument) or re.match(r'<@!?([0-9]{15,20})>$', argument)
+        if cache is None or ctx.guild is None or match is None:
+            return await super().convert(ctx, argument)
+        user_id = int(match.group(1))
+        member = discord.utils.get(ctx.message.mentions, id=user_id)
+        if isinstance(member, discord.Member):
+            return member
+        member = await cache.fetch(ctx.guild, user_id)
+        if member is None:
+            raise commands.MemberNotFound(argument)
+        return member
@@ -0,0 +1,245 @@
+"""
+Prometheus metrics and health checks over HTTP.
+
+Collects per-command latency histograms and error counts, gateway event counts by
+type, event-loop lag and discord.py rate-limit hits, and serves them in the Prometheus
+text format on /metrics, next to a /healthz for Railway. Recording a sample is a dict
+lookup and a bisect, so it stays on in production.
+
+Command latency is timed by MetricsMixin on the bot, from the moment a command is
+invoked (before converters and checks run) until it completes or its error handler
+returns.
+
+The server listens on METRICS_PORT, falling back to PORT (set by Railway). Cluster
+workers add their worker index to it so they do not collide. With neither set, metrics
+are still collected but not served.
+"""
+import asyncio
+import bisect
+import logging
+import math
+import os
+import time
+from collections import Counter
+
+from aiohttp import web
+from discord.ext import commands
+
+from log_pipeline import get_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; every histogram also has a +Inf bucket.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+# How often the loop-lag probe wakes up.
+LAG_INTERVAL = 0.5
+
+
+class Histogram:
+    """Cumulative-on-export histogram with fixed buckets."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RateLimitCounter(logging.Handler):
+    """Counts the rate-limit warnings discord.py logs on the discord.http logger."""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.hits = Counter()
+
+    def emit(self, record):
+        message = str(record.msg)
+        if 'rate limit' in message.lower():
+            self.hits['global' if 'global' in message.lower() else 'route'] += 1
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Everything the Metrics cog records. Outlives a reload of the cog."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.command_latency = {}
+        self.command_errors = Counter()
+        self.gateway_events = Counter()
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.last_loop_lag = 0.0
+        self.rate_limits = RateLimitCounter()
+
+    def observe_command(self, name, seconds):
+        histogram = self.command_latency.get(name)
+        if histogram is None:
+            histogram = self.command_latency[name] = Histogram()
+        histogram.observe(seconds)
+
+    def render(self, bot):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def labels(pairs):
+            return '{' + ','.join(f'{k}="{_label(v)}"' for k, v in pairs) + '}' if pairs else ''
+
+        def simple(name, kind, help_text, samples):
+            header(name, kind, help_text)
+            for pairs, value in samples:
+                lines.append(f'{name}{labels(pairs)} {value}')
+
+        def histogram(name, help_text, series):
+            header(name, 'histogram', help_text)
+            for pairs, hist in series:
+                running = 0
+                for bound, count in zip(hist.buckets + (math.inf,), hist.counts):
+                    running += count
+                    lines.append(f'{name}_bucket{labels(pairs + [("le", "+Inf" if bound == math.inf else bound)])} {running}')
+                lines.append(f'{name}_sum{labels(pairs)} {hist.sum}')
+                lines.append(f'{name}_count{labels(pairs)} {hist.count}')
+
+        histogram('discord_command_duration_seconds', 'Time from command invoke to completion or error.',
+                  [([('command', c)], h) for c, h in sorted(self.command_latency.items())])
+        simple('discord_command_errors_total', 'counter', 'Command errors by command and exception type.',
+               [([('command', c), ('error', e)], n) for (c, e), n in sorted(self.command_errors.items())])
+        simple('discord_gateway_events_total', 'counter', 'Gateway dispatch events received, by type.',
+               [([('type', t)], n) for t, n in sorted(self.gateway_events.items())])
+        simple('discord_http_rate_limits_total', 'counter', 'HTTP 429 responses seen by discord.py.',
+               [([('scope', s)], n) for s, n in sorted(self.rate_limits.hits.items())])
+        histogram('discord_event_loop_lag_seconds', f'How late the event loop ran a timer scheduled every {LAG_INTERVAL}s.',
+                  [([], self.loop_lag)])
+
+        outbox = getattr(bot, 'outbox', None)
+        if outbox is not None:
+            simple('discord_outbox_pending', 'gauge', 'Replies waiting in the per-channel send queues.', [([], outbox.pending)])
+            simple('discord_outbox_replies_total', 'counter', 'Replies leaving the send queues, by how they were delivered.',
+                   [([('outcome', 'sent')], outbox.sent), ([('outcome', 'coalesced')], outbox.coalesced),
+                    ([('outcome', 'deduplicated')], outbox.deduplicated), ([('outcome', 'edited')], outbox.edited)])
+
+        throttle = getattr(bot, 'throttle', None)
+        if throttle is not None:
+            simple('discord_commands_throttled_total', 'counter', 'Commands dropped by the throttle, by the bucket that was empty.',
+                   [([('scope', s)], throttle.rejected[s]) for s in throttle.scopes])
+            simple('discord_throttle_keys', 'gauge', 'Token buckets currently tracked, by scope.',
+                   [([('scope', s)], len(table)) for s, table in throttle.scopes.items()])
+
+        pipeline = get_pipeline()
+        if pipeline is not None:
+            simple('discord_log_queue_pending', 'gauge', 'Log records waiting for the writer thread.', [([], pipeline.pending)])
+            simple('discord_log_records_dropped_total', 'counter', 'Log records dropped because the log queue was full.', [([], pipeline.dropped)])
+            simple('discord_log_records_sampled_out_total', 'counter', 'Repeated warnings and errors left out by sampling.', [([], pipeline.suppressed)])
+
+        latencies = getattr(bot, 'latencies', None) or [(0, bot.latency)]
+        simple('discord_gateway_latency_seconds', 'gauge', 'Heartbeat latency per shard.',
+               [([('shard', shard_id)], latency) for shard_id, latency in latencies if math.isfinite(latency)])
+        simple('discord_guilds', 'gauge', 'Guilds in the cache.', [([], len(bot.guilds))])
+        simple('discord_uptime_seconds', 'gauge', 'Seconds since metrics collection started.', [([], round(time.time() - self.started, 3))])
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_port():
+    port = os.getenv('METRICS_PORT') or os.getenv('PORT')
+    if not port:
+        return None
+    return int(port) + int(os.getenv('CLUSTER_WORKER') or 0)
+
+
+class MetricsMixin:
+    """Times every command synchronously around bot.invoke, so work before the first await is counted too."""
+
+    async def invoke(self, ctx):
+        started = time.perf_counter()
+        try:
+            await super().invoke(ctx)
+        finally:
+            cog = self.get_cog('Metrics')
+            if cog is not None and ctx.command is not None:
+                cog.registry.observe_command(ctx.command.qualified_name, time.perf_counter() - started)
+
+
+class Metrics(commands.Cog):
+    """Feeds the MetricsRegistry from bot events and serves it over HTTP."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        state = getattr(bot, 'cog_state', {}).get('Metrics')
+        self.registry = state['registry'] if state else MetricsRegistry()
+        self._runner = None
+        self._lag_task = None
+
+    async def cog_load(self):
+        logging.getLogger('discord.http').addHandler(self.registry.rate_limits)
+        self._lag_task = asyncio.create_task(self._measure_lag())
+        port = metrics_port()
+        if port is not None:
+            app = web.Application()
+            app.router.add_get('/metrics', self.handle_metrics)
+            app.router.add_get('/healthz', self.handle_health)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, '0.0.0.0', port).start()
+            logger.info('Serving metrics on port %d', port)
+        getattr(self.bot, 'cog_state', {}).pop('Metrics', None)
+
+    async def cog_unload(self):
+        logging.getLogger('discord.http').removeHandler(self.registry.rate_limits)
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def export_state(self):
+        return {'registry': self.registry}
+
+    async def _measure_lag(self):
+        registry = self.registry
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            lag = max(0.0, time.perf_counter() - started - LAG_INTERVAL)
+            registry.last_loop_lag = lag
+            registry.loop_lag.observe(lag)
+
+    # ------------------- HTTP ------------------- #
+    async def handle_metrics(self, request):
+        return web.Response(text=self.registry.render(self.bot), content_type='text/plain', charset='utf-8')
+
+    async def handle_health(self, request):
+        latency = self.bot.latency
+        healthy = self.bot.is_ready() and not self.bot.is_closed()
+        body = {
+            'ready': self.bot.is_ready(),
+            'latency_ms': round(latency * 1000) if math.isfinite(latency) else None,
+            'loop_lag_ms': round(self.registry.last_loop_lag * 1000, 1),
+            'guilds': len(self.bot.guilds),
+        }
+        return web.json_response(body, status=200 if healthy else 503)
+
+    # ------------------- Listeners ------------------- #
+    @commands.Cog.listener()
+    async def on_command_error(self, ctx, error):
+        name = ctx.command.qualified_name if ctx.command else 'unknown'
+        error = getattr(error, 'original', error)
+        self.registry.command_errors[name, type(error).__name__] += 1
+
+    @commands.Cog.listener()
+    async def on_socket_event_type(self, event_type):
+        self.registry.gateway_events[event_type] += 1
+
+
+async def setup(bot):
+    await bot.add_cog(Metrics(bot))
@@ -1,80 +1,384 @@
 import discord
 from discord.ext import commands
+import asyncio
 import logging
+import re
 import sys
+import time
+import typing
+
+from bulk_roles import FilterError, MassRoleJob, RouteBuckets, parse_filter
+from guild_settings import CommandDisabled, guild_settings
+from member_cache import CachedMember
+from modlog import ModLog
+from profiles import ROLES_PER_PAGE
+from purge import PurgeFlags, PurgeJob, build_predicate, parse_point
+from role_index import RoleIndexes, RoleMemberCounts
 
 logger = logging.getLogger(__name__)
 
+# Seconds between edits of a running !massrole status message.
+MASSROLE_PROGRESS_INTERVAL = 3
+# Entries shown by one !modlog.
+MODLOG_LIMIT = 15
+
+
+class RolePages(discord.ui.View):
+    """Previous/next buttons for a paginated !listroles. Only the invoking user can flip pages."""
+
+    def __init__(self, author, roles, counts, timeout=120):
+        super().__init__(timeout=timeout)
+        self.author = author
+        self.roles = roles
+        self.counts = counts
+        self.page = 0
+        self.pages = max(1, -(-len(roles) // ROLES_PER_PAGE))
+        self.message = None
+        self._sync_buttons()
+
+    def embed(self):
+        start = self.page * ROLES_PER_PAGE
+        shown = self.roles[start:start + ROLES_PER_PAGE]
+        description = "\n".join(f"{r.mention} - {self.counts[r.id]} members" for r in shown) or "No roles."
+        embed = discord.Embed(title=f"Server Roles ({len(self.roles)})", description=description, color=discord.Color.blue())
+        if self.pages > 1:
+            embed.set_footer(text=f"Page {self.page + 1}/{self.pages}")
+        return embed
+
+    def _sync_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author.id:
+            await interaction.response.send_message("Only the person who ran the command can change pages.", ephemeral=True)
+            return False
+        return True
+
+    async def _turn(self, interaction, step):
+        self.page = min(max(self.page + step, 0), self.pages - 1)
+        self._sync_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self._turn(interaction, -1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self._turn(interaction, 1)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+
+class MemberRolePages(RolePages):
+    """Pages through one member's roles, rendered from their cached profile."""
+
+    def __init__(self, author, profile, timeout=120):
+        self.profile = profile
+        super().__init__(author, profile.roles, None, timeout=timeout)
+
+    def embed(self):
+        return self.profile.roles_embed(self.page)
+
+
+class CancelJob(discord.ui.View):
+    """A Cancel button on a running !massrole status message."""
+
+    def __init__(self, job, author):
+        super().__init__(timeout=None)
+        self.job = job
+        self.author = author
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author.id and not interaction.user.guild_permissions.manage_roles:
+            await interaction.response.send_message("You can't cancel this job.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.danger)
+    async def cancel(self, interaction, button):
+        self.job.cancel()
+        button.disabled = True
+        await interaction.response.edit_message(view=self)
+
+
 class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-    
+        self.roles = RoleIndexes()
+        self.role_counts = RoleMemberCounts()
+        self.role_buckets = RouteBuckets()
+        self.role_jobs = {}
+        # After a hot reload the previous instance hands over its open journal (see export_state).
+        state = getattr(bot, 'cog_state', {}).get('Moderation')
+        self.modlog = state['modlog'] if state else ModLog()
+        self._started = state is not None
+        self._handed_off = False
+
+    async def cog_load(self):
+        if not self._started:
+            await self.modlog.start()
+        getattr(self.bot, 'cog_state', {}).pop('Moderation', None)
+
+    async def cog_unload(self):
+        if not self._handed_off:
+            # Writes out the last actions before shutdown.
+            await self.modlog.close()
+
+    def export_state(self):
+        self._handed_off = True
+        return {'modlog': self.modlog}
+
     # ------------------- Error Handling ------------------- #
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
+        # A command's own error handler sets ctx.error_handled for the errors it replied to;
+        # everything else it sees still gets the shared handling below.
+        if getattr(ctx, 'error_handled', False):
+            return
         if isinstance(error, commands.CommandNotFound):
-            await ctx.send(embed=discord.Embed(title="Command Not Found", description="This command does not exist.", color=discord.Color.red()))
+            description = "This command does not exist."
+            misc = self.bot.get_cog('Misc')
+            suggestions = misc.help_index.suggest(ctx.invoked_with) if misc is not None and ctx.invoked_with else []
+            if suggestions:
+                description += " Did you mean " + ", ".join(f"`{ctx.clean_prefix}{s}`" for s in suggestions) + "?"
+            await ctx.send(embed=discord.Embed(title="Command Not Found", description=description, color=discord.Color.red()))
         elif isinstance(error, commands.MissingPermissions):
             await ctx.send(embed=discord.Embed(title="Missing Permissions", description=f"You lack permissions: {', '.join(error.missing_permissions)}", color=discord.Color.red()))
         elif isinstance(error, commands.MissingRequiredArgument):
             await ctx.send(embed=discord.Embed(title="Missing Argument", description=f"Missing required argument: {error.param.name}", color=discord.Color.red()))
-        else:
-            logger.error(f"Error in command {ctx.command}: {error}")
+        elif isinstance(error, CommandDisabled):
+            await ctx.send(embed=discord.Embed(title="Command Disabled", description=str(error), color=discord.Color.orange()), delete_after=10)
+        elif isinstance(error, commands.BadArgument):
+            await ctx.send(embed=discord.Embed(title="Invalid Argument", description=str(error), color=discord.Color.red()))
+        elif isinstance(error, commands.CommandOnCooldown):
+            await ctx.send(embed=discord.Embed(title="On Cooldown", description=f"Try again in {error.retry_after:.0f}s.", color=discord.Color.orange()), delete_after=10)
+        elif isinstance(error, commands.CommandInvokeError):
+            # Only a bug inside a command gets a traceback.
+            logger.error('Error in command %s', ctx.command, exc_info=error.original)
             await ctx.send(embed=discord.Embed(title="Unexpected Error", description="Something went wrong.", color=discord.Color.red()))
+        elif isinstance(error, commands.CheckFailure):
+            logger.info('Check failed for command %s: %s', ctx.command, error)
+            await ctx.send(embed=discord.Embed(title="Not Allowed", description=str(error) or "You cannot use this command here.", color=discord.Color.red()), delete_after=10)
+        else:
+            logger.warning('Command %s failed: %s: %s', ctx.command, type(error).__name__, error)
+            await ctx.send(embed=discord.Embed(title="Command Failed", description=str(error) or "Something went wrong.", color=discord.Color.red()))
+
+    # ------------------- Role Index ------------------- #
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.roles.role_created(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        self.roles.role_updated(after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.roles.role_deleted(role)
+        self.role_counts.role_deleted(role)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.roles.drop_guild(guild.id)
+        self.role_counts.drop_guild(guild.id)
+        self.role_buckets.drop_guild(guild.id)
+        job = self.role_jobs.get(guild.id)
+        if job is not None:
+            job.cancel()
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.role_counts.member_joined(member)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.role_counts.member_left(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        self.role_counts.member_updated(before, after)
 
     # ------------------- Delete/Purge ------------------- #
     @commands.command(name='delete', aliases=['purge', 'clear'])
     @commands.has_permissions(manage_messages=True)
-    async def delete_messages(self, ctx, amount: int, target: discord.Member = None):
-        """Deletes messages. Usage: !delete <amount> [@user]"""
-        if amount < 1 or amount > 100:
-            return await ctx.send(embed=discord.Embed(title="Invalid Amount", description="Amount must be 1-100.", color=discord.Color.red()))
-        def check_user(m): return target is None or m.author == target
-        deleted_messages = await ctx.channel.purge(limit=amount + 1, check=check_user)
-        deleted = len(deleted_messages) - 1 if target is None else len(deleted_messages)
-        embed = discord.Embed(title="Messages Deleted", description=f"Deleted {deleted} messages.", color=discord.Color.green())
-        await ctx.send(embed=embed, delete_after=10)
+    async def delete_messages(self, ctx, amount: int, target: typing.Optional[CachedMember] = None, *, flags: PurgeFlags):
+        """Deletes messages matching filters. Usage: !delete <amount> [@user] [user:@user] [regex:text] [attachments:yes] [bots:yes] [before:<id|2h|date>] [after:<id|2h|date>]"""
+        limit = (await guild_settings(ctx)).purge_max
+        if amount < 1 or amount > limit:
+            return await ctx.send(embed=discord.Embed(title="Invalid Amount", description=f"Amount must be 1-{limit}.", color=discord.Color.red()))
+        predicate = build_predicate(flags, target)
+        before = parse_point(flags.before) if flags.before else None
+        after = parse_point(flags.after) if flags.after else None
+        job = PurgeJob(ctx.channel, amount, predicate, before=before, after=after, reason=f"Purged by {ctx.author}")
+        await job.run(extra=[ctx.message])
+        self.modlog.record('purge', ctx.guild.id, ctx.author.id, target.id if target else None, ctx.channel.id,
+                           count=job.deleted, scanned=job.scanned, failed=job.failed, elapsed=round(job.elapsed, 3))
+        color = discord.Color.orange() if job.failed else discord.Color.green()
+        await ctx.send(embed=discord.Embed(title="Messages Deleted", description=job.summary(), color=color), delete_after=10)
 
     # ------------------- Role Add/Remove ------------------- #
     @commands.command(name='addrole')
     @commands.has_permissions(manage_roles=True)
-    async def add_role(self, ctx, member: discord.Member, *, role_name):
+    async def add_role(self, ctx, member: CachedMember, *, role_name):
         """Adds a role to a user. Usage: !addrole @user <role_name>"""
-        role = discord.utils.get(ctx.guild.roles, name=role_name) or discord.utils.find(lambda r: role_name.lower() in r.name.lower(), ctx.guild.roles)
+        role = self.roles.resolve(ctx.guild, role_name)
         if not role: return await ctx.send(embed=discord.Embed(title="Role Not Found", description=f"{role_name} not found.", color=discord.Color.red()))
         if role.position >= ctx.guild.me.top_role.position: return await ctx.send(embed=discord.Embed(title="Permission Error", description="Cannot manage this role.", color=discord.Color.red()))
         if role in member.roles: return await ctx.send(embed=discord.Embed(title="Already Has Role", description=f"{member.display_name} already has {role.name}.", color=discord.Color.orange()))
+        started = time.monotonic()
         await member.add_roles(role, reason=f"Added by {ctx.author}")
+        self.modlog.record('addrole', ctx.guild.id, ctx.author.id, member.id, ctx.channel.id, role=role.id,
+                           elapsed=round(time.monotonic() - started, 3))
         await ctx.send(embed=discord.Embed(title="Role Added", description=f"Added {role.name} to {member.display_name}.", color=discord.Color.green()))
 
     @commands.command(name='removerole')
     @commands.has_permissions(manage_roles=True)
-    async def remove_role(self, ctx, member: discord.Member, *, role_name):
+    async def remove_role(self, ctx, member: CachedMember, *, role_name):
         """Removes a role from a user. Usage: !removerole @user <role_name>"""
-        role = discord.utils.get(ctx.guild.roles, name=role_name) or discord.utils.find(lambda r: role_name.lower() in r.name.lower(), ctx.guild.roles)
+        role = self.roles.resolve(ctx.guild, role_name)
         if not role: return await ctx.send(embed=discord.Embed(title="Role Not Found", description=f"{role_name} not found.", color=discord.Color.red()))
         if role.position >= ctx.guild.me.top_role.position: return await ctx.send(embed=discord.Embed(title="Permission Error", description="Cannot manage this role.", color=discord.Color.red()))
         if role not in member.roles: return await ctx.send(embed=discord.Embed(title="Role Not Assigned", description=f"{member.display_name} does not have {role.name}.", color=discord.Color.orange()))
+        started = time.monotonic()
         await member.remove_roles(role, reason=f"Removed by {ctx.author}")
+        self.modlog.record('removerole', ctx.guild.id, ctx.author.id, member.id, ctx.channel.id, role=role.id,
+                           elapsed=round(time.monotonic() - started, 3))
         await ctx.send(embed=discord.Embed(title="Role Removed", description=f"Removed {role.name} from {member.display_name}.", color=discord.Color.green()))
 
+    # ------------------- Mass Role ------------------- #
+    def _resolve_role(self, guild, query):
+        if isinstance(query, int):
+            return guild.get_role(query)
+        mention = re.fullmatch(r'<@&(\d+)>', query)
+        return guild.get_role(int(mention.group(1))) if mention else self.roles.resolve(guild, query)
+
+    @commands.command(name='massrole')
+    @commands.guild_only()
+    @commands.has_permissions(manage_roles=True)
+    async def mass_role(self, ctx, action: str, role_name: str = None, *, member_filter: str = 'all'):
+        """Adds or removes a role for every matching member. Usage: !massrole add|remove <role> [filter] | !massrole cancel"""
+        action = action.lower()
+        job = self.role_jobs.get(ctx.guild.id)
+        if action in ('cancel', 'stop'):
+            if job is None:
+                return await ctx.send(embed=discord.Embed(description="No massrole job is running.", color=discord.Color.orange()))
+            job.cancel()
+            return await ctx.send(embed=discord.Embed(description="Cancelling the running massrole job.", color=discord.Color.orange()))
+        if action not in ('add', 'remove') or role_name is None:
+            return await ctx.send(embed=discord.Embed(
+                title="Usage",
+                description=f"`{ctx.clean_prefix}massrole add|remove <role> [filter]`\nFilters: `all`, `humans`, `bots`, `role:<name>`, `norole:<name>`, `joined:<duration>` (e.g. `joined:1d`). Combine them with spaces.",
+                color=discord.Color.red()
+            ))
+        if job is not None:
+            return await ctx.send(embed=discord.Embed(title="Job Running", description=f"A massrole job is already running here. Use `{ctx.clean_prefix}massrole cancel` to stop it.", color=discord.Color.orange()))
+
+        role = self._resolve_role(ctx.guild, role_name)
+        if not role: return await ctx.send(embed=discord.Embed(title="Role Not Found", description=f"{role_name} not found.", color=discord.Color.red()))
+        if role.is_default() or role.managed or role.position >= ctx.guild.me.top_role.position: return await ctx.send(embed=discord.Embed(title="Permission Error", description="Cannot manage this role.", color=discord.Color.red()))
+        try:
+            predicate = parse_filter(member_filter, lambda query: self._resolve_role(ctx.guild, query))
+        except FilterError as e:
+            return await ctx.send(embed=discord.Embed(title="Invalid Filter", description=str(e), color=discord.Color.red()))
+
+        add = action == 'add'
+        job = MassRoleJob(ctx.guild, role, predicate, add, self.role_buckets.for_guild(ctx.guild.id), reason=f"Mass {action} by {ctx.author}")
+        # Claimed before the first await, so a second !massrole arriving meanwhile sees the running job.
+        self.role_jobs[ctx.guild.id] = job
+        try:
+            # In lazy member-cache mode the guild's member list is loaded the first time it is needed.
+            await self.bot.member_cache.ensure_chunked(ctx.guild)
+            view = CancelJob(job, ctx.author)
+            title = f"{'Adding' if add else 'Removing'} {role.name}"
+            status = await ctx.send(embed=discord.Embed(title=title, description="Starting...", color=discord.Color.blue()), view=view)
+
+            async def report_progress():
+                while True:
+                    await asyncio.sleep(MASSROLE_PROGRESS_INTERVAL)
+                    try:
+                        await status.edit(embed=discord.Embed(title=title, description=job.summary(), color=discord.Color.blue()))
+                    except discord.HTTPException:
+                        pass
+
+            progress = asyncio.create_task(report_progress())
+            try:
+                await job.run()
+            finally:
+                progress.cancel()
+                self.modlog.record('massrole', ctx.guild.id, ctx.author.id, None, ctx.channel.id, role=role.id, add=add,
+                                   count=job.changed, scanned=job.scanned, failed=job.failed, cancelled=job.cancelled,
+                                   elapsed=round(job.elapsed, 3))
+        finally:
+            if self.role_jobs.get(ctx.guild.id) is job:
+                del self.role_jobs[ctx.guild.id]
+        view.stop()
+        done_title = f"{title} - Cancelled" if job.cancelled else f"{title} - Done"
+        color = discord.Color.orange() if job.cancelled or job.failed else discord.Color.green()
+        await status.edit(embed=discord.Embed(title=done_title, description=job.summary(), color=color), view=None)
+
+    # ------------------- Journal ------------------- #
+    @staticmethod
+    def _describe(entry):
+        """One !modlog line for a journal entry."""
+        action = entry['action']
+        target = f"<@{entry['target']}>" if entry.get('target') else None
+        if action == 'purge':
+            text = f"deleted {entry.get('count', 0)} messages in <#{entry['channel']}>" + (f" from {target}" if target else "")
+        elif action in ('addrole', 'removerole'):
+            text = f"{'added' if action == 'addrole' else 'removed'} <@&{entry['role']}> {'to' if action == 'addrole' else 'from'} {target}"
+        elif action == 'massrole':
+            text = f"mass-{'added' if entry.get('add') else 'removed'} <@&{entry['role']}> ({entry.get('count', 0)} members)"
+            if entry.get('cancelled'):
+                text += ", cancelled"
+        else:
+            text = action
+        if entry.get('failed'):
+            text += f", {entry['failed']} failed"
+        return f"<t:{int(entry['ts'])}:R> <@{entry['actor']}> {text} ({entry.get('elapsed', 0):.1f}s)"
+
+    @commands.command(name='modlog')
+    @commands.guild_only()
+    @commands.has_permissions(view_audit_log=True)
+    async def mod_log(self, ctx, user: typing.Optional[discord.Object] = None, since: str = None):
+        """Shows recent moderation actions, by or against a user if given. Usage: !modlog [@user] [since: 2h|3d|2024-05-01]"""
+        since_ts = None
+        if since is not None:
+            point = parse_point(since)
+            since_ts = (discord.utils.snowflake_time(point.id) if isinstance(point, discord.Object) else point).timestamp()
+        entries = await self.modlog.query(ctx.guild.id, user.id if user else None, since_ts, MODLOG_LIMIT)
+        title = "Moderation Log" + (f" for {ctx.guild.get_member(user.id) or user.id}" if user else "")
+        description = "\n".join(self._describe(entry) for entry in entries) or "No moderation actions recorded."
+        embed = discord.Embed(title=title, description=description, color=discord.Color.blue())
+        if len(entries) == MODLOG_LIMIT:
+            embed.set_footer(text=f"Newest {MODLOG_LIMIT} shown. Narrow it down with a user or a since time.")
+        await ctx.send(embed=embed)
+
     @commands.command(name='listroles')
-    async def list_roles(self, ctx, member: discord.Member = None):
+    async def list_roles(self, ctx, member: CachedMember = None):
         """Lists roles in the server or for a specific user. Usage: !listroles [@user]"""
         if member is None:
-            roles = [r for r in ctx.guild.roles if r.name != "@everyone"]
-            roles.sort(key=lambda x: x.position, reverse=True)
-            role_list = [f"{r.mention} - {len(r.members)} members" for r in roles[:25]]
-            description = "\n".join(role_list) if role_list else "No roles."
-            embed = discord.Embed(title=f"Server Roles ({len(roles)})", description=description, color=discord.Color.blue())
-            if len(roles) > 25: embed.set_footer(text=f"Showing first 25 of {len(roles)} roles")
+            # guild.roles is already sorted bottom to top.
+            roles = [r for r in reversed(ctx.guild.roles) if not r.is_default()]
+            await self.bot.member_cache.ensure_chunked(ctx.guild)
+            view = RolePages(ctx.author, roles, self.role_counts.for_guild(ctx.guild))
+            if view.pages == 1:
+                return await ctx.send(embed=view.embed())
+            view.message = await ctx.send(embed=view.embed(), view=view)
         else:
-            user_roles = [r for r in member.roles if r.name != "@everyone"]
-            user_roles.sort(key=lambda x: x.position, reverse=True)
-            description = ", ".join([r.mention for r in user_roles]) if user_roles else "No roles."
-            embed = discord.Embed(title=f"Roles for {member.display_name}", description=description, color=member.color if member.color != discord.Color.default() else discord.Color.blue())
-            embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
-        await ctx.send(embed=embed)
+            profile = self.bot.profiles.get(member)
+            if profile.role_pages == 1:
+                return await ctx.send(embed=profile.roles_embed())
+            view = MemberRolePages(ctx.author, profile)
+            view.message = await ctx.send(embed=view.embed(), view=view)
         
 async def setup(bot):
     await bot.add_cog(Moderation(bot))
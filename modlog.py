@@ -0,0 +1,418 @@
+"""
+Append-only journal of moderation actions, behind !modlog.
+
+Each action (a purge, a role added or removed, a massrole run) is one JSON line with
+its time, guild, channel, actor, target, counts and duration. record() only appends to
+an in-memory list. A flusher task hands the list to a dedicated writer thread every
+FLUSH_INTERVAL seconds, or sooner once FLUSH_THRESHOLD records are waiting.
+
+On disk the journal is a directory of segments. <first_ms>.log holds the records,
+and a new segment starts once the current one passes SEGMENT_BYTES. Its
+<first_ms>.idx holds one fixed-size entry per block of BLOCK_RECORDS records: the
+block's first and last timestamp, its byte range, and a small bloom filter of the
+guild and user IDs in it. A query walks the index from the newest block back. It stops
+at the first block older than `since`, skips blocks whose bloom rules out the guild or
+user, and reads only the blocks left over. Lookups therefore cost about the same after
+millions of entries as after a hundred.
+
+A journal directory has exactly one writer, enforced with an exclusive lock on its LOCK
+file. Cluster workers each write their own MODLOG_DIR/worker-<CLUSTER_WORKER>; a query
+also reads every other journal under MODLOG_DIR, read-only, and merges the results.
+"""
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so run one writer per directory by hand.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MODLOG_DIR = 'modlog'
+FLUSH_INTERVAL = 1.0
+FLUSH_THRESHOLD = 256
+SEGMENT_BYTES = 64 * 1024 * 1024
+BLOCK_RECORDS = 64
+BLOOM_BITS = 2048
+# first_ms, last_ms, offset, length, bloom
+INDEX_ENTRY = struct.Struct(f'<qqQI{BLOOM_BITS // 8}s')
+
+
+def _bloom_bits(value):
+    """Two bit positions for an ID, from one multiplicative hash."""
+    h = (value * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    return (1 << (h % BLOOM_BITS)) | (1 << ((h >> 32) % BLOOM_BITS))
+
+
+def record_ids(record):
+    """The IDs a query can filter a record by: its guild, actor and target."""
+    return [value for value in (record.get('guild'), record.get('actor'), record.get('target')) if value is not None]
+
+
+def matches(record, guild_id, user_id):
+    return record.get('guild') == guild_id and (user_id is None or user_id in (record.get('actor'), record.get('target')))
+
+
+def journal_directory(base=None):
+    """This process's journal: MODLOG_DIR itself, or MODLOG_DIR/worker-<n> in a cluster worker."""
+    base = base or os.getenv('MODLOG_DIR', MODLOG_DIR)
+    worker = os.getenv('CLUSTER_WORKER')
+    return os.path.join(base, f'worker-{worker}') if worker else base
+
+
+def _segment_names(directory):
+    return sorted(name[:-4] for name in os.listdir(directory) if name.endswith('.log') and name[:-4].isdigit())
+
+
+class JournalLocked(RuntimeError):
+    """Raised when another process already writes to a journal directory."""
+
+
+# ------------------- Files ------------------- #
+class Block:
+    __slots__ = ('first_ms', 'last_ms', 'offset', 'length', 'bloom')
+
+    def __init__(self, first_ms, last_ms, offset, length, bloom):
+        self.first_ms = first_ms
+        self.last_ms = last_ms
+        self.offset = offset
+        self.length = length
+        self.bloom = bloom
+
+    def pack(self):
+        return INDEX_ENTRY.pack(self.first_ms, self.last_ms, self.offset, self.length, self.bloom.to_bytes(BLOOM_BITS // 8, 'little'))
+
+    @classmethod
+    def unpack(cls, data):
+        first_ms, last_ms, offset, length, bloom = INDEX_ENTRY.unpack(data)
+        return cls(first_ms, last_ms, offset, length, int.from_bytes(bloom, 'little'))
+
+
+class Segment:
+    def __init__(self, directory, first_ms):
+        self.first_ms = first_ms
+        self.log_path = os.path.join(directory, f'{first_ms:013d}.log')
+        self.index_path = os.path.join(directory, f'{first_ms:013d}.idx')
+        self.blocks = []
+        self.index_bytes = 0
+
+    def load_index(self):
+        """Reads the index entries added since the last call. Returns the bytes of whole entries read so far."""
+        with open(self.index_path, 'rb') as f:
+            f.seek(self.index_bytes)
+            data = f.read()
+        # A torn final entry (from a crash, or still being written) is left for later; its
+        # records are recovered as the open block.
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        self.blocks.extend(Block.unpack(data[i:i + INDEX_ENTRY.size]) for i in range(0, usable, INDEX_ENTRY.size))
+        self.index_bytes += usable
+        return self.index_bytes
+
+    def indexed_end(self):
+        """Byte offset in the log where the records not yet indexed start."""
+        return self.blocks[-1].offset + self.blocks[-1].length if self.blocks else 0
+
+    def read(self, offset, length):
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+class JournalFiles:
+    """
+    The on-disk segments. Not thread-safe: every call runs on the journal's writer thread.
+    With readonly=True it follows a journal another process writes, through refresh().
+    """
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, block_records=BLOCK_RECORDS, readonly=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.block_records = block_records
+        self.readonly = readonly
+        self.segments = []
+        self._lock = None
+        self._log = None
+        self._index = None
+        self._size = 0
+        # The open block: records written to the log but not indexed yet.
+        self._block = []
+        self._block_offset = 0
+        self._block_bloom = 0
+
+    def open(self):
+        if self.readonly:
+            self.refresh()
+            return sum(len(segment.blocks) for segment in self.segments)
+        os.makedirs(self.directory, exist_ok=True)
+        self._acquire_lock()
+        for name in _segment_names(self.directory):
+            segment = Segment(self.directory, int(name))
+            if os.path.exists(segment.index_path):
+                usable = segment.load_index()
+                if usable != os.path.getsize(segment.index_path):
+                    with open(segment.index_path, 'r+b') as f:
+                        f.truncate(usable)
+            self.segments.append(segment)
+        if self.segments:
+            self._reopen(self.segments[-1])
+        return sum(len(segment.blocks) for segment in self.segments)
+
+    def _acquire_lock(self):
+        """Takes the directory's writer lock, so two processes never append to one segment."""
+        if fcntl is None:
+            return
+        lock = open(os.path.join(self.directory, 'LOCK'), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            raise JournalLocked(f'Another process is writing the moderation journal in {self.directory}')
+        self._lock = lock
+
+    def refresh(self):
+        """Read-only journals: picks up the segments, index entries and records written since the last call."""
+        if not os.path.isdir(self.directory):
+            return
+        known = {segment.first_ms for segment in self.segments}
+        for name in _segment_names(self.directory):
+            if int(name) not in known:
+                self.segments.append(Segment(self.directory, int(name)))
+        self.segments.sort(key=lambda segment: segment.first_ms)
+        for segment in self.segments:
+            if os.path.exists(segment.index_path):
+                segment.load_index()
+        self._block = []
+        if self.segments:
+            segment = self.segments[-1]
+            with open(segment.log_path, 'rb') as f:
+                f.seek(segment.indexed_end())
+                tail = f.read()
+            # Only whole lines: the writer may be half way through one.
+            self._block = [json.loads(line) for line in tail[:tail.rfind(b'\n') + 1].splitlines()]
+
+    def _reopen(self, segment):
+        """Continues the newest segment, re-reading the records after its last indexed block."""
+        start = segment.indexed_end()
+        with open(segment.log_path, 'rb') as f:
+            f.seek(start)
+            tail = f.read()
+        # Drop a torn final line left by a crash.
+        complete = tail[:tail.rfind(b'\n') + 1]
+        if len(complete) != len(tail):
+            with open(segment.log_path, 'r+b') as f:
+                f.truncate(start + len(complete))
+        self._log = open(segment.log_path, 'ab')
+        self._index = open(segment.index_path, 'ab')
+        self._size = start + len(complete)
+        self._block_offset = start
+        for line in complete.splitlines():
+            self._add_to_block(json.loads(line))
+
+    def _rotate(self, first_ms):
+        self._close_block()
+        self._close_files()
+        segment = Segment(self.directory, first_ms)
+        self.segments.append(segment)
+        self._log = open(segment.log_path, 'ab')
+        self._index = open(segment.index_path, 'ab')
+        self._size = 0
+        self._block_offset = 0
+
+    def _add_to_block(self, record):
+        self._block.append(record)
+        for value in record_ids(record):
+            self._block_bloom |= _bloom_bits(value)
+
+    def _close_block(self):
+        if not self._block:
+            return
+        block = Block(int(self._block[0]['ts'] * 1000), int(self._block[-1]['ts'] * 1000),
+                      self._block_offset, self._size - self._block_offset, self._block_bloom)
+        self._index.write(block.pack())
+        self.segments[-1].blocks.append(block)
+        self._block = []
+        self._block_offset = self._size
+        self._block_bloom = 0
+
+    def append(self, records):
+        for record in records:
+            if self._log is None or (self._size >= self.segment_bytes and not self._block):
+                self._rotate(int(record['ts'] * 1000))
+            line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+            self._log.write(line)
+            self._size += len(line)
+            self._add_to_block(record)
+            if len(self._block) >= self.block_records:
+                self._close_block()
+        if self._log is not None:
+            self._log.flush()
+            self._index.flush()
+
+    def query(self, guild_id, user_id=None, since_ms=None, limit=10):
+        """Matching records, newest first."""
+        wanted = _bloom_bits(guild_id) | (_bloom_bits(user_id) if user_id is not None else 0)
+        results = []
+
+        def take(records):
+            for record in reversed(records):
+                if since_ms is not None and record['ts'] * 1000 < since_ms:
+                    return True
+                if matches(record, guild_id, user_id):
+                    results.append(record)
+                    if len(results) >= limit:
+                        return True
+            return False
+
+        if take(self._block):
+            return results
+        for segment in reversed(self.segments):
+            for block in reversed(segment.blocks):
+                if since_ms is not None and block.last_ms < since_ms:
+                    return results
+                if block.bloom & wanted != wanted:
+                    continue
+                lines = segment.read(block.offset, block.length).splitlines()
+                if take([json.loads(line) for line in lines]):
+                    return results
+        return results
+
+    def _close_files(self):
+        for f in (self._log, self._index):
+            if f is not None:
+                f.close()
+        self._log = self._index = None
+
+    def close(self):
+        if self._log is not None:
+            self._close_block()
+        self._close_files()
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+
+# ------------------- Journal ------------------- #
+class ModLog:
+    """
+    Loop-side front of the journal: record() never blocks, flushes and queries run on one writer thread.
+    `base` is the MODLOG_DIR holding every process's journal; this one writes journal_directory(base).
+    """
+
+    def __init__(self, base=None, flush_interval=FLUSH_INTERVAL, flush_threshold=FLUSH_THRESHOLD, files=None):
+        self.base = base or os.getenv('MODLOG_DIR', MODLOG_DIR)
+        self.files = files or JournalFiles(journal_directory(self.base))
+        # Journals of other cluster workers (and earlier runs), keyed by directory.
+        self.peers = {}
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='modlog')
+        self._pending = []
+        self._last_ts = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._writing = None
+        self.written = 0
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def start(self):
+        blocks = await self._run(self.files.open)
+        logger.info('Moderation journal in %s: %d segments, %d indexed blocks', self.files.directory, len(self.files.segments), blocks)
+        self._task = asyncio.create_task(self._flush_loop())
+
+    def record(self, action, guild_id, actor_id, target_id=None, channel_id=None, **fields):
+        """Queues one action for the next flush. Timestamps never go backwards, which the index relies on."""
+        self._last_ts = max(self._last_ts, round(time.time(), 3))
+        entry = {'ts': self._last_ts, 'guild': guild_id, 'channel': channel_id, 'action': action,
+                 'actor': actor_id, 'target': target_id}
+        entry.update(fields)
+        self._pending.append(entry)
+        if len(self._pending) >= self.flush_threshold:
+            self._wakeup.set()
+        return entry
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        write = asyncio.ensure_future(self._run(self.files.append, batch))
+        write.add_done_callback(lambda task: self._write_done(task, batch))
+        self._writing = write
+        # Shielded like the economy store's flush: cancelling the flusher must not lose the
+        # batch half way. The write carries on and close() waits for it.
+        await asyncio.shield(write)
+
+    def _write_done(self, task, batch):
+        if task.cancelled() or task.exception() is not None:
+            self._pending[:0] = batch
+        else:
+            self.written += len(batch)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception('Failed to write the moderation journal')
+
+    async def query(self, guild_id, user_id=None, since=None, limit=10):
+        """Up to `limit` of the guild's records, newest first, optionally for one user (as actor or target) and since a Unix time."""
+        results = []
+        for record in reversed(self._pending):
+            if since is not None and record['ts'] < since:
+                return results
+            if matches(record, guild_id, user_id):
+                results.append(record)
+                if len(results) >= limit:
+                    return results
+        since_ms = int(since * 1000) if since is not None else None
+        # Runs after any write already handed to the writer thread, so no record is missed in between.
+        results.extend(await self._run(self._query_files, guild_id, user_id, since_ms, limit - len(results)))
+        return results
+
+    def _peer_directories(self):
+        """Every other journal under the base directory: the base itself and its worker-<n> subdirectories."""
+        if not os.path.isdir(self.base):
+            return []
+        candidates = [self.base] + [os.path.join(self.base, name) for name in sorted(os.listdir(self.base)) if name.startswith('worker-')]
+        own = os.path.abspath(self.files.directory)
+        return [path for path in candidates if os.path.abspath(path) != own and os.path.isdir(path)]
+
+    def _query_files(self, guild_id, user_id, since_ms, limit):
+        """This journal's matches merged with every peer's, newest first. Runs on the writer thread."""
+        results = self.files.query(guild_id, user_id, since_ms, limit)
+        for directory in self._peer_directories():
+            peer = self.peers.get(directory)
+            if peer is None:
+                peer = self.peers[directory] = JournalFiles(directory, readonly=True)
+            peer.refresh()
+            results.extend(peer.query(guild_id, user_id, since_ms, limit))
+        results.sort(key=lambda record: record['ts'], reverse=True)
+        return results[:limit]
+
+    async def close(self):
+        """Stops the flusher, writes what is pending and closes the files."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None and not self._writing.done():
+            await asyncio.wait([self._writing])
+        await self.flush()
+        await self._run(self.files.close)
+        self._executor.shutdown(wait=True)
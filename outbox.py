@@ -0,0 +1,275 @@
+"""
+Outbound delivery layer for command replies.
+
+Every ctx.send goes through a per-channel queue, drained by one worker per busy channel.
+The queue is ordered by priority, then first in, first out within a priority, so a
+moderation reply can overtake a queued !roll result but replies of the same priority
+never swap places. When discord.py is holding a send back for the channel's rate limit,
+later replies wait in the queue, where the worker can:
+
+- send moderation replies before fun ones (PRIORITIES, by cog);
+- merge queued replies that share a coalesce key (e.g. !roll results) into one embed;
+- send only one copy of identical transient notices (those with delete_after).
+
+A reply sent with an edit key replaces the bot's previous reply with the same key in
+place. This only happens when that reply is directly above the invoking message.
+Edits use a different rate-limit bucket from new messages.
+
+A channel's state is dropped once its queue is empty, its worker has exited and it has
+no edit keys left from the last EDIT_WINDOW, so only recently active channels are kept.
+
+Interaction replies bypass the queue.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+import discord
+from discord.ext import commands
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+# Reply priority by cog; cogs not listed are PRIORITY_NORMAL.
+PRIORITIES = {
+    'Moderation': PRIORITY_HIGH,
+    'Dev': PRIORITY_HIGH,
+    'Admin': PRIORITY_HIGH,
+    'Settings': PRIORITY_HIGH,
+    'Gambling': PRIORITY_LOW,
+    'Misc': PRIORITY_LOW,
+}
+# At most this many replies are merged into one embed (one field each).
+MAX_COALESCE = 10
+# A previous reply is only edited if it is at most this old.
+EDIT_WINDOW = 60.0
+# Edit keys remembered per channel; the oldest is forgotten first.
+MAX_EDIT_KEYS = 16
+
+
+class _Reply:
+    __slots__ = ('priority', 'seq', 'ctx', 'kwargs', 'coalesce', 'edit', 'future')
+
+    def __init__(self, priority, seq, ctx, kwargs, coalesce, edit):
+        self.priority = priority
+        self.seq = seq
+        self.ctx = ctx
+        self.kwargs = kwargs
+        self.coalesce = coalesce
+        self.edit = edit
+        self.future = asyncio.get_running_loop().create_future()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def transient_key(self):
+        """Identity of a delete_after notice, or None if this reply is not one."""
+        if self.kwargs.get('delete_after') is None or set(self.kwargs) - {'content', 'embed', 'delete_after'}:
+            return None
+        embed = self.kwargs.get('embed')
+        return self.kwargs.get('content'), embed.to_dict() if embed is not None else None
+
+
+class _Channel:
+    """Pending replies for one channel and the bookkeeping edits need."""
+
+    __slots__ = ('heap', 'worker', 'last_id', 'previous_id', 'edits')
+
+    def __init__(self):
+        self.heap = []
+        self.worker = None
+        # The two most recent message IDs seen in the channel.
+        self.last_id = None
+        self.previous_id = None
+        # edit key -> (message, sent_at)
+        self.edits = {}
+
+
+def merge_embeds(replies):
+    """One embed with a field per reply, named after the invoking user."""
+    first = replies[0].kwargs['embed']
+    embed = discord.Embed(title=f"{len(replies)} results", color=first.color)
+    for reply in replies:
+        source = reply.kwargs['embed']
+        name = f"{reply.ctx.author.display_name}: {source.title or ''}".rstrip(': ')
+        embed.add_field(name=name[:256], value=(source.description or '\u200b')[:1024], inline=False)
+    return embed
+
+
+class Outbox:
+    def __init__(self, bot):
+        self.bot = bot
+        self.channels = {}
+        self._seq = itertools.count()
+        self._pruned = time.monotonic()
+        self.sent = 0
+        self.coalesced = 0
+        self.deduplicated = 0
+        self.edited = 0
+
+    @property
+    def pending(self):
+        return sum(len(channel.heap) for channel in self.channels.values())
+
+    def seen(self, message):
+        """
+        Records a message in a channel the outbox is tracking. Called for every message, the
+        bot's own included. Untracked channels have no reply that could be edited, so they are skipped.
+        """
+        channel = self.channels.get(message.channel.id)
+        if channel is not None:
+            channel.previous_id, channel.last_id = channel.last_id, message.id
+        now = time.monotonic()
+        if now - self._pruned >= EDIT_WINDOW:
+            self._prune(now)
+
+    def _prune(self, now):
+        """Drops the state of every idle channel whose edit keys have all expired."""
+        self._pruned = now
+        for channel_id, channel in list(self.channels.items()):
+            self._expire_edits(channel, now)
+            if self._idle(channel):
+                del self.channels[channel_id]
+
+    @staticmethod
+    def _idle(channel):
+        return not channel.heap and not channel.edits and (channel.worker is None or channel.worker.done())
+
+    def priority_for(self, ctx):
+        return PRIORITIES.get(ctx.cog.qualified_name if ctx.cog else None, PRIORITY_NORMAL)
+
+    async def send(self, ctx, kwargs, priority=None, coalesce=None, edit=None):
+        channel = self.channels.get(ctx.channel.id)
+        if channel is None:
+            channel = self.channels[ctx.channel.id] = _Channel()
+        if coalesce is not None and set(kwargs) != {'embed'}:
+            coalesce = None
+        reply = _Reply(self.priority_for(ctx) if priority is None else priority, next(self._seq), ctx, kwargs, coalesce, edit)
+        heapq.heappush(channel.heap, reply)
+        if channel.worker is None or channel.worker.done():
+            channel.worker = asyncio.create_task(self._drain(ctx.channel.id, channel))
+        return await reply.future
+
+    # ------------------- Worker ------------------- #
+    async def _drain(self, channel_id, channel):
+        try:
+            await self._drain_heap(channel)
+        finally:
+            # Nothing is queued and this worker is about to exit; keep the channel only for its edit keys.
+            self._expire_edits(channel, time.monotonic())
+            if not channel.heap and not channel.edits and self.channels.get(channel_id) is channel:
+                del self.channels[channel_id]
+
+    async def _drain_heap(self, channel):
+        while channel.heap:
+            reply = heapq.heappop(channel.heap)
+            batch = [reply] + self._take_matching(channel, reply)
+            try:
+                message = await self._deliver(channel, batch)
+            except Exception as e:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+            else:
+                self.sent += 1
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_result(message)
+
+    def _take_matching(self, channel, reply):
+        """Pulls queued replies that can ride along with `reply`."""
+        if reply.coalesce is not None:
+            matches = [r for r in channel.heap if r.coalesce == reply.coalesce][:MAX_COALESCE - 1]
+            self.coalesced += len(matches)
+        else:
+            key = reply.transient_key()
+            if key is None:
+                return []
+            matches = [r for r in channel.heap if r.transient_key() == key]
+            self.deduplicated += len(matches)
+        if matches:
+            taken = set(map(id, matches))
+            channel.heap = [r for r in channel.heap if id(r) not in taken]
+            heapq.heapify(channel.heap)
+        return matches
+
+    async def _deliver(self, channel, batch):
+        first = batch[0]
+        kwargs = first.kwargs
+        if len(batch) > 1 and first.coalesce is not None:
+            kwargs = {'embed': merge_embeds(batch)}
+
+        if first.edit is not None and len(batch) == 1:
+            previous = channel.edits.get(first.edit)
+            if previous is not None and self._editable(channel, first.ctx, *previous):
+                try:
+                    message = await previous[0].edit(**kwargs)
+                except discord.NotFound:
+                    pass
+                else:
+                    self.edited += 1
+                    self._remember_edit(channel, first.edit, message)
+                    return message
+
+        message = await commands.Context.send(first.ctx, **kwargs)
+        if first.edit is not None:
+            self._remember_edit(channel, first.edit, message)
+        return message
+
+    def _remember_edit(self, channel, key, message):
+        now = time.monotonic()
+        channel.edits.pop(key, None)
+        channel.edits[key] = (message, now)
+        self._expire_edits(channel, now)
+        while len(channel.edits) > MAX_EDIT_KEYS:
+            del channel.edits[next(iter(channel.edits))]
+
+    def _editable(self, channel, ctx, message, sent_at):
+        # Only edit a reply sitting directly above the invoking message, so the change is seen.
+        return (time.monotonic() - sent_at < EDIT_WINDOW
+                and channel.last_id == ctx.message.id and channel.previous_id == message.id)
+
+    @staticmethod
+    def _expire_edits(channel, now):
+        # Keys are kept oldest first, so expiry stops at the first live one.
+        edits = channel.edits
+        while edits:
+            key = next(iter(edits))
+            if now - edits[key][1] < EDIT_WINDOW:
+                break
+            del edits[key]
+
+
+class OutboxContext(commands.Context):
+    """
+    A Context whose send() goes through the bot's Outbox. Accepts three extra keywords:
+    priority (PRIORITY_*), coalesce (a key; replies sharing it may be merged) and
+    edit (a key; a recent reply with the same key may be edited instead).
+    """
+
+    async def send(self, content=None, *, priority=None, coalesce=None, edit=None, **kwargs):
+        outbox = getattr(self.bot, 'outbox', None)
+        if outbox is None or self.interaction is not None:
+            return await super().send(content, **kwargs)
+        if content is not None:
+            kwargs['content'] = content
+        return await outbox.send(self, kwargs, priority=priority, coalesce=coalesce, edit=edit)
+
+
+class OutboxMixin:
+    """Gives a bot an Outbox and makes OutboxContext its default command context."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbox = Outbox(self)
+
+    async def get_context(self, origin, *, cls=OutboxContext):
+        return await super().get_context(origin, cls=cls)
+
+    async def on_message(self, message):
+        self.outbox.seen(message)
+        await self.process_commands(message)
@@ -0,0 +1,57 @@
+"""
+Pacing for outgoing REST calls made by bulk jobs: massrole role edits and purge's
+one-by-one deletes. The inbound command throttle lives in throttle.py.
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Paces calls to `rate` per `per` seconds, evenly spaced rather than in bursts, so no
+    window ever sees more than rate + 1 calls. backoff() halves the rate after a 429
+    (once per window, however many requests were in flight) and recover() adds it back
+    gradually, AIMD style.
+    """
+
+    def __init__(self, rate, per=1.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.per = per
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_backoff = float('-inf')
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(1.0, self._tokens + (now - self._updated) * self.rate / self.per)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+
+    def backoff(self, retry_after=None):
+        """Called on a 429: pause for `retry_after` (default one window) and halve the rate."""
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = 0.0
+        self._blocked_until = max(self._blocked_until, now + (retry_after or self.per))
+        if now - self._last_backoff >= self.per:
+            self._last_backoff = now
+            self.rate = max(1.0, self.rate / 2)
+
+    def recover(self):
+        """Called on a success: grows the rate by about one call per window back towards its starting value."""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + 1 / self.rate)
@@ -0,0 +1,198 @@
+"""
+Cached user profiles for !userinfo, !balance and !listroles @user.
+
+A Profile holds what those commands show about a member: names, avatar, colour, dates
+and the role list sorted top to bottom. It is built on first use, and each embed built
+from it is cached as well, so repeated lookups of a popular member only copy a prepared
+embed. Profiles are keyed by (guild_id, user_id). They are dropped on member and user
+updates, on role changes in their guild and after PROFILE_TTL. A cached balance embed is
+dropped on its own whenever the balance changes. The TTL matters because
+in MEMBER_CACHE=lazy mode uncached members get no update events.
+
+Long role lists are capped in !userinfo and paged in !listroles.
+"""
+import datetime
+import logging
+import time
+from collections import OrderedDict, defaultdict
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CACHE_SIZE = 10_000
+PROFILE_TTL = 300.0
+ROLES_PER_PAGE = 25
+# Embed field values are limited to 1024 characters; leave room for the "and N more" line.
+USERINFO_ROLES_CHARS = 900
+DATE_FORMAT = "%b %d, %Y %I:%M %p UTC"
+
+
+class Profile:
+    """The parts of a member that profile embeds show, with the embeds built lazily."""
+
+    __slots__ = ('id', 'display_name', 'mention', 'bot', 'color', 'avatar_url', 'created_at', 'joined_at', 'roles', 'built_at', '_embeds')
+
+    def __init__(self, member):
+        self.id = member.id
+        self.display_name = member.display_name
+        self.mention = member.mention
+        self.bot = member.bot
+        self.color = member.color if member.color != discord.Color.default() else None
+        self.avatar_url = member.display_avatar.url
+        self.created_at = member.created_at.strftime(DATE_FORMAT)
+        joined_at = getattr(member, 'joined_at', None)
+        self.joined_at = joined_at.strftime(DATE_FORMAT) if joined_at else "Unknown"
+        # Members outside a guild (DMs) have no roles.
+        roles = [r for r in getattr(member, 'roles', ()) if not r.is_default()]
+        roles.sort(key=lambda r: r.position, reverse=True)
+        self.roles = [r.mention for r in roles]
+        self.built_at = time.monotonic()
+        self._embeds = {}
+
+    @property
+    def role_pages(self):
+        return max(1, -(-len(self.roles) // ROLES_PER_PAGE))
+
+    def _cached(self, key, build):
+        embed = self._embeds.get(key)
+        if embed is None:
+            embed = self._embeds[key] = build()
+        return embed.copy()
+
+    def userinfo_embed(self):
+        embed = self._cached('userinfo', self._build_userinfo)
+        embed.timestamp = datetime.datetime.now()
+        return embed
+
+    def _build_userinfo(self):
+        embed = discord.Embed(title=f"User Info: {self.display_name}", color=self.color or discord.Color.teal())
+        embed.set_thumbnail(url=self.avatar_url)
+        embed.add_field(name="ID", value=self.id, inline=False)
+        embed.add_field(name="Mention", value=self.mention, inline=True)
+        embed.add_field(name="Bot?", value="Yes" if self.bot else "No", inline=True)
+        embed.add_field(name="Account Created", value=self.created_at, inline=False)
+        embed.add_field(name="Joined Server", value=self.joined_at, inline=False)
+        shown, length = [], 0
+        for mention in self.roles:
+            length += len(mention) + 2
+            if length > USERINFO_ROLES_CHARS:
+                break
+            shown.append(mention)
+        roles_text = ", ".join(shown) if shown else "None"
+        if len(shown) < len(self.roles):
+            roles_text += f"\n...and {len(self.roles) - len(shown)} more (see listroles)"
+        embed.add_field(name=f"Roles ({len(self.roles)})", value=roles_text, inline=False)
+        return embed
+
+    def roles_embed(self, page=0):
+        return self._cached(('roles', page), lambda: self._build_roles(page))
+
+    def _build_roles(self, page):
+        start = page * ROLES_PER_PAGE
+        description = ", ".join(self.roles[start:start + ROLES_PER_PAGE]) or "No roles."
+        embed = discord.Embed(title=f"Roles for {self.display_name}", description=description, color=self.color or discord.Color.blue())
+        embed.set_thumbnail(url=self.avatar_url)
+        if self.role_pages > 1:
+            embed.set_footer(text=f"Page {page + 1}/{self.role_pages} ({len(self.roles)} roles)")
+        return embed
+
+    def balance_embed(self, balance):
+        # Keyed by the balance too, so a change that skipped balance_changed() is never shown stale.
+        return self._cached(('balance', balance), lambda: self._build_balance(balance))
+
+    def _build_balance(self, balance):
+        return discord.Embed(
+            title=f"{self.display_name}'s Balance",
+            description=f"You have **{balance}** coins.",
+            color=discord.Color.gold()
+        )
+
+    def drop_balance(self):
+        for key in [key for key in self._embeds if isinstance(key, tuple) and key[0] == 'balance']:
+            del self._embeds[key]
+
+
+class ProfileCache:
+    """LRU of Profiles keyed by (guild_id, user_id); guild_id is 0 for users outside a guild."""
+
+    def __init__(self, bot, size=PROFILE_CACHE_SIZE, ttl=PROFILE_TTL):
+        self.bot = bot
+        self.size = size
+        self.ttl = ttl
+        self._profiles = OrderedDict()
+        # user_id -> guild ids with a cached profile, so a user update finds all of them.
+        self._guilds = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def get(self, member):
+        guild = getattr(member, 'guild', None)
+        key = (guild.id if guild is not None else 0, member.id)
+        profile = self._profiles.get(key)
+        if profile is not None and time.monotonic() - profile.built_at < self.ttl:
+            self.hits += 1
+            self._profiles.move_to_end(key)
+            return profile
+        self.misses += 1
+        profile = self._profiles[key] = Profile(member)
+        self._profiles.move_to_end(key)
+        self._guilds[member.id].add(key[0])
+        while len(self._profiles) > self.size:
+            self._discard(*self._profiles.popitem(last=False)[0])
+        return profile
+
+    def _discard(self, guild_id, user_id):
+        guilds = self._guilds.get(user_id)
+        if guilds is not None:
+            guilds.discard(guild_id)
+            if not guilds:
+                del self._guilds[user_id]
+
+    def invalidate(self, guild_id, user_id):
+        if self._profiles.pop((guild_id, user_id), None) is not None:
+            self._discard(guild_id, user_id)
+
+    def invalidate_user(self, user_id):
+        """A name or avatar change shows in every guild's profile."""
+        for guild_id in self._guilds.pop(user_id, ()):
+            self._profiles.pop((guild_id, user_id), None)
+
+    def drop_guild(self, guild_id):
+        for key in [key for key in self._profiles if key[0] == guild_id]:
+            self.invalidate(*key)
+
+    def balance_changed(self, user_id):
+        """Drops the user's cached balance embeds; the rest of their profiles stay."""
+        for guild_id in self._guilds.get(user_id, ()):
+            profile = self._profiles.get((guild_id, user_id))
+            if profile is not None:
+                profile.drop_balance()
+
+    def attach(self):
+        """Registers the listeners that invalidate changed profiles."""
+        async def on_member_update(before, after):
+            self.invalidate(after.guild.id, after.id)
+
+        async def on_user_update(before, after):
+            self.invalidate_user(after.id)
+
+        async def on_raw_member_remove(payload):
+            self.invalidate(payload.guild_id, payload.user.id)
+
+        # Role colours and positions show in every member's profile.
+        async def on_guild_role_update(before, after):
+            self.drop_guild(after.guild.id)
+
+        async def on_guild_role_delete(role):
+            self.drop_guild(role.guild.id)
+
+        async def on_guild_remove(guild):
+            self.drop_guild(guild.id)
+
+        for listener in (on_member_update, on_user_update, on_raw_member_remove, on_guild_role_update,
+                         on_guild_role_delete, on_guild_remove):
+            self.bot.add_listener(listener)
@@ -0,0 +1,203 @@
+import asyncio
+import datetime
+import logging
+import re
+import time
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+from durations import parse_duration
+from pacing import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Discord's bulk delete takes 2-100 messages, all younger than 14 days. The margin keeps
+# messages that age out while the purge is running from failing a whole chunk.
+BULK_DELETE_MAX = 100
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=5)
+# Bulk delete requests allowed in flight at once; discord.py queues them on the route's bucket.
+MAX_BULK_IN_FLIGHT = 2
+# Older messages must be deleted one by one, and Discord limits that route tightly.
+OLD_DELETE_RATE = 1
+# Messages scanned before a purge gives up looking for more matches.
+PURGE_SCAN_LIMIT = 10_000
+PURGE_MAX = 5_000
+MAX_REGEX_LENGTH = 200
+
+
+def parse_point(text):
+    """
+    Parses a before/after boundary: a message ID, a duration ago (`2h`, `3d`), or an
+    ISO date (`2024-05-01` or `2024-05-01T12:00`, UTC). Returns a discord.Object or datetime.
+    """
+    if text.isdigit() and len(text) >= 15:
+        return discord.Object(id=int(text))
+    try:
+        return discord.utils.utcnow() - datetime.timedelta(seconds=parse_duration(text))
+    except ValueError:
+        pass
+    try:
+        point = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        raise commands.BadArgument(f"`{text}` is not a message ID, duration (e.g. `2h`) or date (e.g. `2024-05-01`).")
+    return point if point.tzinfo else point.replace(tzinfo=datetime.timezone.utc)
+
+
+class PurgeFlags(commands.FlagConverter, case_insensitive=True):
+    """Filters for !delete, written as `name:value` after the amount."""
+    user: Optional[discord.User] = None
+    regex: Optional[str] = commands.flag(default=None, aliases=['match'])
+    attachments: bool = False
+    bots: bool = False
+    before: Optional[str] = None
+    after: Optional[str] = None
+
+
+def build_predicate(flags, target=None):
+    """Returns a predicate over messages from parsed PurgeFlags plus an optional positional member."""
+    checks = []
+    author = target or flags.user
+    if author is not None:
+        checks.append(lambda m: m.author.id == author.id)
+    if flags.regex:
+        if len(flags.regex) > MAX_REGEX_LENGTH:
+            raise commands.BadArgument(f"Regex must be at most {MAX_REGEX_LENGTH} characters.")
+        try:
+            pattern = re.compile(flags.regex, re.IGNORECASE)
+        except re.error as e:
+            raise commands.BadArgument(f"Invalid regex: {e}")
+        checks.append(lambda m: pattern.search(m.content) is not None)
+    if flags.attachments:
+        checks.append(lambda m: bool(m.attachments))
+    if flags.bots:
+        checks.append(lambda m: m.author.bot)
+    return lambda message: all(check(message) for check in checks)
+
+
+class PurgeJob:
+    """
+    Deletes up to `limit` messages matching `predicate` from a channel's history.
+
+    History is streamed newest first. Messages young enough for bulk delete are sent in
+    chunks of 100 while the scan continues, with a couple of chunks in flight at once.
+    Older messages go to a queue that a single worker drains through a TokenBucket.
+    """
+
+    def __init__(self, channel, limit, predicate, before=None, after=None, reason=None):
+        self.channel = channel
+        self.limit = limit
+        self.predicate = predicate
+        self.before = before
+        self.after = after
+        self.reason = reason
+        self.scanned = 0
+        self.matched = 0
+        self.bulk_deleted = 0
+        self.old_deleted = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self._bulk_slots = asyncio.Semaphore(MAX_BULK_IN_FLIGHT)
+        self._old_bucket = TokenBucket(OLD_DELETE_RATE, 1.0)
+        self._extra_ids = set()
+
+    @property
+    def deleted(self):
+        return self.bulk_deleted + self.old_deleted
+
+    async def _bulk_delete(self, chunk):
+        counted = sum(1 for m in chunk if m.id not in self._extra_ids)
+        async with self._bulk_slots:
+            try:
+                await self.channel.delete_messages(chunk, reason=self.reason)
+            except discord.NotFound:
+                # Someone else deleted one of them first; the rest go one at a time.
+                counted = 0
+                for message in chunk:
+                    tracked = message.id not in self._extra_ids
+                    try:
+                        await message.delete()
+                    except discord.NotFound:
+                        continue
+                    except discord.HTTPException:
+                        self.failed += tracked
+                        continue
+                    counted += tracked
+            except discord.HTTPException as e:
+                self.failed += counted
+                logger.warning('Bulk delete of %d messages in %s failed: %s', len(chunk), self.channel.id, e)
+                return
+        self.bulk_deleted += counted
+
+    async def _old_worker(self, queue):
+        while True:
+            message = await queue.get()
+            if message is None:
+                return
+            for _ in range(3):
+                await self._old_bucket.acquire()
+                try:
+                    await message.delete()
+                except discord.NotFound:
+                    break
+                except discord.HTTPException as e:
+                    if e.status == 429:
+                        self._old_bucket.backoff()
+                        continue
+                    self.failed += 1
+                    logger.warning('Deleting old message %s failed: %s', message.id, e)
+                    break
+                else:
+                    self.old_deleted += 1
+                    self._old_bucket.recover()
+                    break
+
+    async def run(self, extra=()):
+        """
+        Runs the purge. `extra` messages (like the invoking command) are deleted in the
+        first chunk but do not count towards the limit or the report.
+        """
+        started = time.perf_counter()
+        self._extra_ids = {m.id for m in extra}
+        chunk = list(extra)
+        tasks = []
+        old = asyncio.Queue()
+        old_worker = asyncio.create_task(self._old_worker(old))
+        cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+        try:
+            history = self.channel.history(limit=PURGE_SCAN_LIMIT, before=self.before, after=self.after, oldest_first=False)
+            async for message in history:
+                if message.id in self._extra_ids:
+                    continue
+                self.scanned += 1
+                if not self.predicate(message):
+                    continue
+                self.matched += 1
+                if message.created_at < cutoff:
+                    old.put_nowait(message)
+                else:
+                    chunk.append(message)
+                    if len(chunk) == BULK_DELETE_MAX:
+                        tasks.append(asyncio.create_task(self._bulk_delete(chunk)))
+                        chunk = []
+                if self.matched >= self.limit:
+                    break
+            if chunk:
+                tasks.append(asyncio.create_task(self._bulk_delete(chunk)))
+            old.put_nowait(None)
+            await asyncio.gather(*tasks)
+            await old_worker
+        finally:
+            old_worker.cancel()
+            for task in tasks:
+                task.cancel()
+            self.elapsed = time.perf_counter() - started
+        return self
+
+    def summary(self):
+        lines = [f"Deleted **{self.deleted}** messages ({self.bulk_deleted} bulk, {self.old_deleted} older than 14 days)"]
+        if self.failed:
+            lines.append(f"{self.failed} could not be deleted")
+        lines.append(f"Scanned {self.scanned} messages in {self.elapsed:.1f}s")
+        return "\n".join(lines)
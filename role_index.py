@@ -0,0 +1,257 @@
+from collections import Counter
+
+from sortedcontainers import SortedList
+
+# Substrings up to this length are indexed. Longer queries intersect their trigram sets.
+GRAM_SIZE = 3
+# Fuzzy results remembered per index; any change to the roles clears them.
+SEARCH_CACHE_SIZE = 1024
+
+
+def _grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class RoleIndex:
+    """
+    Name index over one guild's roles.
+
+    Exact and casefolded names are dict lookups. Prefix matches are a range of a
+    sorted name list, and other substring matches go through an n-gram index (every
+    1-, 2- and 3-character substring maps to the roles containing it), so a fuzzy
+    lookup only looks at roles that can actually match.
+    Ranked fuzzy results are cached until the roles change, since members tend to
+    type the same few abbreviations.
+    """
+
+    def __init__(self, roles=()):
+        self._names = {}
+        self._exact = {}
+        self._folded = {}
+        self._grams = {}
+        self._positions = {}
+        self._sorted = SortedList()
+        self._cache = {}
+        for role in roles:
+            self.add(role)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, role_id):
+        return role_id in self._names
+
+    def add(self, role):
+        if role.is_default():
+            return
+        if role.id in self._names:
+            self.discard(role.id)
+        name = role.name
+        folded = name.casefold()
+        self._cache.clear()
+        self._names[role.id] = (name, folded)
+        self._positions[role.id] = role.position
+        self._exact.setdefault(name, set()).add(role.id)
+        self._folded.setdefault(folded, set()).add(role.id)
+        self._sorted.add((folded, role.id))
+        for size in range(1, GRAM_SIZE + 1):
+            for gram in _grams(folded, size):
+                self._grams.setdefault(gram, set()).add(role.id)
+
+    def discard(self, role_id):
+        entry = self._names.pop(role_id, None)
+        if entry is None:
+            return
+        del self._positions[role_id]
+        self._cache.clear()
+        name, folded = entry
+        self._remove(self._exact, name, role_id)
+        self._remove(self._folded, folded, role_id)
+        self._sorted.remove((folded, role_id))
+        for size in range(1, GRAM_SIZE + 1):
+            for gram in _grams(folded, size):
+                self._remove(self._grams, gram, role_id)
+
+    def update(self, role):
+        """Re-indexes a role after an update. Only a rename touches the name indexes."""
+        entry = self._names.get(role.id)
+        if entry is not None and entry[0] == role.name:
+            if self._positions[role.id] != role.position:
+                self._positions[role.id] = role.position
+                self._cache.clear()
+        else:
+            self.add(role)
+
+    @staticmethod
+    def _remove(index, key, role_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(role_id)
+            if not ids:
+                del index[key]
+
+    def _highest(self, ids):
+        return max(ids, key=self._positions.__getitem__)
+
+    def _candidates(self, folded):
+        if len(folded) <= GRAM_SIZE:
+            return self._grams.get(folded, ())
+        sets = []
+        for gram in _grams(folded, GRAM_SIZE):
+            ids = self._grams.get(gram)
+            if not ids:
+                return ()
+            sets.append(ids)
+        sets.sort(key=len)
+        return set.intersection(*sets)
+
+    def _prefixed(self, folded):
+        """Role IDs whose casefolded name starts with `folded`, from the sorted name list."""
+        return [role_id for _, role_id in self._sorted.irange((folded,), (folded + '\U0010ffff',))]
+
+    def _rank_key(self, role_id):
+        return len(self._names[role_id][1]), -self._positions[role_id]
+
+    def search(self, query, limit=5):
+        """
+        Returns up to `limit` role IDs matching `query`, best first: exact casefolded
+        name, then prefix, then word-start, then any substring. Ties go to the shorter
+        name, then the higher role.
+        """
+        folded = query.casefold()
+        if not folded:
+            return []
+        cached = self._cache.get((folded, limit))
+        if cached is not None:
+            return cached
+        # Prefix matches (including an exact name) outrank everything else, and come
+        # straight out of the sorted name list, so most lookups stop here.
+        result = sorted(self._prefixed(folded), key=self._rank_key)[:limit]
+        if len(result) < limit:
+            seen = set(result)
+            inner = []
+            for role_id in self._candidates(folded):
+                if role_id in seen:
+                    continue
+                name = self._names[role_id][1]
+                where = name.find(folded)
+                if where > 0:
+                    tier = 0 if not name[where - 1].isalnum() else 1
+                    inner.append((tier, len(name), -self._positions[role_id], role_id))
+            inner.sort()
+            result.extend(entry[-1] for entry in inner[:limit - len(result)])
+        if len(self._cache) >= SEARCH_CACHE_SIZE:
+            self._cache.clear()
+        self._cache[folded, limit] = result
+        return result
+
+    def lookup(self, query):
+        """
+        Resolves a role name to a single role ID, or None. An exact name wins, then a
+        casefolded exact name, then the best-ranked fuzzy match.
+        """
+        ids = self._exact.get(query) or self._folded.get(query.casefold())
+        if ids:
+            return self._highest(ids)
+        matches = self.search(query, limit=1)
+        return matches[0] if matches else None
+
+
+class RoleIndexes:
+    """One lazily built RoleIndex per guild, kept current from the guild role events."""
+
+    def __init__(self):
+        self._guilds = {}
+
+    def for_guild(self, guild):
+        index = self._guilds.get(guild.id)
+        if index is None:
+            index = self._guilds[guild.id] = RoleIndex(guild.roles)
+        return index
+
+    def resolve(self, guild, query):
+        """Returns the discord.Role that best matches `query` in `guild`, or None."""
+        role_id = self.for_guild(guild).lookup(query)
+        return guild.get_role(role_id) if role_id is not None else None
+
+    def search(self, guild, query, limit=5):
+        return [role for role in map(guild.get_role, self.for_guild(guild).search(query, limit)) if role is not None]
+
+    # Event hooks. Guilds that were never looked up have no index and nothing to update.
+    def role_created(self, role):
+        index = self._guilds.get(role.guild.id)
+        if index is not None:
+            index.add(role)
+
+    def role_updated(self, role):
+        index = self._guilds.get(role.guild.id)
+        if index is not None:
+            index.update(role)
+
+    def role_deleted(self, role):
+        index = self._guilds.get(role.guild.id)
+        if index is not None:
+            index.discard(role.id)
+
+    def drop_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+
+class RoleMemberCounts:
+    """
+    Per-guild {role_id: member count}. Built with one pass over the member cache the
+    first time a guild is asked for, then kept current from member join, leave and
+    update events, so reading every role's count is O(roles) instead of a member scan per role.
+    """
+
+    def __init__(self):
+        self._guilds = {}
+        # Guilds counted before their members finished chunking are recounted on next use.
+        self._partial = set()
+
+    def for_guild(self, guild):
+        counts = self._guilds.get(guild.id)
+        if counts is None or guild.id in self._partial:
+            counts = self._guilds[guild.id] = Counter()
+            for member in guild.members:
+                # member._roles holds bare role IDs; member.roles would build and sort Role objects.
+                counts.update(member._roles)
+            if guild.chunked:
+                self._partial.discard(guild.id)
+            else:
+                self._partial.add(guild.id)
+        return counts
+
+    def count(self, role):
+        if role.is_default():
+            return role.guild.member_count or 0
+        return self.for_guild(role.guild)[role.id]
+
+    # Event hooks. Guilds that were never counted have nothing to update.
+    def member_joined(self, member):
+        counts = self._guilds.get(member.guild.id)
+        if counts is not None:
+            counts.update(member._roles)
+
+    def member_left(self, member):
+        counts = self._guilds.get(member.guild.id)
+        if counts is not None:
+            counts.subtract(member._roles)
+
+    def member_updated(self, before, after):
+        counts = self._guilds.get(after.guild.id)
+        if counts is None:
+            return
+        old, new = set(before._roles), set(after._roles)
+        if old != new:
+            counts.subtract(old - new)
+            counts.update(new - old)
+
+    def role_deleted(self, role):
+        counts = self._guilds.get(role.guild.id)
+        if counts is not None:
+            counts.pop(role.id, None)
+
+    def drop_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+        self._partial.discard(guild_id)
@@ -0,0 +1,107 @@
+import logging
+
+import discord
+from discord.ext import commands
+
+from guild_settings import SETTINGS, CommandDisabled, GuildSettingsStore, SettingError, settings_backend_from_env
+
+logger = logging.getLogger(__name__)
+
+# Commands a server can never disable, so it cannot lock itself out.
+ALWAYS_ENABLED = {'settings', 'help'}
+
+
+class Settings(commands.Cog):
+    """Per-server configuration: prefix, disabled commands and economy limits."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        state = getattr(bot, 'cog_state', {}).get('Settings')
+        self.store = state['store'] if state else GuildSettingsStore(settings_backend_from_env())
+        self._started = state is not None
+        self._handed_off = False
+
+    async def cog_load(self):
+        if not self._started:
+            await self.store.start()
+        self.bot.settings = self.store
+        getattr(self.bot, 'cog_state', {}).pop('Settings', None)
+
+    async def cog_unload(self):
+        if self._handed_off:
+            return
+        if getattr(self.bot, 'settings', None) is self.store:
+            self.bot.settings = None
+        await self.store.close()
+
+    def export_state(self):
+        self._handed_off = True
+        return {'store': self.store}
+
+    async def bot_check(self, ctx):
+        """Applies to every command: refuses commands the server has disabled."""
+        if ctx.guild is None:
+            return True
+        settings = await self.store.get(ctx.guild.id)
+        name = ctx.command.root_parent.name if ctx.command.root_parent else ctx.command.name
+        if name in settings.disabled:
+            raise CommandDisabled(name)
+        return True
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.store.forget(guild.id)
+
+    def _embed(self, ctx, settings):
+        # After a prefix change ctx still carries the old one.
+        prefix = settings.prefix or getattr(self.bot, 'default_prefix', ctx.clean_prefix)
+        lines = []
+        for key, (_, _, description) in SETTINGS.items():
+            value = prefix if key == 'prefix' else getattr(settings, key)
+            if value is None:
+                value = 'bot default'
+            marker = "" if key in settings.values else " (default)"
+            lines.append(f"**{key}**: `{value}`{marker}\n{description}")
+        disabled = ", ".join(f"`{name}`" for name in sorted(settings.disabled)) or "None"
+        embed = discord.Embed(title=f"Settings for {ctx.guild.name}", description="\n".join(lines), color=discord.Color.blue())
+        embed.add_field(name="Disabled commands", value=disabled, inline=False)
+        embed.set_footer(text=f"{prefix}settings set <key> <value> | reset <key> | disable <command> | enable <command>")
+        return embed
+
+    @commands.command(name='settings', aliases=['config'])
+    @commands.guild_only()
+    @commands.has_permissions(manage_guild=True)
+    async def settings_command(self, ctx, action: str = None, key: str = None, *, value: str = None):
+        """Shows or changes this server's settings. Usage: !settings [set <key> <value> | reset <key> | disable <command> | enable <command>]"""
+        guild_id = ctx.guild.id
+        action = action.lower() if action else None
+        try:
+            if action is None:
+                settings = await self.store.get(guild_id)
+            elif action == 'set' and key and value is not None:
+                settings = await self.store.set(guild_id, key.lower(), value)
+            elif action == 'reset' and key:
+                settings = await self.store.reset(guild_id, key.lower())
+            elif action in ('disable', 'enable') and key:
+                command = self.bot.get_command(key.lower().removeprefix(ctx.clean_prefix))
+                if command is None:
+                    raise SettingError(f"There is no command called `{key}`.")
+                name = command.root_parent.name if command.root_parent else command.name
+                if name in ALWAYS_ENABLED:
+                    raise SettingError(f"`{name}` cannot be disabled.")
+                settings = await self.store.set_disabled(guild_id, name, action == 'disable')
+            else:
+                return await ctx.send(embed=discord.Embed(
+                    title="Usage",
+                    description=f"`{ctx.clean_prefix}settings [set <key> <value> | reset <key> | disable <command> | enable <command>]`\nKeys: {', '.join(f'`{k}`' for k in SETTINGS)}",
+                    color=discord.Color.red()
+                ))
+        except SettingError as e:
+            return await ctx.send(embed=discord.Embed(title="Invalid Setting", description=str(e), color=discord.Color.red()))
+        if action is not None:
+            logger.info('Guild %s settings changed by %s: %s %s', guild_id, ctx.author.id, action, key)
+        await ctx.send(embed=self._embed(ctx, settings))
+
+
+async def setup(bot):
+    await bot.add_cog(Settings(bot))
@@ -0,0 +1,133 @@
+import time
+from collections import deque
+
+import discord
+
+# Event rates are averaged over this many one-second buckets.
+RATE_WINDOW = 60
+
+# Gateway events that carry a guild; each is attributed to the shard that owns the guild.
+COUNTED_EVENTS = (
+    'on_message',
+    'on_raw_message_edit',
+    'on_raw_message_delete',
+    'on_raw_reaction_add',
+    'on_member_join',
+    'on_member_remove',
+    'on_member_update',
+    'on_guild_role_create',
+    'on_guild_role_update',
+    'on_guild_role_delete',
+)
+
+
+class EventRate:
+    """Events per second over a sliding window of one-second buckets."""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self.total = 0
+        self._buckets = deque()
+
+    def hit(self, now):
+        second = int(now)
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += 1
+        else:
+            self._buckets.append([second, 1])
+        self.total += 1
+        self._trim(second)
+
+    def _trim(self, second):
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+    def rate(self, now=None):
+        self._trim(int(time.time() if now is None else now))
+        return sum(count for _, count in self._buckets) / self.window
+
+
+class ShardStats:
+    """Per-shard event rates and connection health."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.rates = {}
+        self.health = {}
+
+    def shard_for(self, guild_id):
+        count = self.bot.shard_count or 1
+        return (guild_id >> 22) % count if guild_id else 0
+
+    def record(self, guild_id):
+        shard_id = self.shard_for(guild_id)
+        rate = self.rates.get(shard_id)
+        if rate is None:
+            rate = self.rates[shard_id] = EventRate()
+        rate.hit(time.time())
+
+    def mark(self, shard_id, state):
+        self.health[shard_id] = (state, time.time())
+
+    def snapshot(self):
+        """Returns [(shard_id, latency_seconds, events_per_second, state)] for every known shard."""
+        latencies = dict(getattr(self.bot, 'latencies', None) or [(0, self.bot.latency)])
+        shard_ids = sorted(set(latencies) | set(self.rates) | set(self.health))
+        rows = []
+        for shard_id in shard_ids:
+            rate = self.rates.get(shard_id)
+            state = self.health.get(shard_id, ('unknown', None))[0]
+            rows.append((shard_id, latencies.get(shard_id), rate.rate() if rate else 0.0, state))
+        return rows
+
+    def attach(self):
+        """Registers the listeners that feed the counters."""
+        def counter(name):
+            async def listener(*args):
+                self.record(_guild_id(args[0]))
+            listener.__name__ = name
+            return listener
+
+        for name in COUNTED_EVENTS:
+            self.bot.add_listener(counter(name), name)
+
+        async def on_shard_connect(shard_id):
+            self.mark(shard_id, 'connected')
+
+        async def on_shard_ready(shard_id):
+            self.mark(shard_id, 'ready')
+
+        async def on_shard_resumed(shard_id):
+            self.mark(shard_id, 'ready')
+
+        async def on_shard_disconnect(shard_id):
+            self.mark(shard_id, 'disconnected')
+
+        for listener in (on_shard_connect, on_shard_ready, on_shard_resumed, on_shard_disconnect):
+            self.bot.add_listener(listener)
+
+        if not isinstance(self.bot, discord.AutoShardedClient):
+            # A plain Bot has no shard events; its single connection counts as shard 0.
+            async def on_connect():
+                self.mark(0, 'connected')
+
+            async def on_ready():
+                self.mark(0, 'ready')
+
+            async def on_resumed():
+                self.mark(0, 'ready')
+
+            async def on_disconnect():
+                self.mark(0, 'disconnected')
+
+            for listener in (on_connect, on_ready, on_resumed, on_disconnect):
+                self.bot.add_listener(listener)
+
+
+def _guild_id(payload):
+    """Finds the guild ID on a model or raw event payload."""
+    guild_id = getattr(payload, 'guild_id', None)
+    if guild_id is not None:
+        return guild_id
+    guild = getattr(payload, 'guild', None)
+    return guild.id if guild is not None else None
@@ -0,0 +1,192 @@
+"""
+Pre-invoke command throttling.
+
+Every message that starts with the prefix is charged against three token buckets: one
+for its author, one for its channel and one for its guild. This includes unknown
+commands, which would otherwise each get a "Command Not Found" reply. If any bucket is
+short, the command is dropped before its arguments are parsed or it is invoked, and its
+author gets a "slow down" notice, at most one per WARN_INTERVAL. Members who can manage
+messages only pay into their user bucket, so moderators can still act while a raid
+drains the channel and guild budgets.
+
+The user bucket does the everyday work. The channel and guild defaults are far above
+what an active server sends, coalesced !roll bursts included, and only catch abuse.
+
+Limits come from THROTTLE_USER, THROTTLE_CHANNEL and THROTTLE_GUILD as "<tokens>/<seconds>".
+A guild can override its channel and guild limits with the throttle_channel and
+throttle_guild settings. Command costs come from THROTTLE_COSTS as "name=cost,...".
+Setting THROTTLE=0 turns throttling off.
+
+A bucket that has refilled completely is the same as a missing one, so idle keys are
+evicted. Keys are kept in least-recently-used order, which makes each sweep amortized
+O(1), and MAX_KEYS caps the worst case.
+"""
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = {'user': '8/10', 'channel': '150/10', 'guild': '600/10'}
+# Cost of one invocation by command name; 'unknown' covers commands that do not exist.
+DEFAULT_COSTS = {'unknown': 2, 'delete': 3, 'massrole': 5, 'listroles': 2, 'leaderboard': 2}
+MAX_KEYS = 100_000
+# Each throttled user gets at most one "slow down" notice per this many seconds.
+WARN_INTERVAL = 30.0
+
+
+def parse_limit(text):
+    """'8/10' -> (capacity 8, refill 0.8 tokens per second)."""
+    tokens, _, seconds = str(text).partition('/')
+    capacity = float(tokens)
+    per = float(seconds or 1)
+    if capacity <= 0 or per <= 0:
+        raise ValueError(f'Invalid throttle limit: {text!r}')
+    return capacity, capacity / per
+
+
+def parse_costs(text):
+    costs = dict(DEFAULT_COSTS)
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, _, cost = item.partition('=')
+        costs[name.strip().lower()] = float(cost)
+    return costs
+
+
+class BucketTable:
+    """Token buckets for one scope (user, channel or guild), created on first use and evicted once full again."""
+
+    def __init__(self, capacity, rate, max_keys=MAX_KEYS):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at), least recently used first.
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def tokens(self, key, now):
+        entry = self._buckets.get(key)
+        if entry is None:
+            return self.capacity
+        tokens, updated = entry
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def take(self, key, cost, now):
+        self._buckets[key] = (self.tokens(key, now) - cost, now)
+        self._buckets.move_to_end(key)
+        self._evict(now)
+
+    def _evict(self, now):
+        buckets = self._buckets
+        while buckets:
+            key, (tokens, updated) = next(iter(buckets.items()))
+            if tokens + (now - updated) * self.rate < self.capacity and len(buckets) <= self.max_keys:
+                break
+            del buckets[key]
+
+
+class CommandThrottle:
+    def __init__(self, limits=None, costs=None):
+        limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.scopes = {scope: BucketTable(*parse_limit(limit)) for scope, limit in limits.items()}
+        # (scope, limit) -> BucketTable for limits a guild set for itself.
+        self.overrides = {}
+        self.costs = dict(DEFAULT_COSTS) if costs is None else costs
+        self.rejected = Counter()
+        self._warned = OrderedDict()
+
+    @classmethod
+    def from_env(cls):
+        limits = {scope: os.environ[f'THROTTLE_{scope.upper()}'] for scope in DEFAULT_LIMITS if os.getenv(f'THROTTLE_{scope.upper()}')}
+        return cls(limits, parse_costs(os.getenv('THROTTLE_COSTS')))
+
+    def cost(self, ctx):
+        name = ctx.command.root_parent.name if ctx.command and ctx.command.root_parent else (ctx.command.name if ctx.command else 'unknown')
+        return self.costs.get(name, 1)
+
+    def keys(self, ctx):
+        keys = {'user': ctx.author.id}
+        if ctx.guild is not None:
+            permissions = ctx.channel.permissions_for(ctx.author)
+            if permissions.manage_messages:
+                return keys
+            keys['channel'] = ctx.channel.id
+            keys['guild'] = ctx.guild.id
+        return keys
+
+    def table(self, scope, limit=None):
+        """The bucket table for a scope, or for a guild's own limit on it."""
+        if limit is None:
+            return self.scopes[scope]
+        table = self.overrides.get((scope, limit))
+        if table is None:
+            table = self.overrides[scope, limit] = BucketTable(*parse_limit(limit))
+        return table
+
+    def allow(self, ctx, limits=None, now=None):
+        """
+        Charges ctx's command to every bucket if all of them can afford it. `limits` maps a
+        scope to the guild's own limit for it. Returns None, or the (scope, key) of the
+        exhausted bucket.
+        """
+        now = time.monotonic() if now is None else now
+        limits = limits or {}
+        cost = self.cost(ctx)
+        buckets = [(scope, key, self.table(scope, limits.get(scope))) for scope, key in self.keys(ctx).items()]
+        for scope, key, table in buckets:
+            if table.tokens(key, now) < cost:
+                self.rejected[scope] += 1
+                return scope, key
+        for scope, key, table in buckets:
+            table.take(key, cost, now)
+        return None
+
+    def should_warn(self, user_id, now=None):
+        """True at most once per WARN_INTERVAL for each throttled user."""
+        now = time.monotonic() if now is None else now
+        warned = self._warned
+        while warned and (now - next(iter(warned.values())) >= WARN_INTERVAL or len(warned) > MAX_KEYS):
+            warned.popitem(last=False)
+        if user_id in warned:
+            return False
+        warned[user_id] = now
+        return True
+
+
+class ThrottleMixin:
+    """Runs every prefixed message through bot.throttle before it is invoked."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        enabled = os.getenv('THROTTLE', '1').lower() not in ('0', 'false', 'no')
+        self.throttle = CommandThrottle.from_env() if enabled else None
+
+    async def _guild_limits(self, ctx):
+        """The guild's own channel and guild limits, from its settings."""
+        store = getattr(self, 'settings', None)
+        if store is None or ctx.guild is None:
+            return None
+        settings = await store.get(ctx.guild.id)
+        return {'channel': settings.throttle_channel, 'guild': settings.throttle_guild}
+
+    async def process_commands(self, message):
+        if message.author.bot:
+            return
+        ctx = await self.get_context(message)
+        if ctx.prefix is not None and ctx.invoked_with and self.throttle is not None:
+            exhausted = self.throttle.allow(ctx, await self._guild_limits(ctx))
+            if exhausted is not None:
+                if self.throttle.should_warn(ctx.author.id):
+                    scope = exhausted[0]
+                    logger.info('Throttled %s in %s (%s bucket empty)', ctx.author.id, ctx.channel.id, scope)
+                    if scope == 'user':
+                        notice = f"{ctx.author.mention}, slow down! Your commands are being ignored for a moment."
+                    else:
+                        place = 'channel' if scope == 'channel' else 'server'
+                        notice = f"{ctx.author.mention}, too many commands in this {place}. Your command was ignored; try again in a moment."
+                    await ctx.send(notice, delete_after=10)
+                return
+        await self.invoke(ctx)
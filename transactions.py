@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+# Number of lock shards. Users hash onto a shard, so a flood from one user only
+# queues behind that shard instead of the whole cog.
+LOCK_SHARDS = 256
+# Balances are stored as int64 (SQLite INTEGER, the compact table's array('q') columns).
+MAX_BALANCE = 2**63 - 1
+MIN_BALANCE = -2**63
+
+
+class InsufficientFunds(Exception):
+    """Raised when a debit would take a balance below zero."""
+
+    def __init__(self, user_id, balance, amount):
+        super().__init__(f'User {user_id} has {balance} coins, needs {amount}.')
+        self.user_id = user_id
+        self.balance = balance
+        self.amount = amount
+
+
+class BalanceOutOfRange(ValueError):
+    """Raised when a mutation would leave a balance outside the int64 range."""
+
+    def __init__(self, user_id, balance):
+        super().__init__(f'A balance of {balance} for user {user_id} is out of range (max {MAX_BALANCE}).')
+        self.user_id = user_id
+        self.balance = balance
+
+
+class ShardedLocks:
+    """A fixed pool of asyncio locks indexed by key."""
+
+    def __init__(self, shards=LOCK_SHARDS):
+        self._locks = [asyncio.Lock() for _ in range(shards)]
+
+    def __call__(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+
+class TransactionEngine:
+    """
+    Serializes balance mutations per user on top of an EconomyStore.
+    Every mutation is a compare-and-apply under the user's lock and is appended
+    to the store's ledger with its delta and resulting balance.
+    """
+
+    def __init__(self, store, starting_balance=100, shards=LOCK_SHARDS):
+        self.store = store
+        self.starting_balance = starting_balance
+        self.locks = ShardedLocks(shards)
+
+    def balance(self, user_id, starting_balance=None):
+        """Lock-free read of the in-memory balance. `starting_balance` overrides the default for new users."""
+        return self.store.get(user_id, self.starting_balance if starting_balance is None else starting_balance)
+
+    async def apply(self, user_id, func, reason, starting_balance=None):
+        """
+        Runs func(old_balance) -> new_balance under the user's lock and stores the result.
+        func may raise to abort the mutation; nothing is written in that case.
+        Results outside the int64 range raise BalanceOutOfRange.
+        """
+        if starting_balance is None:
+            starting_balance = self.starting_balance
+        func = self._bounded(user_id, func)
+        async with self.locks(user_id):
+            if self.store.shared:
+                # Other processes may hold this user too, so the database is the source of truth.
+                return await self.store.apply_shared(user_id, func, starting_balance, reason)
+            old = self.balance(user_id, starting_balance)
+            new = func(old)
+            if new != old or user_id not in self.store:
+                self.store.set(user_id, new)
+            self.store.append_ledger((time.time(), user_id, new - old, new, reason))
+            return new
+
+    @staticmethod
+    def _bounded(user_id, func):
+        def apply(old):
+            new = func(old)
+            if not MIN_BALANCE <= new <= MAX_BALANCE:
+                raise BalanceOutOfRange(user_id, new)
+            return new
+        return apply
+
+    async def credit(self, user_id, amount, reason='credit', starting_balance=None):
+        return await self.apply(user_id, lambda bal: bal + amount, reason, starting_balance)
+
+    async def debit(self, user_id, amount, reason='debit', starting_balance=None):
+        def take(bal):
+            if amount > bal:
+                raise InsufficientFunds(user_id, bal, amount)
+            return bal - amount
+        return await self.apply(user_id, take, reason, starting_balance)
+
+    async def set(self, user_id, amount, reason='set'):
+        return await self.apply(user_id, lambda bal: amount, reason)